@@ -1,18 +1,42 @@
 import os
-from datetime import datetime, timezone
+from datetime import datetime, timezone, date, time as dtime, timedelta
 from zoneinfo import ZoneInfo
 import secrets
 import io
 import csv
-from typing import List, Dict, Any
-
-from fastapi import FastAPI, Request, Form, HTTPException, Depends, Cookie, UploadFile, File
-from fastapi.responses import RedirectResponse, StreamingResponse
+import time
+import threading
+import contextvars
+import functools
+import inspect as pyinspect
+import json
+import mimetypes
+import base64
+import tempfile
+import sys
+import logging
+from logging.handlers import RotatingFileHandler
+import cProfile
+import re
+import unicodedata
+import pstats
+import queue
+from collections import Counter, OrderedDict
+from typing import List, Dict, Any, NamedTuple, Optional
+
+from fastapi import FastAPI, Request, Form, Body, HTTPException, Depends, Cookie, UploadFile, File
+from fastapi.responses import RedirectResponse, StreamingResponse, PlainTextResponse, JSONResponse, FileResponse, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.routing import APIRoute
 from fastapi.staticfiles import StaticFiles
+from starlette.concurrency import iterate_in_threadpool
+from starlette.middleware.gzip import GZipMiddleware
 from fastapi.templating import Jinja2Templates
 
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, text, func, inspect
+from sqlalchemy import create_engine, Column, Integer, String, DateTime, Date, Index, text, func, inspect, event, select, or_, and_, union_all, case, cast, literal, literal_column
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
+from sqlalchemy.dialects import postgresql, sqlite
 
 from dotenv import load_dotenv
 import pandas as pd
@@ -21,6 +45,9 @@ from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
 from reportlab.lib import colors
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
 
 # Carrega .env (opcional)
 load_dotenv()
@@ -41,11 +68,25 @@ connect_args = {"check_same_thread": False} if DATABASE_URL.startswith("sqlite")
 engine = create_engine(DATABASE_URL, connect_args=connect_args)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Réplica de leitura (opcional): relatórios, exportações e listagens leem dela;
+# gravações continuam no primário. Sem DATABASE_READ_URL tudo usa o mesmo engine.
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL")
+if DATABASE_READ_URL and DATABASE_READ_URL.startswith("postgres://"):
+    DATABASE_READ_URL = DATABASE_READ_URL.replace("postgres://", "postgresql+psycopg2://", 1)
+if DATABASE_READ_URL:
+    read_engine = create_engine(
+        DATABASE_READ_URL,
+        connect_args={"check_same_thread": False} if DATABASE_READ_URL.startswith("sqlite") else {},
+    )
+else:
+    read_engine = engine
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
 class Base(DeclarativeBase):
     pass
 
-class Ligacao(Base):
-    __tablename__ = "ligacoes"
+class LigacaoCampos:
+    """Colunas comuns à tabela ativa e ao arquivo histórico"""
     id = Column(Integer, primary_key=True, index=True)
     cro = Column(String(50), nullable=False)
     nome_inscrito = Column(String(255), nullable=False)
@@ -54,8 +95,77 @@ class Ligacao(Base):
     atendente = Column(String(100), nullable=True)  # Nome do atendente que registrou
     created_at = Column(DateTime, nullable=False, server_default=func.now())
     deleted_at = Column(DateTime, nullable=True)  # Soft delete: quando o registro foi excluído
+    # Última alteração (inclusão, edição ou exclusão): base do feed de mudanças /api/changes.
+    updated_at = Column(DateTime, nullable=True,
+                        default=lambda ctx: ctx.get_current_parameters().get("created_at") or datetime.now(timezone.utc),
+                        onupdate=lambda ctx: datetime.now(timezone.utc))
+    # 1 na inclusão, +1 a cada UPDATE: o /api/changes distingue inclusões de edições sem comparar
+    # horários (importações e a ingestão gravam created_at retroativo e updated_at do recebimento).
+    # NULL = registro anterior à coluna (vale a comparação updated_at == created_at).
+    versao = Column(Integer, nullable=True, default=1,
+                    onupdate=func.coalesce(literal_column("versao"), 1) + 1)
+
+class Ligacao(LigacaoCampos, Base):
+    __tablename__ = "ligacoes"
+    __table_args__ = (
+        Index("ix_ligacoes_updated_at_id", "updated_at", "id"),
+        # "Meu dia" (/api/meu_dia): ligações de um atendente num intervalo de datas
+        Index("ix_ligacoes_atendente_created_at", "atendente", "created_at"),
+        # SQLite: sem AUTOINCREMENT o próximo id é max(id)+1, e depois de arquivar as ligações
+        # mais recentes os ids voltariam a ser usados (o mesmo id na ativa e no arquivo)
+        {"sqlite_autoincrement": True},
+    )
+
+class LigacaoArquivo(LigacaoCampos, Base):
+    """Ligações de eleições encerradas, movidas pelo `manutencao.py arquivar`.
+    Ficam fora das consultas padrão; os relatórios as incluem com ?historico=1."""
+    __tablename__ = "ligacoes_arquivo"
+    __table_args__ = (Index("ix_ligacoes_arquivo_created_at", "created_at"),)
+
+class LigacaoTermo(Base):
+    """Índice de termos das observações: quantas ligações não excluídas (ativas ou arquivadas)
+    citam cada termo, por dia (SP) e dúvida. Mantido a cada inclusão, edição e exclusão
+    (_ajustar_termos); `manutencao.py reindexar-termos` o recria do zero."""
+    __tablename__ = "ligacoes_termos"
+    dia = Column(Date, primary_key=True)
+    duvida = Column(String(100), primary_key=True)
+    termo = Column(String(40), primary_key=True)
+    contagem = Column(Integer, nullable=False, default=0)
+    __table_args__ = (Index("ix_ligacoes_termos_termo_dia", "termo", "dia"),)
+
+class LigacaoChave(Base):
+    """Chaves de idempotência da ingestão por API (/api/ligacoes/batch): o reenvio de um item
+    com a mesma chave devolve a ligação já criada em vez de gravá-la de novo"""
+    __tablename__ = "ligacoes_chaves"
+    chave = Column(String(100), primary_key=True)
+    ligacao_id = Column(Integer, nullable=False)
+    created_at = Column(DateTime, nullable=False, server_default=func.now())
+
+class LigacaoLinha(NamedTuple):
+    """Modelo de leitura para listagens e exportações: tupla com só as colunas exibidas,
+    lida pelo Core (sem identity map nem rastreamento de alterações do ORM)"""
+    id: int
+    cro: str
+    nome_inscrito: str
+    duvida: str
+    observacao: Optional[str]
+    atendente: Optional[str]
+    created_at: datetime
+
+def _select_linhas(cols, *clauses):
+    return select(*(cols[campo] for campo in LigacaoLinha._fields)).where(*clauses)
+
+def _ler_linhas(db, stmt) -> List[LigacaoLinha]:
+    return [LigacaoLinha._make(row) for row in db.execute(stmt)]
+
+# SQLite: banco novo já nasce com auto_vacuum incremental, para que a purga de excluídos
+# devolva espaço ao disco sem VACUUM completo (em banco existente o PRAGMA não tem efeito)
+if DATABASE_URL.startswith("sqlite"):
+    with engine.begin() as conn:
+        conn.execute(text("PRAGMA auto_vacuum = INCREMENTAL"))
 
 # Cria tabela se não existir
+_tabelas_existentes = set(inspect(engine).get_table_names())
 Base.metadata.create_all(bind=engine)
 
 # MIGRAÇÃO LEVE: adiciona coluna 'observacao' se faltar
@@ -84,6 +194,25 @@ if "deleted_at" not in cols:
         else:
             conn.execute(text("ALTER TABLE ligacoes ADD COLUMN deleted_at TIMESTAMP NULL"))
 
+# MIGRAÇÃO LEVE: adiciona coluna 'updated_at' se faltar (feed de mudanças)
+# Registros antigos recebem a melhor estimativa disponível: exclusão ou criação.
+if "updated_at" not in cols:
+    with engine.begin() as conn:
+        if DATABASE_URL.startswith("sqlite"):
+            conn.execute(text("ALTER TABLE ligacoes ADD COLUMN updated_at TIMESTAMP"))
+        else:
+            conn.execute(text("ALTER TABLE ligacoes ADD COLUMN updated_at TIMESTAMP NULL"))
+        conn.execute(text("UPDATE ligacoes SET updated_at = COALESCE(deleted_at, created_at) WHERE updated_at IS NULL"))
+
+# MIGRAÇÃO LEVE: adiciona coluna 'versao' se faltar (inclusão x edição no feed de mudanças)
+# Registros antigos ficam com NULL: não se sabe se já foram editados.
+for _tabela in ("ligacoes", "ligacoes_arquivo"):
+    if "versao" not in [c["name"] for c in inspect(engine).get_columns(_tabela)]:
+        with engine.begin() as conn:
+            conn.execute(text(f"ALTER TABLE {_tabela} ADD COLUMN versao INTEGER"))
+for index in Ligacao.__table__.indexes:
+    index.create(bind=engine, checkfirst=True)
+
 DUVIDA_OPCOES = [
     "Dúvida sanada - outros",
     "Dúvida encaminhada ao jurídico",
@@ -100,8 +229,725 @@ os.makedirs("templates", exist_ok=True)
 app = FastAPI(title="ELEIÇÕES CRORS - 2025")
 
 # Static / Templates
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# Os arquivos de static/ são processados pelo build_static.py: static/dist/ recebe cópias
+# com hash no nome (cache "immutable" de 1 ano) e variantes .br/.gz pré-comprimidas.
+# Sem o build (desenvolvimento), os templates usam os arquivos originais de static/.
+STATIC_DIR = "static"
+STATIC_DIST_MANIFEST = os.path.join(STATIC_DIR, "dist", "manifest.json")
+STATIC_VENDOR_FILE = os.path.join(STATIC_DIR, "vendor.json")
+STATIC_MAX_AGE = 31536000  # 1 ano para os arquivos com hash
+
+def _carregar_json(caminho: str) -> Dict[str, str]:
+    try:
+        with open(caminho, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+_static_manifest = _carregar_json(STATIC_DIST_MANIFEST)
+_static_vendor = _carregar_json(STATIC_VENDOR_FILE)
+
+@functools.lru_cache(maxsize=None)
+def asset_url(caminho: str) -> str:
+    """URL de um arquivo estático para os templates: versão com hash se o build rodou;
+    biblioteca de terceiros ainda não baixada cai na CDN de static/vendor.json"""
+    if caminho in _static_manifest:
+        return f"/static/dist/{_static_manifest[caminho]}"
+    if caminho in _static_vendor and not os.path.exists(os.path.join(STATIC_DIR, caminho)):
+        return _static_vendor[caminho]["url"]
+    return f"/static/{caminho}"
+
+def _codificacoes_aceitas(valor: str) -> set:
+    """Codificações do Accept-Encoding com q > 0 ("gzip;q=0" recusa o gzip)"""
+    aceitas, recusadas, curinga = set(), set(), False
+    for parte in valor.split(","):
+        nome, _, parametros = parte.partition(";")
+        nome = nome.strip().lower()
+        if not nome:
+            continue
+        q = 1.0
+        for parametro in parametros.split(";"):
+            chave, _, numero = parametro.partition("=")
+            if chave.strip().lower() == "q":
+                try:
+                    q = float(numero)
+                except ValueError:
+                    q = 0.0
+        if nome == "*":
+            curinga = q > 0
+        elif q > 0:
+            aceitas.add(nome)
+        else:
+            recusadas.add(nome)
+    if curinga:
+        aceitas |= {"br", "gzip"} - recusadas
+    return aceitas
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles que entrega as variantes .br/.gz geradas no build e define o cache:
+    arquivos de dist/ (nome com hash) são imutáveis; os demais são revalidados"""
+
+    ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+    async def get_response(self, path: str, scope):
+        fingerprinted = path.replace(os.sep, "/").startswith("dist/")
+        if fingerprinted and scope["method"] in ("GET", "HEAD") and not path.endswith((".br", ".gz")):
+            aceita = set()
+            for nome, valor in scope["headers"]:
+                if nome == b"accept-encoding":
+                    aceita = _codificacoes_aceitas(valor.decode("latin-1"))
+            for encoding, sufixo in self.ENCODINGS:
+                if encoding not in aceita:
+                    continue
+                full_path, stat_result = self.lookup_path(path + sufixo)
+                if stat_result is None:
+                    continue
+                media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+                response = FileResponse(full_path, stat_result=stat_result, media_type=media_type)
+                response.headers["Content-Encoding"] = encoding
+                response.headers["Vary"] = "Accept-Encoding"
+                response.headers["Cache-Control"] = f"public, max-age={STATIC_MAX_AGE}, immutable"
+                return response
+
+        response = await super().get_response(path, scope)
+        if response.status_code in (200, 304):
+            if fingerprinted:
+                response.headers["Cache-Control"] = f"public, max-age={STATIC_MAX_AGE}, immutable"
+                response.headers["Vary"] = "Accept-Encoding"
+            else:
+                response.headers["Cache-Control"] = "no-cache"
+        return response
+
+app.mount("/static", PrecompressedStaticFiles(directory=STATIC_DIR), name="static")
 templates = Jinja2Templates(directory="templates")
+templates.env.globals["asset"] = asset_url
+
+class SelectiveGZipMiddleware(GZipMiddleware):
+    """Comprime HTML/JSON/CSV dinâmicos; /static já vem pré-comprimido e PDF/XLSX não ganham nada"""
+
+    SKIP_PREFIXES = ("/static/",)
+    SKIP_SUFFIXES = ("/pdf", "/xlsx")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            path = scope["path"]
+            if path.startswith(self.SKIP_PREFIXES) or path.endswith(self.SKIP_SUFFIXES):
+                await self.app(scope, receive, send)
+                return
+        await super().__call__(scope, receive, send)
+
+app.add_middleware(SelectiveGZipMiddleware, minimum_size=1024)
+
+# Métricas no formato Prometheus (expostas em /metrics)
+# Os valores ficam em memória e são por processo: com vários workers do uvicorn,
+# cada worker expõe os próprios números.
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")  # opcional: exige "Authorization: Bearer <token>"
+HISTOGRAM_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class Metrics:
+    """Registro de métricas em memória (counters, gauges e histogramas)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._defs = {}    # nome -> (tipo, ajuda, nomes dos labels)
+        self._values = {}  # nome -> {labels: valor | [buckets..., soma, contagem]}
+
+    def define(self, name: str, kind: str, help_text: str, labels=()):
+        self._defs[name] = (kind, help_text, tuple(labels))
+        self._values[name] = {}
+
+    def inc(self, name: str, labels=(), value: float = 1):
+        with self._lock:
+            series = self._values[name]
+            series[labels] = series.get(labels, 0) + value
+
+    def observe(self, name: str, labels, value: float):
+        with self._lock:
+            series = self._values[name]
+            hist = series.get(labels)
+            if hist is None:
+                hist = series[labels] = [0] * len(HISTOGRAM_BUCKETS) + [0.0, 0]
+            for i, limite in enumerate(HISTOGRAM_BUCKETS):
+                if value <= limite:
+                    hist[i] += 1
+            hist[-2] += value
+            hist[-1] += 1
+
+    def set(self, name: str, labels, value: float):
+        with self._lock:
+            self._values[name][labels] = value
+
+    @staticmethod
+    def _fmt_labels(names, values, extra=None):
+        pares = list(zip(names, values))
+        if extra:
+            pares.append(extra)
+        if not pares:
+            return ""
+        def esc(v):
+            return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in pares) + "}"
+
+    def render(self) -> str:
+        """Gera o texto no formato de exposição do Prometheus (versão 0.0.4)"""
+        linhas = []
+        with self._lock:
+            for name, (kind, help_text, label_names) in self._defs.items():
+                linhas.append(f"# HELP {name} {help_text}")
+                linhas.append(f"# TYPE {name} {kind}")
+                for labels, value in sorted(self._values[name].items()):
+                    if kind == "histogram":
+                        for limite, n in zip(HISTOGRAM_BUCKETS, value):
+                            linhas.append(f"{name}_bucket{self._fmt_labels(label_names, labels, ('le', limite))} {n}")
+                        linhas.append(f"{name}_bucket{self._fmt_labels(label_names, labels, ('le', '+Inf'))} {value[-1]}")
+                        linhas.append(f"{name}_sum{self._fmt_labels(label_names, labels)} {value[-2]}")
+                        linhas.append(f"{name}_count{self._fmt_labels(label_names, labels)} {value[-1]}")
+                    else:
+                        linhas.append(f"{name}{self._fmt_labels(label_names, labels)} {value}")
+        return "\n".join(linhas) + "\n"
+
+METRICS = Metrics()
+METRICS.define("ligacoes_http_requests_total", "counter", "Requisições HTTP por rota, método e status", ("route", "method", "status"))
+METRICS.define("ligacoes_http_request_duration_seconds", "histogram", "Duração das requisições HTTP (até o fim do corpo da resposta)", ("route", "method"))
+METRICS.define("ligacoes_http_requests_in_flight", "gauge", "Requisições HTTP em andamento")
+METRICS.define("ligacoes_db_queries_total", "counter", "Queries SQL executadas por rota", ("route",))
+METRICS.define("ligacoes_db_query_duration_seconds", "histogram", "Duração das queries SQL por rota", ("route",))
+METRICS.define("ligacoes_export_render_duration_seconds", "histogram", "Tempo de geração das exportações", ("formato", "tipo"))
+METRICS.define("ligacoes_active_sessions", "gauge", "Sessões ativas no armazenamento de sessões")
+METRICS.set("ligacoes_http_requests_in_flight", (), 0)
+
+# Contexto da requisição atual, visível também nas threads do threadpool e nos
+# hooks do SQLAlchemy (o FastAPI copia o contexto ao executar rotas síncronas)
+_request_ctx = contextvars.ContextVar("request_ctx", default=None)
+
+def _route_label(scope) -> str:
+    """Rota no formato do template (/editar/{ligacao_id}) para não explodir a cardinalidade"""
+    route = scope.get("route") if scope else None
+    return getattr(route, "path", None) or "desconhecida"
+
+class MetricsMiddleware:
+    """Middleware ASGI que mede latência, status e requisições em andamento por rota"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        ctx = {"scope": scope}
+        if b"_profile=" in scope["query_string"] or any(k == b"x-profile" for k, _ in scope["headers"]):
+            _enable_profiling(ctx, scope)
+        ctx_token = _request_ctx.set(ctx)
+        METRICS.inc("ligacoes_http_requests_in_flight")
+        inicio = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duracao = time.perf_counter() - inicio
+            route = _route_label(scope)
+            METRICS.inc("ligacoes_http_requests_in_flight", value=-1)
+            METRICS.inc("ligacoes_http_requests_total", (route, scope["method"], str(status["code"])))
+            METRICS.observe("ligacoes_http_request_duration_seconds", (route, scope["method"]), duracao)
+            _request_ctx.reset(ctx_token)
+
+app.add_middleware(MetricsMiddleware)
+
+# O início fica no contexto de execução da própria query: uma query que falha não chega ao
+# after_cursor_execute, e uma pilha por conexão ficaria com a entrada dela para sempre
+@event.listens_for(engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._inicio_query = time.perf_counter()
+
+@event.listens_for(engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    inicio = getattr(context, "_inicio_query", None)
+    if inicio is None:
+        return
+    duracao = time.perf_counter() - inicio
+    ctx = _request_ctx.get()
+    route = _route_label(ctx["scope"]) if ctx else "fora_de_requisicao"
+    METRICS.inc("ligacoes_db_queries_total", (route,))
+    METRICS.observe("ligacoes_db_query_duration_seconds", (route,), duracao)
+    if ctx and "profile" in ctx:
+        ctx["sql"].append((statement, duracao))
+    if duracao * 1000 >= SLOW_QUERY_MS:
+        _registrar_query_lenta(conn, statement, parameters, executemany, duracao, route)
+
+if read_engine is not engine:
+    event.listen(read_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(read_engine, "after_cursor_execute", _after_cursor_execute)
+
+# Roteamento de leituras para a réplica
+# O atraso da réplica é estimado comparando a última gravação (max(updated_at)) vista no
+# primário e na réplica; acima de READ_MAX_LAG_SECONDS, ou com a réplica fora do ar, as
+# leituras voltam para o primário. Quem acabou de gravar recebe um cookie e lê do primário
+# por READ_YOUR_WRITES_SECONDS (ex.: a listagem logo após o redirect do cadastro).
+READ_MAX_LAG_SECONDS = float(os.getenv("READ_MAX_LAG_SECONDS", "5"))
+READ_YOUR_WRITES_SECONDS = int(os.getenv("READ_YOUR_WRITES_SECONDS", "15"))
+READ_LAG_CHECK_INTERVAL_SECONDS = 2.0  # o atraso medido vale por esse tempo
+READ_YOUR_WRITES_COOKIE = "ler_primario_ate"
+
+METRICS.define("ligacoes_db_read_routing_total", "counter", "Leituras roteáveis por destino e motivo", ("destino", "motivo"))
+METRICS.define("ligacoes_db_replica_lag_seconds", "gauge", "Atraso estimado da réplica de leitura (-1 = indisponível)")
+
+_replica_lock = threading.Lock()
+_replica_estado = {"verificado_em": None, "ok": False}
+
+def _ultima_gravacao(eng):
+    with eng.connect() as conn:
+        return conn.execute(select(func.max(Ligacao.updated_at))).scalar()
+
+def _medir_lag_replica() -> float:
+    """Segundos entre a última gravação vista no primário e a vista na réplica"""
+    primario = _ultima_gravacao(engine)
+    if primario is None:
+        return 0.0
+    replica = _ultima_gravacao(read_engine)
+    if replica is None:
+        return float("inf")
+    return max(0.0, (primario - replica).total_seconds())
+
+def _replica_disponivel() -> bool:
+    agora = time.monotonic()
+    with _replica_lock:
+        verificado_em = _replica_estado["verificado_em"]
+        if verificado_em is not None and agora - verificado_em < READ_LAG_CHECK_INTERVAL_SECONDS:
+            return _replica_estado["ok"]
+        # Marca antes de medir: as requisições concorrentes usam o resultado anterior
+        _replica_estado["verificado_em"] = agora
+    try:
+        lag = _medir_lag_replica()
+    except Exception:
+        lag = float("inf")
+    ok = lag <= READ_MAX_LAG_SECONDS
+    with _replica_lock:
+        _replica_estado["ok"] = ok
+    METRICS.set("ligacoes_db_replica_lag_seconds", (), lag if lag != float("inf") else -1)
+    return ok
+
+def _gravou_recentemente(request: Request) -> bool:
+    """O navegador gravou há menos de READ_YOUR_WRITES_SECONDS (cookie de _marcar_gravacao)?"""
+    try:
+        return float(request.cookies.get(READ_YOUR_WRITES_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+def _sessao_leitura(request: Request = None):
+    """Sessão para leituras que toleram o atraso da réplica (relatórios, exportações, listagens)"""
+    if read_engine is engine:
+        return SessionLocal()
+    if request is not None and _gravou_recentemente(request):
+        METRICS.inc("ligacoes_db_read_routing_total", ("primario", "leitura_apos_gravacao"))
+        return SessionLocal()
+    if not _replica_disponivel():
+        METRICS.inc("ligacoes_db_read_routing_total", ("primario", "replica_atrasada"))
+        return SessionLocal()
+    METRICS.inc("ligacoes_db_read_routing_total", ("replica", "ok"))
+    return ReadSessionLocal()
+
+def _marcar_gravacao(response):
+    """Após gravar, as próximas leituras deste navegador vão ao primário por alguns segundos"""
+    if read_engine is not engine:
+        response.set_cookie(READ_YOUR_WRITES_COOKIE, str(int(time.time()) + READ_YOUR_WRITES_SECONDS),
+                            max_age=READ_YOUR_WRITES_SECONDS, httponly=True, samesite="lax")
+    return response
+
+# Log de queries lentas com EXPLAIN automático
+# Toda query acima de SLOW_QUERY_MS vai para um log rotativo (uma linha JSON por ocorrência)
+# e para o ranking em memória exibido em /admin/queries-lentas.
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "500"))
+SLOW_QUERY_LOG = os.getenv("SLOW_QUERY_LOG", os.path.join("logs", "slow_queries.log"))
+SLOW_QUERY_MAX_STATEMENTS = 200  # limite do ranking em memória
+
+METRICS.define("ligacoes_db_slow_queries_total", "counter", "Queries acima de SLOW_QUERY_MS por rota", ("route",))
+
+_slow_lock = threading.Lock()
+_slow_queries = {}   # statement -> estatísticas agregadas
+_explain_cache = OrderedDict()  # statement -> plano (o plano não muda a cada execução); LRU
+_slow_logger = None
+
+def _get_slow_logger():
+    global _slow_logger
+    if _slow_logger is None:
+        os.makedirs(os.path.dirname(SLOW_QUERY_LOG) or ".", exist_ok=True)
+        logger = logging.getLogger("ligacoes.slow_queries")
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        logger.handlers.clear()
+        handler = RotatingFileHandler(SLOW_QUERY_LOG, maxBytes=5 * 1024 * 1024, backupCount=5, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        _slow_logger = logger
+    return _slow_logger
+
+def _explain(conn, statement, parameters):
+    """Plano de execução da query (EXPLAIN QUERY PLAN no SQLite, EXPLAIN no PostgreSQL)"""
+    if not statement.lstrip().upper().startswith(("SELECT", "WITH")):
+        return None
+    sqlite = conn.dialect.name == "sqlite"
+    prefixo = "EXPLAIN QUERY PLAN " if sqlite else "EXPLAIN "
+    # Cursor cru da DBAPI: não dispara os hooks de novo nem interfere no cursor original.
+    # No PostgreSQL um erro aborta a transação da requisição: o EXPLAIN roda num SAVEPOINT
+    # e, se falhar, só ele é desfeito.
+    cursor = conn.connection.cursor()
+    try:
+        if not sqlite:
+            cursor.execute("SAVEPOINT explain_query_lenta")
+        try:
+            cursor.execute(prefixo + statement, parameters)
+            linhas = cursor.fetchall()
+        except Exception as e:
+            if not sqlite:
+                cursor.execute("ROLLBACK TO SAVEPOINT explain_query_lenta")
+            return f"(EXPLAIN falhou: {e})"
+        finally:
+            if not sqlite:
+                cursor.execute("RELEASE SAVEPOINT explain_query_lenta")
+    except Exception as e:
+        return f"(EXPLAIN falhou: {e})"
+    finally:
+        cursor.close()
+    if conn.dialect.name == "sqlite":
+        # (id, parent, notused, detail)
+        return "\n".join(str(linha[-1]) for linha in linhas)
+    return "\n".join(str(linha[0]) for linha in linhas)
+
+def _registrar_query_lenta(conn, statement, parameters, executemany, duracao, route):
+    METRICS.inc("ligacoes_db_slow_queries_total", (route,))
+    with _slow_lock:
+        conhecido = statement in _explain_cache
+        if conhecido:
+            _explain_cache.move_to_end(statement)
+            plano = _explain_cache[statement]
+    if not conhecido:
+        plano = None if executemany else _explain(conn, statement, parameters)
+        with _slow_lock:
+            _explain_cache[statement] = plano
+            while len(_explain_cache) > SLOW_QUERY_MAX_STATEMENTS:
+                _explain_cache.popitem(last=False)
+    duracao_ms = round(duracao * 1000, 2)
+    parametros = "(executemany)" if executemany else parameters
+    entrada = {
+        "ts": datetime.now(timezone.utc).isoformat(),
+        "route": route,
+        "duracao_ms": duracao_ms,
+        "sql": statement,
+        "parametros": parametros,
+        "explain": plano,
+    }
+    try:
+        _get_slow_logger().info(json.dumps(entrada, ensure_ascii=False, default=str))
+    except OSError:
+        pass  # sem permissão de escrita: mantém só o ranking em memória
+
+    with _slow_lock:
+        item = _slow_queries.get(statement)
+        if item is None:
+            if len(_slow_queries) >= SLOW_QUERY_MAX_STATEMENTS:
+                # descarta a de menor tempo total para abrir espaço
+                menor = min(_slow_queries, key=lambda k: _slow_queries[k]["total_ms"])
+                del _slow_queries[menor]
+            item = _slow_queries[statement] = {"sql": statement, "vezes": 0, "total_ms": 0.0,
+                                               "max_ms": 0.0, "rotas": set(), "explain": plano}
+        item["vezes"] += 1
+        item["total_ms"] += duracao_ms
+        if duracao_ms >= item["max_ms"]:
+            item["max_ms"] = duracao_ms
+            item["parametros"] = str(parametros)[:500]
+        item["rotas"].add(route)
+        item["ultima"] = entrada["ts"]
+
+def piores_queries(ordem: str = "total_ms", limite: int = 50):
+    """Ranking das queries lentas registradas neste processo"""
+    with _slow_lock:
+        itens = [{**q, "rotas": sorted(q["rotas"]), "media_ms": round(q["total_ms"] / q["vezes"], 2),
+                  "total_ms": round(q["total_ms"], 2)} for q in _slow_queries.values()]
+    return sorted(itens, key=lambda q: q.get(ordem, 0), reverse=True)[:limite]
+
+# Profiling sob demanda (somente administradores)
+# Uso: acrescente ?_profile=json (ou o header "X-Profile: json") a qualquer rota.
+#   json    -> devolve o perfil (funções mais caras, SQL executado e pilhas) no lugar da resposta
+#   folded  -> devolve só as pilhas no formato "folded" (flamegraph.pl, speedscope, etc.)
+#   salvar  -> devolve a resposta normal e grava o perfil em PROFILE_DIR (header X-Profile-Id)
+# Sem a flag, o custo é só a verificação da query string/header no middleware.
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "1")) / 1000
+PROFILE_MODES = {"1": "json", "json": "json", "folded": "folded", "salvar": "salvar"}
+
+def _enable_profiling(ctx, scope):
+    """Liga o profiling da requisição se a flag for válida e o usuário for administrador"""
+    req = Request(scope)
+    modo = PROFILE_MODES.get(req.query_params.get("_profile") or req.headers.get("x-profile", ""))
+    token = req.cookies.get(SESSION_COOKIE_NAME)
+    if not modo or not token or not is_valid_session(token):
+        return
+    if not can_access_reports(active_sessions[token]["username"]):
+        return
+    ctx["profile"] = modo
+    ctx["sql"] = []
+
+class _StackSampler(threading.Thread):
+    """Amostra periodicamente a pilha de uma thread para gerar pilhas no formato folded"""
+
+    def __init__(self, thread_id: int, interval: float, stop_code):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stop_code = stop_code  # corta a pilha acima do wrapper de profiling
+        self.samples = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None and frame.f_code is not self.stop_code:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+def _iterador_sincrono(response):
+    """Iterador síncrono original de uma StreamingResponse. O Starlette o embrulha em
+    iterate_in_threadpool, que o consumiria em outras threads do pool, fora do profiler;
+    o gerador assíncrono ainda não iniciado guarda o original no argumento `iterator`."""
+    if not isinstance(response, StreamingResponse):
+        return None
+    corpo = response.body_iterator
+    if getattr(corpo, "ag_code", None) is not iterate_in_threadpool.__code__ or corpo.ag_frame is None:
+        return None
+    return corpo.ag_frame.f_locals.get("iterator")
+
+def _run_profiled(endpoint, ctx, args, kwargs):
+    """Executa o handler sob cProfile + amostragem de pilhas e monta o perfil"""
+    profiler = cProfile.Profile()
+    sampler = _StackSampler(threading.get_ident(), PROFILE_SAMPLE_INTERVAL, _run_profiled.__code__)
+    sampler.start()
+    inicio = time.perf_counter()
+    profiler.enable()
+    try:
+        response = endpoint(*args, **kwargs)
+        corpo_bytes = None
+        iterador = _iterador_sincrono(response)
+        if iterador is not None:
+            # Respostas em streaming fazem o trabalho ao iterar o corpo: consome aqui, nesta
+            # thread (a que está sob cProfile e amostragem), e devolve o corpo já pronto
+            pedacos = [p.encode(response.charset) if isinstance(p, str) else p for p in iterador]
+            corpo_bytes = sum(len(p) for p in pedacos)
+            response.body_iterator = iterate_in_threadpool(iter(pedacos))
+    finally:
+        profiler.disable()
+        duracao = time.perf_counter() - inicio
+        sampler.stop()
+
+    folded = "\n".join(f"{stack} {n}" for stack, n in sampler.samples.most_common())
+    sql = {}
+    for statement, dur in ctx["sql"]:
+        item = sql.setdefault(statement, {"sql": statement[:2000], "vezes": 0, "tempo_ms": 0.0})
+        item["vezes"] += 1
+        item["tempo_ms"] += dur * 1000
+    stats = pstats.Stats(profiler)
+    top = []
+    for (arquivo, linha, funcao), (cc, nc, tt, ct, _) in sorted(stats.stats.items(), key=lambda kv: kv[1][3], reverse=True)[:40]:
+        top.append({
+            "funcao": f"{funcao} ({os.path.basename(arquivo)}:{linha})",
+            "chamadas": nc,
+            "tempo_proprio_ms": round(tt * 1000, 3),
+            "tempo_cumulativo_ms": round(ct * 1000, 3),
+        })
+    perfil = {
+        "rota": _route_label(ctx["scope"]),
+        "query_string": ctx["scope"]["query_string"].decode("latin-1"),
+        "duracao_ms": round(duracao * 1000, 2),
+        "bytes_resposta": corpo_bytes,
+        "sql": {
+            "total": len(ctx["sql"]),
+            "tempo_ms": round(sum(d for _, d in ctx["sql"]) * 1000, 3),
+            "queries": sorted(({**q, "tempo_ms": round(q["tempo_ms"], 3)} for q in sql.values()),
+                              key=lambda q: q["tempo_ms"], reverse=True),
+        },
+        "top_funcoes": top,
+        "folded": folded,
+    }
+
+    if ctx["profile"] == "json":
+        return JSONResponse(perfil)
+    if ctx["profile"] == "folded":
+        return PlainTextResponse(folded + "\n")
+
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    rota_slug = perfil["rota"].strip("/").replace("/", "_").replace("{", "").replace("}", "") or "raiz"
+    profile_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{rota_slug}_{secrets.token_hex(3)}"
+    base = os.path.join(PROFILE_DIR, profile_id)
+    stats.dump_stats(base + ".prof")
+    with open(base + ".folded", "w", encoding="utf-8") as f:
+        f.write(folded + "\n")
+    with open(base + ".json", "w", encoding="utf-8") as f:
+        json.dump(perfil, f, ensure_ascii=False, indent=2)
+    if not isinstance(response, Response):
+        # Handlers que devolvem dict: serializa aqui para poder anexar o header
+        response = JSONResponse(jsonable_encoder(response))
+    response.headers["X-Profile-Id"] = profile_id
+    return response
+
+def _profilable(endpoint):
+    """Envolve handlers síncronos para que possam ser executados sob profiling"""
+    if pyinspect.iscoroutinefunction(endpoint):
+        return endpoint
+
+    @functools.wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        ctx = _request_ctx.get()
+        if ctx is None or "profile" not in ctx:
+            return endpoint(*args, **kwargs)
+        return _run_profiled(endpoint, ctx, args, kwargs)
+
+    return wrapper
+
+class ProfilingRoute(APIRoute):
+    """Rota cujo handler pode ser executado sob profiling (ver _profilable)"""
+
+    def __init__(self, path, endpoint, **kwargs):
+        super().__init__(path, _profilable(endpoint), **kwargs)
+
+app.router.route_class = ProfilingRoute
+
+@app.get("/metrics")
+def metrics(request: Request):
+    if METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Não autorizado")
+    METRICS.set("ligacoes_active_sessions", (), len(active_sessions))
+    return PlainTextResponse(METRICS.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+# Saúde e prontidão
+# /healthz responde assim que o processo está no ar (liveness). /readyz só passa depois do
+# aquecimento: conexões do pool abertas, templates compilados, consulta de teste e os
+# relatórios da abertura de /relatorios já no STATS_CACHE; até lá (ou se o banco cair)
+# responde 503, para o balanceador não mandar usuários para uma instância fria.
+# As respostas aquecidas expiram como as demais (STATS_CACHE_TTL_SECONDS): servem às primeiras
+# requisições após o deploy; "pronto" não quer dizer que o cache continue cheio depois disso.
+# O aquecimento roda em uma thread após o startup e é repetido até dar certo.
+WARMUP_RETRY_SECONDS = float(os.getenv("WARMUP_RETRY_SECONDS", "5"))
+WARMUP_TEMPLATES = ("index.html", "relatorios.html", "login.html", "editar.html")
+
+aquecimento_logger = logging.getLogger("ligacoes.aquecimento")
+_aquecimento = {"pronto": False, "etapas": {}, "duracao_s": None, "erro": None}
+
+def _aquecer_pool(eng):
+    """Abre ao mesmo tempo todas as conexões que o pool mantém e as devolve abertas"""
+    conexoes = []
+    try:
+        for _ in range(max(1, getattr(eng.pool, "size", lambda: 1)())):
+            conn = eng.connect()
+            conexoes.append(conn)
+            conn.execute(text("SELECT 1"))
+    finally:
+        for conn in conexoes:
+            conn.close()
+
+def _compilar_templates():
+    # O Jinja guarda o template compilado (e os que ele estende) no cache do ambiente
+    for nome in WARMUP_TEMPLATES:
+        templates.env.get_template(nome)
+
+def _aquecer_caches_relatorios():
+    # Só as primeiras aberturas de /relatorios após o deploy encontram estas respostas: elas
+    # expiram em STATS_CACHE_TTL_SECONDS e depois o cache se refaz com o uso normal.
+    # URLs que o relatorios.js pede ao abrir a página sem filtros (mesmas chaves de cache).
+    # serie e comparativo_periodo recebem max_points pela largura do gráfico: aqui vai o valor
+    # do relatorios.js sem largura conhecida (900px); em outra largura a chave muda, mas a
+    # consulta já passou pelo banco (páginas em memória e planos prontos).
+    rotas = [
+        (stats_total, "/api/stats/total", ""),
+        (stats_por_duvida, "/api/stats/por_duvida", ""),
+        (stats_por_dia, "/api/stats/por_dia", ""),
+        (stats_serie, "/api/stats/serie", "periodo=dia&janela=7&max_points=300"),
+        (stats_comparativo_periodo, "/api/stats/comparativo_periodo", "periodo=dia&max_points=150"),
+        (stats_pico_horarios, "/api/stats/pico_horarios", ""),
+        (stats_por_atendente, "/api/stats/por_atendente", ""),
+        (stats_produtividade, "/api/stats/produtividade", f"pausa={PRODUTIVIDADE_PAUSA_MINUTOS}"),
+    ]
+    for rota, caminho, query in rotas:
+        rota.aquecer(Request({"type": "http", "method": "GET", "path": caminho,
+                              "query_string": query.encode(), "headers": []}))
+
+def aquecer() -> Dict[str, Any]:
+    """Executa as etapas do aquecimento e marca a instância como pronta; devolve as durações (s)"""
+    inicio = time.perf_counter()
+    etapas = {}
+
+    def etapa(nome, funcao, *args):
+        t0 = time.perf_counter()
+        funcao(*args)
+        etapas[nome] = round(time.perf_counter() - t0, 4)
+
+    etapa("pool", _aquecer_pool, engine)
+    if read_engine is not engine:
+        etapa("pool_leitura", _aquecer_pool, read_engine)
+    etapa("templates", _compilar_templates)
+    etapa("consulta", _ultima_gravacao, read_engine)
+    etapa("caches", _aquecer_caches_relatorios)
+
+    _aquecimento.update(pronto=True, etapas=etapas, duracao_s=round(time.perf_counter() - inicio, 4), erro=None)
+    aquecimento_logger.info("Aquecimento concluído: %s", json.dumps(etapas))
+    return etapas
+
+def _loop_aquecimento():
+    while True:
+        try:
+            aquecer()
+            return
+        except Exception as e:
+            _aquecimento["erro"] = f"{type(e).__name__}: {e}"
+            aquecimento_logger.exception("Falha no aquecimento; nova tentativa em %s s", WARMUP_RETRY_SECONDS)
+            time.sleep(WARMUP_RETRY_SECONDS)
+
+def _iniciar_aquecimento():
+    if not aquecimento_logger.handlers:
+        aquecimento_logger.setLevel(logging.INFO)
+        aquecimento_logger.addHandler(logging.StreamHandler())
+    threading.Thread(target=_loop_aquecimento, name="aquecimento", daemon=True).start()
+
+app.add_event_handler("startup", _iniciar_aquecimento)
+
+@app.get("/healthz")
+def healthz():
+    return {"status": "ok"}
+
+@app.get("/readyz")
+def readyz():
+    corpo = {
+        "status": "pronto" if _aquecimento["pronto"] else "aquecendo",
+        "etapas": _aquecimento["etapas"],
+        "duracao_s": _aquecimento["duracao_s"],
+    }
+    if not _aquecimento["pronto"]:
+        if _aquecimento["erro"]:
+            corpo["erro"] = _aquecimento["erro"]
+        return JSONResponse(corpo, status_code=503)
+    # Depois de pronta, continua conferindo o banco (uma conexão já aberta do pool)
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+    except Exception as e:
+        corpo.update(status="sem_banco", erro=f"{type(e).__name__}: {e}")
+        return JSONResponse(corpo, status_code=503)
+    return corpo
 
 # Helpers de fuso horário
 UTC = ZoneInfo("UTC")
@@ -347,10 +1193,11 @@ def home(request: Request, session_token: str = Cookie(None, alias=SESSION_COOKI
     current_user = active_sessions[session_token]
     current_username = current_user['username']
     
-    db = SessionLocal()
+    db = _sessao_leitura(request)
     try:
         # Mostrar apenas registros não excluídos (deleted_at IS NULL)
-        ligacoes = db.query(Ligacao).filter(Ligacao.deleted_at.is_(None)).order_by(Ligacao.id.desc()).limit(50).all()
+        ligacoes = _ler_linhas(db, _select_linhas(Ligacao.__table__.c, Ligacao.deleted_at.is_(None))
+                               .order_by(Ligacao.id.desc()).limit(50))
     finally:
         db.close()
     return templates.TemplateResponse(
@@ -368,6 +1215,112 @@ def home(request: Request, session_token: str = Cookie(None, alias=SESSION_COOKI
         },
     )
 
+# API: "meu dia" do atendente logado (ligações de hoje, por tipo de dúvida)
+# Disponível para todos os usuários; lê só as linhas do próprio atendente no dia
+# pelo índice (atendente, created_at), então o custo não cresce com o total do banco.
+@app.get("/api/meu_dia")
+def meu_dia(request: Request, session_token: str = Cookie(None, alias=SESSION_COOKIE_NAME)):
+    if not session_token or not is_valid_session(session_token):
+        raise HTTPException(status_code=401, detail="Não autorizado")
+    atendente = get_user_full_name(active_sessions[session_token]["username"])
+    hoje = datetime.now(TZ).date()
+    inicio, fim = _sp_bounds_utc(hoje, hoje)
+
+    db = _sessao_leitura(request)
+    try:
+        contagem = dict(db.execute(
+            select(Ligacao.duvida, func.count())
+            .where(Ligacao.atendente == atendente, Ligacao.created_at >= inicio, Ligacao.created_at < fim,
+                   Ligacao.deleted_at.is_(None))
+            .group_by(Ligacao.duvida)
+        ).all())
+    finally:
+        db.close()
+
+    ordem = DUVIDA_OPCOES + sorted(set(contagem) - set(DUVIDA_OPCOES))
+    return {
+        "atendente": atendente,
+        "dia": hoje.isoformat(),
+        "total": sum(contagem.values()),
+        "por_duvida": [{"duvida": d, "count": contagem[d]} for d in ordem if contagem.get(d)],
+    }
+
+# Índice de termos das observações (tabela ligacoes_termos)
+# Cada observação vira um conjunto de termos: minúsculas, sem acentos, só letras/dígitos,
+# 3+ caracteres, sem stopwords nem números puros (CRO, telefone). Cada termo conta uma vez
+# por ligação. As gravações ajustam as contagens na mesma transação, com upsert somando
+# a diferença; termos que não mudaram numa edição não geram escrita.
+TERMOS_MIN_CARACTERES = 3
+TERMOS_MAX_CARACTERES = 40  # tamanho da coluna; termos maiores são cortados
+TERMOS_STOPWORDS = frozenset("""
+    a ao aos as com como da das de do dos e ela ele em entre era essa esse esta este eu foi
+    ha isso ja la mais mas me mesmo na nao nas nem no nos o os ou para pela pelo por pra que
+    se sem ser seu sua tem ter um uma uns umas sobre apos ate tambem quando qual muito via
+""".split())
+_TERMO_RE = re.compile(r"[a-z0-9]+")
+
+def _termos(texto) -> set:
+    if not texto:
+        return set()
+    sem_acentos = "".join(c for c in unicodedata.normalize("NFKD", texto.lower()) if not unicodedata.combining(c))
+    return {
+        t[:TERMOS_MAX_CARACTERES] for t in _TERMO_RE.findall(sem_acentos)
+        if len(t) >= TERMOS_MIN_CARACTERES and not t.isdigit() and t not in TERMOS_STOPWORDS
+    }
+
+def _ajustar_termos(conn, removidas=(), incluidas=()):
+    """Tira do índice as versões `removidas` e soma as `incluidas`: (created_at, duvida, observacao)"""
+    deltas = Counter()
+    for sinal, linhas in ((-1, removidas), (1, incluidas)):
+        for created_at, duvida, observacao in linhas:
+            dia = to_sp(created_at).date()
+            for termo in _termos(observacao):
+                deltas[(dia, duvida, termo)] += sinal
+    deltas = {chave: delta for chave, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    t = LigacaoTermo.__table__
+    dialeto = postgresql if conn.dialect.name == "postgresql" else sqlite
+    stmt = dialeto.insert(t)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[t.c.dia, t.c.duvida, t.c.termo],
+        set_={"contagem": t.c.contagem + stmt.excluded.contagem},
+    )
+    conn.execute(stmt, [
+        {"dia": dia, "duvida": duvida, "termo": termo, "contagem": delta}
+        for (dia, duvida, termo), delta in sorted(deltas.items())
+    ])
+    if any(delta < 0 for delta in deltas.values()):
+        conn.execute(t.delete().where(t.c.contagem <= 0, t.c.dia.in_({dia for dia, _, _ in deltas})))
+
+def reindexar_termos(lote: int = 5000) -> int:
+    """Recria o índice de termos a partir das observações (tabela ativa e arquivo); devolve as ligações lidas"""
+    lidas = 0
+    # Uma transação só: gravações simultâneas esperam e não ficam fora do índice
+    with engine.begin() as conn:
+        conn.execute(LigacaoTermo.__table__.delete())
+        for tabela in (Ligacao.__table__, LigacaoArquivo.__table__):
+            ultimo_id = 0
+            while True:
+                linhas = conn.execute(
+                    select(tabela.c.id, tabela.c.created_at, tabela.c.duvida, tabela.c.observacao)
+                    .where(tabela.c.id > ultimo_id, tabela.c.deleted_at.is_(None),
+                           tabela.c.observacao.isnot(None), tabela.c.observacao != "")
+                    .order_by(tabela.c.id)
+                    .limit(lote)
+                ).all()
+                if not linhas:
+                    break
+                _ajustar_termos(conn, incluidas=[linha[1:] for linha in linhas])
+                lidas += len(linhas)
+                ultimo_id = linhas[-1].id
+    return lidas
+
+# Banco existente que acabou de ganhar a tabela: monta o índice com o que já foi registrado
+if "ligacoes_termos" not in _tabelas_existentes:
+    reindexar_termos()
+
 # Cadastrar ligação
 @app.post("/cadastrar")
 def cadastrar(
@@ -399,10 +1352,11 @@ def cadastrar(
             created_at=datetime.now(timezone.utc),
         )
         db.add(novo)
+        _ajustar_termos(db.connection(), incluidas=[(novo.created_at, novo.duvida, novo.observacao)])
         db.commit()
     finally:
         db.close()
-    return RedirectResponse("/", status_code=303)
+    return _marcar_gravacao(RedirectResponse("/", status_code=303))
 
 # --- EDITAR (GET): formulário preenchido
 @app.get("/editar/{ligacao_id}")
@@ -466,16 +1420,18 @@ def editar_submit(
         if not obj or obj.deleted_at is not None:
             raise HTTPException(status_code=404, detail="Registro não encontrado")
 
+        antes = (obj.created_at, obj.duvida, obj.observacao)
         obj.cro = cro.strip()
         obj.nome_inscrito = nome_inscrito.strip()
         obj.duvida = duvida.strip()
         obj.observacao = (observacao or "").strip()
+        _ajustar_termos(db.connection(), removidas=[antes], incluidas=[(obj.created_at, obj.duvida, obj.observacao)])
 
         db.add(obj)
         db.commit()
     finally:
         db.close()
-    return RedirectResponse("/", status_code=303)
+    return _marcar_gravacao(RedirectResponse("/", status_code=303))
 
 # EXCLUIR ligação
 @app.post("/excluir/{ligacao_id}")
@@ -496,11 +1452,96 @@ def excluir(ligacao_id: int, session_token: str = Cookie(None, alias=SESSION_COO
         if not obj:
             raise HTTPException(status_code=404, detail="Registro não encontrado")
         # Soft delete: marcar como excluído ao invés de deletar
+        if obj.deleted_at is None:
+            _ajustar_termos(db.connection(), removidas=[(obj.created_at, obj.duvida, obj.observacao)])
         obj.deleted_at = datetime.now(UTC)
         db.commit()
     finally:
         db.close()
-    return RedirectResponse("/", status_code=303)
+    return _marcar_gravacao(RedirectResponse("/", status_code=303))
+
+# Operações em lote (administradores): um único UPDATE para o conjunto inteiro.
+# Atualizam updated_at (feed /api/changes) e, ao confirmar, limpam o cache de /api/stats/*.
+BULK_MAX_IDS = 5000
+
+def _exigir_edicao_api(session_token: str):
+    if not session_token or not is_valid_session(session_token):
+        raise HTTPException(status_code=401, detail="Não autorizado")
+    if not can_edit_delete(active_sessions[session_token]["username"]):
+        raise HTTPException(status_code=403, detail="Acesso negado")
+
+def _validar_ids(ids):
+    ids = sorted(set(ids or []))
+    if len(ids) > BULK_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"No máximo {BULK_MAX_IDS} ids por operação")
+    return ids
+
+def _atualizar_em_lote(clauses, valores) -> int:
+    tabela = Ligacao.__table__
+    agora = datetime.now(UTC)
+    clauses = [tabela.c.deleted_at.is_(None), *clauses]
+    with engine.begin() as conn:
+        antes = []
+        if "deleted_at" in valores or "duvida" in valores:
+            # Índice de termos: as linhas atingidas saem com a dúvida antiga (e voltam com a nova)
+            antes = conn.execute(
+                select(tabela.c.created_at, tabela.c.duvida, tabela.c.observacao).where(*clauses).with_for_update()
+            ).all()
+        resultado = conn.execute(tabela.update().where(*clauses).values(**valores, updated_at=agora))
+        if antes:
+            depois = [] if "deleted_at" in valores else [(c, valores["duvida"], o) for c, _, o in antes]
+            _ajustar_termos(conn, removidas=antes, incluidas=depois)
+    return resultado.rowcount
+
+@app.post("/api/ligacoes/lote/excluir")
+def excluir_em_lote(
+    ids: List[int] = Form(...),
+    session_token: str = Cookie(None, alias=SESSION_COOKIE_NAME),
+):
+    _exigir_edicao_api(session_token)
+    ids = _validar_ids(ids)
+    afetadas = _atualizar_em_lote([Ligacao.id.in_(ids)], {"deleted_at": datetime.now(UTC)})
+    return _marcar_gravacao(JSONResponse({"solicitadas": len(ids), "afetadas": afetadas}))
+
+@app.post("/api/ligacoes/lote/reclassificar")
+def reclassificar_em_lote(
+    ids: List[int] = Form(None),
+    start: str = Form(""),
+    end: str = Form(""),
+    tipos: str = Form(""),
+    atendente_atual: str = Form(""),
+    duvida: str = Form(""),
+    atendente: str = Form(""),
+    session_token: str = Cookie(None, alias=SESSION_COOKIE_NAME),
+):
+    """Troca a dúvida e/ou o atendente das ligações escolhidas por ids ou por filtro
+    (período no fuso BR, tipos de dúvida separados por vírgula e atendente atual)"""
+    _exigir_edicao_api(session_token)
+    valores = {}
+    if duvida:
+        if duvida not in DUVIDA_OPCOES:
+            raise HTTPException(status_code=400, detail="Dúvida inválida")
+        valores["duvida"] = duvida
+    if atendente.strip():
+        valores["atendente"] = atendente.strip()[:100]
+    if not valores:
+        raise HTTPException(status_code=400, detail="Informe a nova 'duvida' e/ou o novo 'atendente'")
+
+    ids = _validar_ids(ids)
+    inicio, fim = _parse_date(start), _parse_date(end)
+    if (start and inicio is None) or (end and fim is None):
+        raise HTTPException(status_code=400, detail="Datas devem estar no formato YYYY-MM-DD")
+    tipos_set = {t.strip() for t in tipos.split(",") if t.strip()}
+    if not (ids or inicio or fim or tipos_set or atendente_atual):
+        # Sem ids nem filtro seria a tabela inteira: exige ao menos um critério
+        raise HTTPException(status_code=400, detail="Informe 'ids' ou ao menos um filtro")
+    clauses = _filter_clauses(inicio, fim, tipos_set, Ligacao.__table__.c)
+    if ids:
+        clauses.append(Ligacao.id.in_(ids))
+    if atendente_atual:
+        clauses.append(Ligacao.atendente == atendente_atual)
+    afetadas = _atualizar_em_lote(clauses, valores)
+    return _marcar_gravacao(JSONResponse({"afetadas": afetadas}))
 
 # ... (restante do seu app.py permanece igual)
 # Certifique-se de que DUVIDA_OPCOES, to_sp(), etc. já existem como te enviei antes.
@@ -541,49 +1582,472 @@ def _parse_date(s: str):
     except Exception:
         return None
 
-def _filter_rows(rows, start_date, end_date, tipos):
-    # start_date/end_date são dates no fuso BR (America/Sao_Paulo)
-    # tipos é set() de strings; se vazio, não filtra por tipo
-    filtered = []
-    for row in rows:
-        # row pode ser Ligacao ou tupla (Ligacao.created_at, Ligacao.duvida)
-        if isinstance(row, tuple):
-            dt, duvida = row
+def _require_reports_access(session_token: str):
+    """Valida sessão e permissão de relatórios nas APIs; retorna o usuário atual"""
+    if not session_token or not is_valid_session(session_token):
+        raise HTTPException(status_code=401, detail="Não autorizado")
+    current_user = active_sessions[session_token]
+    if not can_access_reports(current_user['username']):
+        raise HTTPException(status_code=403, detail="Acesso negado - Você não tem permissão para acessar relatórios")
+    return current_user
+
+def _parse_filters(request: Request):
+    # Query params: start=YYYY-MM-DD, end=YYYY-MM-DD, tipos=csv
+    start = _parse_date(request.query_params.get("start"))
+    end = _parse_date(request.query_params.get("end"))
+    tipos_raw = request.query_params.get("tipos", "")
+    tipos = set([t for t in (s.strip() for s in tipos_raw.split(",")) if t]) if tipos_raw else set()
+    return start, end, tipos
+
+# Filtros e agrupamentos no próprio banco (fuso America/Sao_Paulo)
+# O banco grava created_at em UTC sem tzinfo. Os limites de data viram um intervalo
+# UTC (usa o índice e vale para qualquer fuso) e os agrupamentos convertem para SP:
+# no PostgreSQL pela tabela de fusos; no SQLite, que não tem fusos, pelo deslocamento
+# fixo atual (o Brasil não tem horário de verão desde 2019).
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+SP_UTC_OFFSET_HOURS = int(datetime.now(TZ).utcoffset().total_seconds() // 3600)
+PERIODOS = ("dia", "semana", "mes", "ano")
+
+def _sp_bounds_utc(start, end):
+    """Datas (dias em SP) -> limites UTC sem tzinfo: [inicio, fim)"""
+    inicio = fim = None
+    if start:
+        inicio = datetime.combine(start, dtime.min, tzinfo=TZ).astimezone(UTC).replace(tzinfo=None)
+    if end:
+        fim = datetime.combine(end + timedelta(days=1), dtime.min, tzinfo=TZ).astimezone(UTC).replace(tzinfo=None)
+    return inicio, fim
+
+def _filter_clauses(start, end, tipos, cols=None):
+    """Cláusulas WHERE dos filtros dos relatórios (datas no fuso BR + tipos de dúvida)"""
+    cols = cols if cols is not None else Ligacao.__table__.c
+    inicio, fim = _sp_bounds_utc(start, end)
+    clauses = [cols.created_at.isnot(None)]
+    if inicio:
+        clauses.append(cols.created_at >= inicio)
+    if fim:
+        clauses.append(cols.created_at < fim)
+    if tipos:
+        clauses.append(cols.duvida.in_(sorted(tipos)))
+    return clauses
+
+def _parse_historico(request: Request) -> bool:
+    """?historico=1 inclui as ligações arquivadas (eleições encerradas) na consulta"""
+    return request.query_params.get("historico", "").lower() in ("1", "true", "sim")
+
+def _fonte_ligacoes(historico: bool = False):
+    """Tabela consultada: só a ativa (padrão) ou ativa + arquivo histórico"""
+    if not historico:
+        return Ligacao.__table__
+    ativa, arquivo = Ligacao.__table__, LigacaoArquivo.__table__
+    return union_all(
+        select(*ativa.c),
+        select(*(arquivo.c[c.name] for c in ativa.c)),
+    ).subquery("ligacoes_todas")
+
+def _sp_local(col):
+    """Expressão SQL com o horário local de SP (sem tzinfo) a partir do created_at em UTC"""
+    if IS_SQLITE:
+        return func.datetime(col, f"{SP_UTC_OFFSET_HOURS} hours")
+    return func.timezone("America/Sao_Paulo", func.timezone("UTC", col))
+
+def _periodo_expr(col, periodo: str):
+    """Chave do período no fuso SP (semana = data da segunda-feira, formatada depois)"""
+    return _periodo_chave(_sp_local(col), periodo)
+
+def _periodo_chave(local, periodo: str):
+    """Chave do período de uma data/hora já local (SP)"""
+    if IS_SQLITE:
+        return {
+            "dia": func.date(local),
+            "semana": func.date(local, "weekday 0", "-6 days"),
+            "mes": func.strftime("%Y-%m", local),
+            "ano": func.strftime("%Y", local),
+        }[periodo]
+    return {
+        "dia": func.to_char(local, "YYYY-MM-DD"),
+        "semana": func.to_char(func.date_trunc("week", local), "YYYY-MM-DD"),
+        "mes": func.to_char(local, "YYYY-MM"),
+        "ano": func.to_char(local, "YYYY"),
+    }[periodo]
+
+def _periodo_label(chave, periodo: str):
+    if periodo == "semana" and chave:
+        # ISO week format: YYYY-Www
+        ano, semana, _ = date.fromisoformat(chave).isocalendar()
+        return f"{ano}-W{semana:02d}"
+    return chave
+
+def _periodo_ordinal_expr(chave, periodo: str):
+    """Número sequencial do período a partir da chave de _periodo_expr (períodos vizinhos diferem em 1)"""
+    if periodo in ("dia", "semana"):
+        if IS_SQLITE:
+            dias = cast(func.julianday(chave), Integer)
         else:
-            dt, duvida = row.created_at, row.duvida
+            dias = cast(chave, Date) - cast(literal("2000-01-03"), Date)
+        # chaves de semana são sempre segundas-feiras
+        return dias / 7 if periodo == "semana" else dias
+    if periodo == "mes":
+        return cast(func.substr(chave, 1, 4), Integer) * 12 + cast(func.substr(chave, 6, 2), Integer)
+    return cast(chave, Integer)
+
+def _hora_expr(col):
+    if IS_SQLITE:
+        return func.cast(func.strftime("%H", _sp_local(col)), Integer)
+    return func.cast(func.extract("hour", _sp_local(col)), Integer)
+
+def _dia_semana_expr(col):
+    # 0 = domingo ... 6 = sábado (igual nos dois bancos)
+    if IS_SQLITE:
+        return func.cast(func.strftime("%w", _sp_local(col)), Integer)
+    return func.cast(func.extract("dow", _sp_local(col)), Integer)
+
+CUBO_DIMENSOES = ("dia", "dia_semana", "hora", "duvida", "atendente")
+
+def _cubo_expr(dim: str, periodo: str, cols):
+    if dim == "dia":
+        return _periodo_expr(cols.created_at, periodo)
+    if dim == "dia_semana":
+        return _dia_semana_expr(cols.created_at)
+    if dim == "hora":
+        return _hora_expr(cols.created_at)
+    if dim == "duvida":
+        return cols.duvida
+    return func.coalesce(cols.atendente, "Não informado")
+
+def _agregar(db, dims, periodo="dia", start=None, end=None, tipos=None, limite=None, historico=False):
+    """Contagem agrupada por qualquer combinação de dimensões em uma única query.
+
+    Retorna (linhas, total, grupos); cada linha é uma tupla com os valores das
+    dimensões seguidos da contagem. Com `limite`, devolve só os N maiores grupos,
+    mas total/grupos continuam considerando todos (funções de janela).
+    Com `historico`, inclui as ligações arquivadas.
+    """
+    cols = _fonte_ligacoes(historico).c
+    exprs = [_cubo_expr(d, periodo, cols).label(d) for d in dims]
+    n = func.count().label("n")
+    query = (
+        select(*exprs, n, func.sum(func.count()).over().label("total"), func.count().over().label("grupos"))
+        .where(*_filter_clauses(start, end, tipos or set(), cols))
+        .group_by(*exprs)
+    )
+    if limite:
+        query = query.order_by(n.desc(), *exprs).limit(limite)
+    else:
+        query = query.order_by(*exprs)
+    result = db.execute(query).all()
+    total = int(result[0].total) if result else 0
+    grupos = int(result[0].grupos) if result else 0
+    linhas = []
+    for row in result:
+        valores = list(row[:len(dims)])
+        for i, d in enumerate(dims):
+            if d == "dia":
+                valores[i] = _periodo_label(valores[i], periodo)
+        linhas.append(tuple(valores) + (int(row.n),))
+    return linhas, total, grupos
+
+def _x_do_rotulo(rotulo: str, periodo: str) -> int:
+    """Posição numérica do rótulo de período no eixo x (mantém os buracos entre períodos sem ligações)"""
+    if periodo == "semana":
+        ano, semana = rotulo.split("-W")
+        return date.fromisocalendar(int(ano), int(semana), 1).toordinal()
+    if periodo == "mes":
+        ano, mes = rotulo.split("-")
+        return int(ano) * 12 + int(mes)
+    if periodo == "ano":
+        return int(rotulo)
+    return date.fromisoformat(rotulo).toordinal()
+
+def _lttb(xs, ys, max_pontos: int) -> List[int]:
+    """Índices escolhidos pelo Largest-Triangle-Three-Buckets.
+
+    Mantém o primeiro e o último ponto e, em cada balde intermediário, o ponto
+    que forma o maior triângulo com o ponto escolhido antes e a média do balde
+    seguinte, preservando picos e vales da série.
+    """
+    n = len(xs)
+    if max_pontos >= n or max_pontos < 3:
+        return list(range(n))
+    passo = (n - 2) / (max_pontos - 2)
+    escolhidos = [0]
+    a = 0
+    for i in range(max_pontos - 2):
+        ini, fim = int(i * passo) + 1, int((i + 1) * passo) + 1
+        prox_ini, prox_fim = fim, min(int((i + 2) * passo) + 1, n)
+        media_x = sum(xs[prox_ini:prox_fim]) / (prox_fim - prox_ini)
+        media_y = sum(ys[prox_ini:prox_fim]) / (prox_fim - prox_ini)
+        xa, ya = xs[a], ys[a]
+        a = max(range(ini, fim),
+                key=lambda j: abs((xa - media_x) * (ys[j] - ya) - (xa - xs[j]) * (media_y - ya)))
+        escolhidos.append(a)
+    escolhidos.append(n - 1)
+    return escolhidos
+
+def _serie_reduzida(request: Request, labels, counts, periodo: str = "dia", **extras) -> Dict[str, Any]:
+    """Aplica ?max_points=N (LTTB) à série; sem o parâmetro, a resposta fica como sempre foi.
+
+    As séries em `extras` (mesmo tamanho de `counts`) mantêm os mesmos pontos escolhidos.
+    """
+    max_pontos = _parse_int_param(request, "max_points", 3)
+    if max_pontos is None:
+        return {"labels": labels, "counts": counts, **extras}
+    indices = _lttb([_x_do_rotulo(l, periodo) for l in labels], counts, max_pontos)
+    return {
+        "labels": [labels[i] for i in indices],
+        "counts": [counts[i] for i in indices],
+        **{nome: [serie[i] for i in indices] for nome, serie in extras.items()},
+        "pontos_originais": len(labels),
+        "amostrado": len(indices) < len(labels),
+    }
 
-        if not dt:
-            continue
-        dia_br = to_sp(dt).date()  # dia no fuso America/Sao_Paulo
+SERIE_JANELA_MAXIMA = 366
+
+def _serie_metricas(db, periodo: str, janela: int, start=None, end=None, tipos=None, historico=False):
+    """Contagem por período com média móvel, acumulado e variação sobre o período anterior,
+    tudo em uma query (funções de janela sobre o agrupamento).
+
+    A média móvel cobre os últimos `janela` períodos do calendário (os sem ligações contam
+    como zero) e, no início da série, só os períodos já decorridos. A variação compara com
+    o período imediatamente anterior (zero se ele não teve ligações).
+    """
+    cols = _fonte_ligacoes(historico).c
+    chave = _periodo_expr(cols.created_at, periodo)
+    agrupado = (
+        select(chave.label("chave"), func.count().label("n"))
+        .where(*_filter_clauses(start, end, tipos or set(), cols))
+        .group_by(chave)
+        .subquery("por_periodo")
+    )
+    x = _periodo_ordinal_expr(agrupado.c.chave, periodo)
+    n = agrupado.c.n
+    decorridos = x - func.min(x).over() + 1
+    soma_janela = func.sum(n).over(order_by=x, range_=(-(janela - 1), 0))
+    x_anterior = func.lag(x).over(order_by=x)
+    n_anterior = func.lag(n).over(order_by=x)
+    query = select(
+        agrupado.c.chave,
+        n,
+        (soma_janela * 1.0 / case((decorridos < janela, decorridos), else_=janela)).label("media_movel"),
+        func.sum(n).over(order_by=x, rows=(None, 0)).label("acumulado"),
+        case((x_anterior.is_(None), None), (x_anterior == x - 1, n_anterior), else_=0).label("anterior"),
+    ).order_by(x)
+
+    serie = {"labels": [], "counts": [], "media_movel": [], "acumulado": [], "delta": [], "delta_pct": []}
+    for row in db.execute(query):
+        serie["labels"].append(_periodo_label(row.chave, periodo))
+        serie["counts"].append(int(row.n))
+        serie["media_movel"].append(round(float(row.media_movel), 2))
+        serie["acumulado"].append(int(row.acumulado))
+        anterior = row.anterior
+        serie["delta"].append(None if anterior is None else int(row.n) - int(anterior))
+        serie["delta_pct"].append(
+            round((int(row.n) - int(anterior)) * 100.0 / int(anterior), 1) if anterior else None
+        )
+    return serie
+
+# Produtividade por atendente: intervalos entre ligações consecutivas (LAG sobre created_at
+# por atendente) e janelas de atividade. Uma janela começa na primeira ligação do atendente
+# ou após uma pausa maior que `pausa_minutos`; o tempo ativo soma só os intervalos dentro
+# das janelas, e a taxa por hora usa esse tempo (pausas, almoço e noite ficam de fora).
+PRODUTIVIDADE_PAUSA_MINUTOS = 30
+
+def _epoch_s(col):
+    """Segundos desde a época de uma coluna DateTime (para diferenças de horário)"""
+    if IS_SQLITE:
+        return func.julianday(col) * 86400.0
+    return func.extract("epoch", col)
+
+def _produtividade(db, pausa_minutos: int, start=None, end=None, tipos=None, historico=False):
+    """Uma linha por atendente com total, janelas, tempo ativo, intervalo médio e contagem por dúvida"""
+    cols = _fonte_ligacoes(historico).c
+    instante = _epoch_s(cols.created_at)
+    sequencia = (
+        select(
+            func.coalesce(cols.atendente, "Não informado").label("atendente"),
+            cols.duvida,
+            cols.created_at,
+            # Segundos inteiros: a conta em ponto flutuante não decide se 30 min cabem na pausa.
+            # Partição pela coluna crua: o índice (atendente, created_at) já entrega a ordem
+            func.round(instante - func.lag(instante).over(partition_by=cols.atendente, order_by=cols.created_at)).label("intervalo"),
+        )
+        .where(*_filter_clauses(start, end, tipos or set(), cols))
+        .subquery("sequencia")
+    )
+    pausa = pausa_minutos * 60
+    intervalo = sequencia.c.intervalo
+    ativo = case((intervalo <= pausa, intervalo), else_=None)
+    query = (
+        select(
+            sequencia.c.atendente,
+            func.count().label("total"),
+            func.sum(case((or_(intervalo.is_(None), intervalo > pausa), 1), else_=0)).label("janelas"),
+            func.coalesce(func.sum(ativo), 0).label("ativo_s"),
+            func.avg(ativo).label("intervalo_medio_s"),
+            func.min(sequencia.c.created_at).label("primeira"),
+            func.max(sequencia.c.created_at).label("ultima"),
+            *(func.sum(case((sequencia.c.duvida == d, 1), else_=0)).label(f"d{i}") for i, d in enumerate(DUVIDA_OPCOES)),
+        )
+        .group_by(sequencia.c.atendente)
+    )
 
-        if start_date and dia_br < start_date:
-            continue
-        if end_date and dia_br > end_date:
-            continue
-        if tipos and duvida not in tipos:
-            continue
-        filtered.append((dia_br, duvida))
-    return filtered
+    atendentes = []
+    for row in db.execute(query):
+        horas_ativas = float(row.ativo_s) / 3600
+        atendentes.append({
+            "atendente": row.atendente,
+            "total": int(row.total),
+            "janelas": int(row.janelas),
+            "horas_ativas": round(horas_ativas, 2),
+            "ligacoes_por_hora": round(int(row.total) / horas_ativas, 2) if horas_ativas else None,
+            "intervalo_medio_min": round(float(row.intervalo_medio_s) / 60, 2) if row.intervalo_medio_s is not None else None,
+            "primeira": format_sp(row.primeira),
+            "ultima": format_sp(row.ultima),
+            "mix": [int(getattr(row, f"d{i}")) for i in range(len(DUVIDA_OPCOES))],
+        })
+    atendentes.sort(key=lambda a: (-a["total"], a["atendente"]))
+    return atendentes
+
+def _contar_por_duvida(db, cols, filtros) -> Dict[str, int]:
+    return dict(db.execute(select(cols.duvida, func.count()).where(*filtros).group_by(cols.duvida)).all())
+
+# Cache das respostas de /api/stats/* (TTL + LRU)
+# Chave: rota + filtros normalizados (datas, tipos ordenados) + demais parâmetros. Qualquer
+# gravação confirmada neste processo invalida tudo na hora; gravações de outros processos
+# (outros workers, manutencao.py) aparecem em até STATS_CACHE_TTL_SECONDS.
+# Requisições idênticas simultâneas esperam o cálculo da primeira em vez de repeti-lo.
+STATS_CACHE_TTL_SECONDS = float(os.getenv("STATS_CACHE_TTL_SECONDS", "30"))  # 0 = desligado
+STATS_CACHE_MAX_ENTRIES = int(os.getenv("STATS_CACHE_MAX_ENTRIES", "256"))
+# Quanto uma requisição espera o cálculo igual de outra antes de calcular por conta própria
+STATS_CACHE_WAIT_SECONDS = float(os.getenv("STATS_CACHE_WAIT_SECONDS", "10"))
+
+METRICS.define("ligacoes_stats_cache_total", "counter", "Consultas ao cache de /api/stats/* por resultado", ("resultado",))
+
+class ResultadoSemCache(Exception):
+    """Levantada pelo cálculo para responder um valor sem guardá-lo (ex.: fallback de erro)"""
+
+    def __init__(self, valor):
+        super().__init__()
+        self.valor = valor
+
+class CacheRespostas:
+    """Memoização com TTL, limite LRU, invalidação por geração e coalescência de cálculos iguais"""
+
+    def __init__(self, ttl: float, max_itens: int, espera: float = 10.0):
+        self.ttl = ttl
+        self.max_itens = max_itens
+        self.espera = espera
+        self._lock = threading.Lock()
+        self._itens = OrderedDict()  # chave -> (expira_em, valor)
+        self._em_andamento = {}      # chave -> threading.Event do cálculo em curso
+        self._geracao = 0
+
+    def obter(self, chave, calcular):
+        if self.ttl <= 0:
+            try:
+                return calcular()
+            except ResultadoSemCache as e:
+                return e.valor
+        esperou = False
+        while True:
+            with self._lock:
+                item = self._itens.get(chave)
+                if item is not None and item[0] > time.monotonic():
+                    self._itens.move_to_end(chave)
+                    # Cada requisição conta uma vez: quem esperou o cálculo de outra é "coalescido"
+                    METRICS.inc("ligacoes_stats_cache_total", ("coalescido" if esperou else "hit",))
+                    return item[1]
+                pronto = self._em_andamento.get(chave)
+                if pronto is None:
+                    pronto = self._em_andamento[chave] = threading.Event()
+                    geracao = self._geracao
+                    break
+            # Outro thread já está calculando: espera e confere o cache de novo
+            esperou = True
+            if not pronto.wait(self.espera):
+                # Cálculo travado (banco lento, lock): não prende esta requisição atrás dele
+                METRICS.inc("ligacoes_stats_cache_total", ("espera_esgotada",))
+                try:
+                    return calcular()
+                except ResultadoSemCache as e:
+                    return e.valor
+
+        METRICS.inc("ligacoes_stats_cache_total", ("miss",))
+        try:
+            try:
+                valor = calcular()
+            except ResultadoSemCache as e:
+                return e.valor
+            with self._lock:
+                # Se houve gravação durante o cálculo, o resultado pode já estar velho
+                if geracao == self._geracao:
+                    self._itens[chave] = (time.monotonic() + self.ttl, valor)
+                    self._itens.move_to_end(chave)
+                    while len(self._itens) > self.max_itens:
+                        self._itens.popitem(last=False)
+            return valor
+        finally:
+            with self._lock:
+                self._em_andamento.pop(chave, None)
+            pronto.set()
+
+    def invalidar(self):
+        with self._lock:
+            self._geracao += 1
+            self._itens.clear()
+
+STATS_CACHE = CacheRespostas(STATS_CACHE_TTL_SECONDS, STATS_CACHE_MAX_ENTRIES, STATS_CACHE_WAIT_SECONDS)
+
+@event.listens_for(engine, "after_cursor_execute")
+def _marcar_conexao_gravou(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and (context.isinsert or context.isupdate or context.isdelete):
+        conn.info["gravou"] = True
+
+@event.listens_for(engine, "commit")
+def _invalidar_cache_ao_confirmar(conn):
+    if conn.info.pop("gravou", False):
+        STATS_CACHE.invalidar()
+
+@event.listens_for(engine, "rollback")
+def _descartar_marca_gravacao(conn):
+    conn.info.pop("gravou", None)
+
+def _chave_stats(request: Request):
+    start, end, tipos = _parse_filters(request)
+    outros = tuple(sorted((k, v) for k, v in request.query_params.multi_items() if k not in ("start", "end", "tipos")))
+    # Quem acabou de gravar lê do primário: não reaproveita o que foi calculado na réplica
+    primario = read_engine is not engine and _gravou_recentemente(request)
+    return (request.url.path, start, end, tuple(sorted(tipos)), outros, primario)
+
+def _memoizar_stats(handler):
+    """Serve o handler de /api/stats/* pelo STATS_CACHE. A permissão é conferida aqui, antes
+    do cache: o handler só calcula. `rota.aquecer(request)` preenche o cache sem sessão."""
+    def aquecer(request: Request):
+        return STATS_CACHE.obter(_chave_stats(request), lambda: handler(request=request, session_token=None))
+
+    @functools.wraps(handler)
+    def wrapper(*args, **kwargs):
+        _require_reports_access(kwargs.get("session_token"))
+        ctx = _request_ctx.get()
+        if ctx is not None and "profile" in ctx:
+            try:
+                return handler(*args, **kwargs)
+            except ResultadoSemCache as e:
+                return e.valor
+        return STATS_CACHE.obter(_chave_stats(kwargs["request"]), lambda: handler(*args, **kwargs))
+
+    wrapper.aquecer = aquecer
+    return wrapper
 
 # API: retorna o total absoluto de ligações cadastradas (sem filtros)
 # Este endpoint é usado para exibir o total geral no KPI, independente dos filtros aplicados
 @app.get("/api/stats/total")
+@_memoizar_stats
 def stats_total(request: Request, session_token: str = Cookie(None, alias=SESSION_COOKIE_NAME)):
-    # Verificar autenticação
-    if not session_token or not is_valid_session(session_token):
-        raise HTTPException(status_code=401, detail="Não autorizado")
-    
-    # Verificar permissão para acessar relatórios
-    current_user = active_sessions[session_token]
-    current_username = current_user['username']
-    if not can_access_reports(current_username):
-        raise HTTPException(status_code=403, detail="Acesso negado - Você não tem permissão para acessar relatórios")
-    
     # Buscar o total absoluto de ligações sem aplicar filtros
-    db = SessionLocal()
+    db = _sessao_leitura(request)
     try:
         # Conta todas as ligações no banco de dados
-        total_count = db.query(Ligacao).count()
+        total_count = db.execute(select(func.count()).select_from(Ligacao.__table__)).scalar()
     finally:
         db.close()
     
@@ -591,36 +2055,19 @@ def stats_total(request: Request, session_token: str = Cookie(None, alias=SESSIO
 
 # API: estatística por dúvida (com filtros)
 @app.get("/api/stats/por_duvida")
+@_memoizar_stats
 def stats_por_duvida(request: Request, session_token: str = Cookie(None, alias=SESSION_COOKIE_NAME)):
-    # Verificar autenticação
-    if not session_token or not is_valid_session(session_token):
-        raise HTTPException(status_code=401, detail="Não autorizado")
-    
-    # Verificar permissão para acessar relatórios
-    current_user = active_sessions[session_token]
-    current_username = current_user['username']
-    if not can_access_reports(current_username):
-        raise HTTPException(status_code=403, detail="Acesso negado - Você não tem permissão para acessar relatórios")
-    
     # Query params: start=YYYY-MM-DD, end=YYYY-MM-DD, tipos=csv
-    start = _parse_date(request.query_params.get("start"))
-    end = _parse_date(request.query_params.get("end"))
-    tipos_raw = request.query_params.get("tipos", "")
-    tipos = set([t for t in (s.strip() for s in tipos_raw.split(",")) if t]) if tipos_raw else set()
+    start, end, tipos = _parse_filters(request)
 
-    db = SessionLocal()
+    db = _sessao_leitura(request)
     try:
-        # buscamos created_at e duvida para aplicar filtro no fuso BR
-        rows = db.query(Ligacao.created_at, Ligacao.duvida).all()
+        # conta por tipo no banco (filtro de datas no fuso BR)
+        linhas, _, _ = _agregar(db, ["duvida"], start=start, end=end, tipos=tipos, historico=_parse_historico(request))
     finally:
         db.close()
 
-    filtered = _filter_rows(rows, start, end, tipos)
-
-    # conta por tipo
-    counts_map = {}
-    for _, duvida in filtered:
-        counts_map[duvida] = counts_map.get(duvida, 0) + 1
+    counts_map = dict(linhas)
 
     labels = DUVIDA_OPCOES[:]  # ordem fixa
     counts = [int(counts_map.get(lbl, 0)) for lbl in labels]
@@ -629,107 +2076,78 @@ def stats_por_duvida(request: Request, session_token: str = Cookie(None, alias=S
 
 # API: estatística por dia (com filtros e fuso BR)
 @app.get("/api/stats/por_dia")
+@_memoizar_stats
 def stats_por_dia(request: Request, session_token: str = Cookie(None, alias=SESSION_COOKIE_NAME)):
-    # Verificar autenticação
-    if not session_token or not is_valid_session(session_token):
-        raise HTTPException(status_code=401, detail="Não autorizado")
-    
-    # Verificar permissão para acessar relatórios
-    current_user = active_sessions[session_token]
-    current_username = current_user['username']
-    if not can_access_reports(current_username):
-        raise HTTPException(status_code=403, detail="Acesso negado - Você não tem permissão para acessar relatórios")
-    
-    start = _parse_date(request.query_params.get("start"))
-    end = _parse_date(request.query_params.get("end"))
-    tipos_raw = request.query_params.get("tipos", "")
-    tipos = set([t for t in (s.strip() for s in tipos_raw.split(",")) if t]) if tipos_raw else set()
+    start, end, tipos = _parse_filters(request)
 
-    db = SessionLocal()
+    db = _sessao_leitura(request)
     try:
-        rows = db.query(Ligacao.created_at, Ligacao.duvida).all()
+        # grupo por dia (fuso BR), já ordenado
+        linhas, _, _ = _agregar(db, ["dia"], "dia", start, end, tipos, historico=_parse_historico(request))
     finally:
         db.close()
 
-    filtered = _filter_rows(rows, start, end, tipos)
-
-    # grupo por dia
-    by_day = {}
-    for dia, _ in filtered:
-        k = dia.isoformat()
-        by_day[k] = by_day.get(k, 0) + 1
-
-    labels = sorted(by_day.keys())
-    counts = [by_day[d] for d in labels]
-    return {"labels": labels, "counts": counts}
+    labels = [dia for dia, _ in linhas]
+    counts = [n for _, n in linhas]
+    return _serie_reduzida(request, labels, counts)
 
 # API: comparativo de ligações por período
 @app.get("/api/stats/comparativo_periodo")
+@_memoizar_stats
 def stats_comparativo_periodo(request: Request, session_token: str = Cookie(None, alias=SESSION_COOKIE_NAME)):
-    # Verificar autenticação
-    if not session_token or not is_valid_session(session_token):
-        raise HTTPException(status_code=401, detail="Não autorizado")
-    
-    # Verificar permissão para acessar relatórios
-    current_user = active_sessions[session_token]
-    current_username = current_user['username']
-    if not can_access_reports(current_username):
-        raise HTTPException(status_code=403, detail="Acesso negado - Você não tem permissão para acessar relatórios")
-    
     periodo = request.query_params.get("periodo", "dia")  # dia, semana, mes, ano
-    start = _parse_date(request.query_params.get("start"))
-    end = _parse_date(request.query_params.get("end"))
-    tipos_raw = request.query_params.get("tipos", "")
-    tipos = set([t for t in (s.strip() for s in tipos_raw.split(",")) if t]) if tipos_raw else set()
+    start, end, tipos = _parse_filters(request)
 
-    db = SessionLocal()
+    db = _sessao_leitura(request)
     try:
-        rows = db.query(Ligacao.created_at, Ligacao.duvida).all()
+        # Agrupar por período no banco (semana no formato ISO: YYYY-Www)
+        linhas, _, _ = _agregar(db, ["dia"], periodo if periodo in PERIODOS else "dia", start, end, tipos,
+                                historico=_parse_historico(request))
     finally:
         db.close()
 
-    filtered = _filter_rows(rows, start, end, tipos)
-    
-    # Agrupar por período
-    by_period = {}
-    for dia, _ in filtered:
-        if periodo == "dia":
-            key = dia.isoformat()
-        elif periodo == "semana":
-            # ISO week format: YYYY-Www
-            key = f"{dia.year}-W{dia.isocalendar()[1]:02d}"
-        elif periodo == "mes":
-            key = f"{dia.year}-{dia.month:02d}"
-        elif periodo == "ano":
-            key = str(dia.year)
-        else:
-            key = dia.isoformat()
-            
-        by_period[key] = by_period.get(key, 0) + 1
-
-    labels = sorted(by_period.keys())
-    counts = [by_period[p] for p in labels]
+    labels = [chave for chave, _ in linhas]
+    counts = [n for _, n in linhas]
     
     return {
-        "labels": labels, 
-        "counts": counts,
+        **_serie_reduzida(request, labels, counts, periodo if periodo in PERIODOS else "dia"),
         "periodo": periodo,
         "total": sum(counts)
     }
 
+# API: série por período pronta para gráfico (média móvel, acumulado e variação)
+# Ex.: /api/stats/serie?periodo=dia&janela=7 (média móvel de 7 dias) ou
+#      /api/stats/serie?periodo=semana (semana contra a semana anterior)
+@app.get("/api/stats/serie")
+@_memoizar_stats
+def stats_serie(request: Request, session_token: str = Cookie(None, alias=SESSION_COOKIE_NAME)):
+
+    periodo = request.query_params.get("periodo", "dia")
+    if periodo not in PERIODOS:
+        raise HTTPException(status_code=400, detail=f"Parâmetro 'periodo' inválido. Use: {', '.join(PERIODOS)}")
+    janela = _parse_int_param(request, "janela", 1) or 7
+    if janela > SERIE_JANELA_MAXIMA:
+        raise HTTPException(status_code=400, detail=f"Parâmetro 'janela' deve ser <= {SERIE_JANELA_MAXIMA}")
+    start, end, tipos = _parse_filters(request)
+
+    db = _sessao_leitura(request)
+    try:
+        serie = _serie_metricas(db, periodo, janela, start, end, tipos, _parse_historico(request))
+    finally:
+        db.close()
+
+    labels, counts = serie.pop("labels"), serie.pop("counts")
+    return {
+        **_serie_reduzida(request, labels, counts, periodo, **serie),
+        "periodo": periodo,
+        "janela": janela,
+        "total": sum(counts),
+    }
+
 # API: pico de horários
 @app.get("/api/stats/pico_horarios")
+@_memoizar_stats
 def stats_pico_horarios(request: Request, session_token: str = Cookie(None, alias=SESSION_COOKIE_NAME)):
-    # Verificar autenticação
-    if not session_token or not is_valid_session(session_token):
-        raise HTTPException(status_code=401, detail="Não autorizado")
-    
-    # Verificar permissão para acessar relatórios
-    current_user = active_sessions[session_token]
-    current_username = current_user['username']
-    if not can_access_reports(current_username):
-        raise HTTPException(status_code=403, detail="Acesso negado - Você não tem permissão para acessar relatórios")
-    
     # Garantir que sempre retornamos a estrutura correta mesmo em caso de erro
     all_hours = [f"{h:02d}:00" for h in range(24)]
     default_response = {
@@ -739,44 +2157,18 @@ def stats_pico_horarios(request: Request, session_token: str = Cookie(None, alia
     }
     
     try:
-        start = _parse_date(request.query_params.get("start"))
-        end = _parse_date(request.query_params.get("end"))
-        tipos_raw = request.query_params.get("tipos", "")
-        tipos = set([t for t in (s.strip() for s in tipos_raw.split(",")) if t]) if tipos_raw else set()
+        start, end, tipos = _parse_filters(request)
 
-        # Buscar dados completos (created_at + duvida) e aplicar filtros corretamente
-        db = SessionLocal()
+        # Agrupar por hora do dia (fuso BR) no banco, aplicando os filtros
+        db = _sessao_leitura(request)
         try:
-            all_calls = db.query(Ligacao).all()
+            linhas, _, _ = _agregar(db, ["hora"], start=start, end=end, tipos=tipos, historico=_parse_historico(request))
         finally:
             db.close()
-        
-        # Agrupar por hora do dia aplicando filtros
-        by_hour = {}
-        for call in all_calls:
-            if not call.created_at:
-                continue
-                
-            # Converter para fuso BR
-            dt_br = to_sp(call.created_at)
-            if not dt_br:
-                continue
-                
-            # Aplicar filtros de data
-            call_date = dt_br.date()
-            if start and call_date < start:
-                continue
-            if end and call_date > end:
-                continue
-            if tipos and call.duvida not in tipos:
-                continue
-                
-            # Extrair hora e agrupar
-            hour_key = f"{dt_br.hour:02d}:00"
-            by_hour[hour_key] = by_hour.get(hour_key, 0) + 1
+        by_hour = dict(linhas)
         
         # Gerar counts para todas as horas (0-23) - sempre 24 horas
-        counts = [by_hour.get(hour, 0) for hour in all_hours]
+        counts = [by_hour.get(hora, 0) for hora in range(24)]
         
         # Retornar estrutura sempre correta
         return {
@@ -787,53 +2179,22 @@ def stats_pico_horarios(request: Request, session_token: str = Cookie(None, alia
     
     except Exception as e:
         # Em caso de erro, retornar estrutura padrão com dados zerados
-        # Isso garante que o frontend não quebre
-        return default_response
+        # Isso garante que o frontend não quebre (sem guardar no cache: a próxima chamada tenta de novo)
+        raise ResultadoSemCache(default_response)
 
 # API: relatório por atendente
 @app.get("/api/stats/por_atendente")
+@_memoizar_stats
 def stats_por_atendente(request: Request, session_token: str = Cookie(None, alias=SESSION_COOKIE_NAME)):
-    # Verificar autenticação
-    if not session_token or not is_valid_session(session_token):
-        raise HTTPException(status_code=401, detail="Não autorizado")
-    
-    # Verificar permissão para acessar relatórios
-    current_user = active_sessions[session_token]
-    current_username = current_user['username']
-    if not can_access_reports(current_username):
-        raise HTTPException(status_code=403, detail="Acesso negado - Você não tem permissão para acessar relatórios")
-    
-    start = _parse_date(request.query_params.get("start"))
-    end = _parse_date(request.query_params.get("end"))
-    tipos_raw = request.query_params.get("tipos", "")
-    tipos = set([t for t in (s.strip() for s in tipos_raw.split(",")) if t]) if tipos_raw else set()
+    start, end, tipos = _parse_filters(request)
 
-    db = SessionLocal()
+    db = _sessao_leitura(request)
     try:
-        query = db.query(Ligacao)
-        all_calls = query.all()
+        # Contagem por atendente no banco; ordenada por quantidade (decrescente)
+        linhas, _, _ = _agregar(db, ["atendente"], start=start, end=end, tipos=tipos, historico=_parse_historico(request))
     finally:
         db.close()
-
-    by_attendant = {}
-    for call in all_calls:
-        if not call.created_at:
-            continue
-            
-        # Aplicar filtros de data
-        call_date = to_sp(call.created_at).date()
-        if start and call_date < start:
-            continue
-        if end and call_date > end:
-            continue
-        if tipos and call.duvida not in tipos:
-            continue
-            
-        attendant = call.atendente or "Não informado"
-        by_attendant[attendant] = by_attendant.get(attendant, 0) + 1
-    
-    # Ordenar por quantidade (decrescente)
-    sorted_attendants = sorted(by_attendant.items(), key=lambda x: x[1], reverse=True)
+    sorted_attendants = sorted(linhas, key=lambda x: (-x[1], x[0]))
     
     labels = [item[0] for item in sorted_attendants]
     counts = [item[1] for item in sorted_attendants]
@@ -844,54 +2205,166 @@ def stats_por_atendente(request: Request, session_token: str = Cookie(None, alia
         "total": sum(counts)
     }
 
-# API: exportar dados em CSV
-@app.get("/api/export/csv")
-def export_csv(request: Request, session_token: str = Cookie(None, alias=SESSION_COOKIE_NAME)):
-    # Verificar autenticação
-    if not session_token or not is_valid_session(session_token):
-        raise HTTPException(status_code=401, detail="Não autorizado")
-    
-    # Verificar permissão para acessar relatórios
-    current_user = active_sessions[session_token]
-    current_username = current_user['username']
-    if not can_access_reports(current_username):
-        raise HTTPException(status_code=403, detail="Acesso negado - Você não tem permissão para acessar relatórios")
-    
-    report_type = request.query_params.get("tipo", "por_duvida")
-    start = _parse_date(request.query_params.get("start"))
-    end = _parse_date(request.query_params.get("end"))
-    tipos_raw = request.query_params.get("tipos", "")
-    tipos = set([t for t in (s.strip() for s in tipos_raw.split(",")) if t]) if tipos_raw else set()
+# API: produtividade por atendente (uma query com funções de janela)
+# Ex.: /api/stats/produtividade?start=2025-10-01&pausa=20
+@app.get("/api/stats/produtividade")
+@_memoizar_stats
+def stats_produtividade(request: Request, session_token: str = Cookie(None, alias=SESSION_COOKIE_NAME)):
 
-    db = SessionLocal()
+    pausa = _parse_int_param(request, "pausa", 1) or PRODUTIVIDADE_PAUSA_MINUTOS
+    if pausa > 24 * 60:
+        raise HTTPException(status_code=400, detail="Parâmetro 'pausa' deve estar entre 1 e 1440 minutos")
+    start, end, tipos = _parse_filters(request)
+
+    db = _sessao_leitura(request)
     try:
-        all_calls = db.query(Ligacao).all()
+        atendentes = _produtividade(db, pausa, start, end, tipos, _parse_historico(request))
     finally:
         db.close()
 
-    # Filtrar dados
-    filtered_calls = []
-    for call in all_calls:
-        if not call.created_at:
-            continue
-            
-        call_date = to_sp(call.created_at).date()
-        if start and call_date < start:
-            continue
-        if end and call_date > end:
-            continue
-        if tipos and call.duvida not in tipos:
-            continue
-        filtered_calls.append(call)
+    return {
+        "pausa_minutos": pausa,
+        "duvidas": DUVIDA_OPCOES,
+        "atendentes": atendentes,
+        "total": sum(a["total"] for a in atendentes),
+    }
+
+# API: cubo de contagens agrupadas por qualquer combinação de dimensões
+# Ex.: /api/stats/cube?dims=dia_semana,hora (mapa de calor) ou
+#      /api/stats/cube?dims=dia,duvida,atendente&periodo=semana&limit=20
+@app.get("/api/stats/cube")
+@_memoizar_stats
+def stats_cube(request: Request, session_token: str = Cookie(None, alias=SESSION_COOKIE_NAME)):
+
+    dims = [d.strip() for d in request.query_params.get("dims", "").split(",") if d.strip()]
+    if not dims or len(set(dims)) != len(dims) or any(d not in CUBO_DIMENSOES for d in dims):
+        raise HTTPException(status_code=400, detail=f"Parâmetro 'dims' inválido. Use uma combinação de: {', '.join(CUBO_DIMENSOES)}")
+    periodo = request.query_params.get("periodo", "dia")
+    if periodo not in PERIODOS:
+        raise HTTPException(status_code=400, detail=f"Parâmetro 'periodo' inválido. Use: {', '.join(PERIODOS)}")
+    limite = None
+    if request.query_params.get("limit"):
+        try:
+            limite = int(request.query_params["limit"])
+        except ValueError:
+            limite = 0
+        if not 1 <= limite <= 10000:
+            raise HTTPException(status_code=400, detail="Parâmetro 'limit' deve estar entre 1 e 10000")
+    start, end, tipos = _parse_filters(request)
+
+    db = _sessao_leitura(request)
+    try:
+        linhas, total, grupos = _agregar(db, dims, periodo, start, end, tipos, limite, _parse_historico(request))
+    finally:
+        db.close()
 
-    # Criar CSV
+    return {
+        "dims": dims,
+        "periodo": periodo,
+        "colunas": dims + ["count"],
+        "linhas": [list(l) for l in linhas],
+        "total": total,
+        "grupos": grupos,
+        "truncado": limite is not None and grupos > len(linhas),
+    }
+
+# API: termos mais citados nas observações e sua evolução, lidos do índice ligacoes_termos
+# (somas por dia/dúvida já prontas; o texto das observações não é relido)
+# Ex.: /api/termos/top?start=2025-10-01&limit=30
+#      /api/termos/tendencia?termos=boleto,senha&periodo=semana
+TERMOS_TOP_MAX = 200
+TERMOS_TENDENCIA_MAX = 10
+
+def _filtros_termos(cols, start, end, tipos):
+    clauses = []
+    if start:
+        clauses.append(cols.dia >= start)
+    if end:
+        clauses.append(cols.dia <= end)
+    if tipos:
+        clauses.append(cols.duvida.in_(sorted(tipos)))
+    return clauses
+
+@app.get("/api/termos/top")
+@_memoizar_stats
+def termos_top(request: Request, session_token: str = Cookie(None, alias=SESSION_COOKIE_NAME)):
+
+    start, end, tipos = _parse_filters(request)
+    limite = _parse_int_param(request, "limit", 1) or 20
+    if limite > TERMOS_TOP_MAX:
+        raise HTTPException(status_code=400, detail=f"Parâmetro 'limit' deve estar entre 1 e {TERMOS_TOP_MAX}")
+
+    t = LigacaoTermo.__table__
+    ligacoes = func.sum(t.c.contagem).label("ligacoes")
+    db = _sessao_leitura(request)
+    try:
+        linhas = db.execute(
+            select(t.c.termo, ligacoes)
+            .where(*_filtros_termos(t.c, start, end, tipos))
+            .group_by(t.c.termo)
+            .order_by(ligacoes.desc(), t.c.termo)
+            .limit(limite)
+        ).all()
+    finally:
+        db.close()
+
+    # counts = ligações que citam o termo no período
+    return {"labels": [termo for termo, _ in linhas], "counts": [int(n) for _, n in linhas]}
+
+@app.get("/api/termos/tendencia")
+@_memoizar_stats
+def termos_tendencia(request: Request, session_token: str = Cookie(None, alias=SESSION_COOKIE_NAME)):
+
+    # Mesma normalização do índice: "Votação" -> "votacao"
+    termos = sorted(set().union(*(_termos(t) for t in request.query_params.get("termos", "").split(","))))
+    if not termos or len(termos) > TERMOS_TENDENCIA_MAX:
+        raise HTTPException(status_code=400, detail=f"Informe de 1 a {TERMOS_TENDENCIA_MAX} termos em 'termos' (separados por vírgula)")
+    periodo = request.query_params.get("periodo", "dia")
+    if periodo not in PERIODOS:
+        raise HTTPException(status_code=400, detail=f"Parâmetro 'periodo' inválido. Use: {', '.join(PERIODOS)}")
+    start, end, tipos = _parse_filters(request)
+
+    t = LigacaoTermo.__table__
+    chave = _periodo_chave(t.c.dia, periodo).label("periodo")
+    db = _sessao_leitura(request)
+    try:
+        linhas = db.execute(
+            select(chave, t.c.termo, func.sum(t.c.contagem))
+            .where(t.c.termo.in_(termos), *_filtros_termos(t.c, start, end, tipos))
+            .group_by(chave, t.c.termo)
+            .order_by(chave)
+        ).all()
+    finally:
+        db.close()
+
+    chaves = sorted({c for c, _, _ in linhas})
+    posicao = {c: i for i, c in enumerate(chaves)}
+    series = {termo: [0] * len(chaves) for termo in termos}
+    for c, termo, n in linhas:
+        series[termo][posicao[c]] = int(n)
+    return {
+        "periodo": periodo,
+        "labels": [_periodo_label(c, periodo) for c in chaves],
+        "series": series,
+    }
+
+# Exportações CSV/PDF: leitura no banco separada da geração do arquivo, para que o
+# mesmo código sirva as requisições e os relatórios pré-gerados (PRERENDER_DIR)
+def _dados_export(db, report_type, cols, filtros):
+    """Detalhado lê só as colunas exibidas; resumido já vem contado por dúvida"""
+    if report_type == "detalhado":
+        return _ler_linhas(db, _select_linhas(cols, *filtros).order_by(cols.id))
+    return _contar_por_duvida(db, cols, filtros)
+
+def _gerar_csv(report_type, dados) -> bytes:
+    inicio_render = time.perf_counter()
     output = io.StringIO()
     writer = csv.writer(output)
     
     if report_type == "detalhado":
         # Exportar dados detalhados
         writer.writerow(["ID", "CRO", "Nome Inscrito", "Dúvida", "Observação", "Atendente", "Data/Hora"])
-        for call in filtered_calls:
+        for call in dados:
             writer.writerow([
                 call.id,
                 call.cro,
@@ -903,65 +2376,18 @@ def export_csv(request: Request, session_token: str = Cookie(None, alias=SESSION
             ])
     else:
         # Exportar relatório resumido por tipo de dúvida
-        by_duvida = {}
-        for call in filtered_calls:
-            by_duvida[call.duvida] = by_duvida.get(call.duvida, 0) + 1
-        
         writer.writerow(["Tipo de Dúvida", "Quantidade"])
         for duvida in DUVIDA_OPCOES:
-            count = by_duvida.get(duvida, 0)
+            count = dados.get(duvida, 0)
             if count > 0:
                 writer.writerow([duvida, count])
     
-    output.seek(0)
-    response = StreamingResponse(
-        io.BytesIO(output.getvalue().encode('utf-8')),
-        media_type="text/csv",
-        headers={"Content-Disposition": f"attachment; filename=relatorio_{report_type}_{datetime.now().strftime('%Y%m%d_%H%M')}.csv"}
-    )
-    return response
-
-# API: exportar dados em PDF
-@app.get("/api/export/pdf")
-def export_pdf(request: Request, session_token: str = Cookie(None, alias=SESSION_COOKIE_NAME)):
-    # Verificar autenticação
-    if not session_token or not is_valid_session(session_token):
-        raise HTTPException(status_code=401, detail="Não autorizado")
-    
-    # Verificar permissão para acessar relatórios
-    current_user = active_sessions[session_token]
-    current_username = current_user['username']
-    if not can_access_reports(current_username):
-        raise HTTPException(status_code=403, detail="Acesso negado - Você não tem permissão para acessar relatórios")
-    
-    report_type = request.query_params.get("tipo", "por_duvida")
-    start = _parse_date(request.query_params.get("start"))
-    end = _parse_date(request.query_params.get("end"))
-    tipos_raw = request.query_params.get("tipos", "")
-    tipos = set([t for t in (s.strip() for s in tipos_raw.split(",")) if t]) if tipos_raw else set()
-
-    db = SessionLocal()
-    try:
-        all_calls = db.query(Ligacao).all()
-    finally:
-        db.close()
-
-    # Filtrar dados
-    filtered_calls = []
-    for call in all_calls:
-        if not call.created_at:
-            continue
-            
-        call_date = to_sp(call.created_at).date()
-        if start and call_date < start:
-            continue
-        if end and call_date > end:
-            continue
-        if tipos and call.duvida not in tipos:
-            continue
-        filtered_calls.append(call)
+    conteudo = output.getvalue().encode('utf-8')
+    METRICS.observe("ligacoes_export_render_duration_seconds", ("csv", "detalhado" if report_type == "detalhado" else "por_duvida"), time.perf_counter() - inicio_render)
+    return conteudo
 
-    # Criar PDF
+def _gerar_pdf(report_type, start, end, dados) -> bytes:
+    inicio_render = time.perf_counter()
     buffer = io.BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=A4)
     styles = getSampleStyleSheet()
@@ -988,7 +2414,7 @@ def export_pdf(request: Request, session_token: str = Cookie(None, alias=SESSION
     if report_type == "detalhado":
         # Tabela detalhada
         data = [["ID", "CRO", "Nome", "Dúvida", "Atendente", "Data/Hora"]]
-        for call in filtered_calls:
+        for call in dados:
             data.append([
                 str(call.id),
                 call.cro[:15] + "..." if len(call.cro) > 15 else call.cro,
@@ -999,14 +2425,10 @@ def export_pdf(request: Request, session_token: str = Cookie(None, alias=SESSION
             ])
     else:
         # Relatório resumido
-        by_duvida = {}
-        for call in filtered_calls:
-            by_duvida[call.duvida] = by_duvida.get(call.duvida, 0) + 1
-        
         data = [["Tipo de Dúvida", "Quantidade", "Percentual"]]
-        total = len(filtered_calls)
+        total = sum(dados.values())
         for duvida in DUVIDA_OPCOES:
-            count = by_duvida.get(duvida, 0)
+            count = dados.get(duvida, 0)
             if count > 0:
                 pct = f"{(count/total*100):.1f}%" if total > 0 else "0%"
                 data.append([
@@ -1031,17 +2453,980 @@ def export_pdf(request: Request, session_token: str = Cookie(None, alias=SESSION
     
     story.append(table)
     story.append(Spacer(1, 20))
-    story.append(Paragraph(f"Total de registros: {len(filtered_calls)}", styles['Normal']))
+    total_registros = len(dados) if report_type == "detalhado" else sum(dados.values())
+    story.append(Paragraph(f"Total de registros: {total_registros}", styles['Normal']))
     story.append(Paragraph(f"Gerado em: {datetime.now().strftime('%d/%m/%Y às %H:%M')}", styles['Normal']))
     
     doc.build(story)
-    buffer.seek(0)
-    
-    response = StreamingResponse(
-        io.BytesIO(buffer.getvalue()),
-        media_type="application/pdf",
-        headers={"Content-Disposition": f"attachment; filename=relatorio_{report_type}_{datetime.now().strftime('%Y%m%d_%H%M')}.pdf"}
+    METRICS.observe("ligacoes_export_render_duration_seconds", ("pdf", "detalhado" if report_type == "detalhado" else "por_duvida"), time.perf_counter() - inicio_render)
+    return buffer.getvalue()
+
+# PostgreSQL: o CSV detalhado sai pronto do banco com COPY (SELECT ...) TO STDOUT, sem criar
+# uma tupla Python por linha. O COPY roda numa thread e entrega blocos por uma fila limitada
+# ao gerador da resposta (memória constante); se o download for interrompido, o COPY é abortado.
+# As colunas e a formatação seguem _gerar_csv (data/hora de SP, "Não informado", observação
+# vazia sem aspas); as linhas terminam em \n em vez de \r\n.
+EXPORT_COPY_CHUNK_SIZE = 64 * 1024
+EXPORT_COPY_FILA_BLOCOS = 16
+
+class _SaidaCopy:
+    """Arquivo de escrita para o copy_expert: junta as linhas em blocos e os passa ao gerador"""
+
+    def __init__(self):
+        self.fila = queue.Queue(maxsize=EXPORT_COPY_FILA_BLOCOS)
+        self.cancelado = threading.Event()
+        self.erro = None
+        self._buffer = bytearray()
+
+    def _entregar(self, bloco):
+        while True:
+            if self.cancelado.is_set():
+                raise OSError("download interrompido")
+            try:
+                self.fila.put(bloco, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def write(self, dados):
+        self._buffer += dados.encode("utf-8") if isinstance(dados, str) else dados
+        if len(self._buffer) >= EXPORT_COPY_CHUNK_SIZE:
+            self._entregar(bytes(self._buffer))
+            self._buffer.clear()
+
+    def fechar(self):
+        if self._buffer:
+            self._entregar(bytes(self._buffer))
+        self._entregar(None)
+
+def _sql_copy_detalhado(db, cols, filtros) -> str:
+    """COPY do CSV detalhado com os parâmetros dos filtros já incorporados pelo psycopg2"""
+    stmt = (
+        select(
+            cols.id,
+            cols.cro,
+            cols.nome_inscrito,
+            cols.duvida,
+            func.nullif(cols.observacao, ""),
+            func.coalesce(cols.atendente, "Não informado"),
+            func.to_char(_sp_local(cols.created_at), "DD/MM/YYYY HH24:MI"),
+        )
+        .where(*filtros)
+        .order_by(cols.id)
     )
-    return response
+    compilado = stmt.compile(dialect=db.get_bind().dialect, compile_kwargs={"render_postcompile": True})
+    with db.connection().connection.dbapi_connection.cursor() as cur:
+        consulta = cur.mogrify(str(compilado), compilado.params).decode("utf-8")
+    return f"COPY ({consulta}) TO STDOUT WITH (FORMAT csv)"
+
+def _csv_detalhado_copy(db, cols, filtros):
+    """Gera o CSV detalhado por COPY; a sessão é fechada ao fim do download"""
+    inicio_render = time.perf_counter()
+    saida = _SaidaCopy()
+    try:
+        sql = _sql_copy_detalhado(db, cols, filtros)
+        dbapi = db.connection().connection.dbapi_connection
+
+        def copiar():
+            try:
+                with dbapi.cursor() as cur:
+                    cur.copy_expert(sql, saida)
+                saida.fechar()
+            except Exception as e:
+                saida.erro = e
+                try:
+                    saida._entregar(None)
+                except OSError:
+                    pass  # download já interrompido
+
+        thread = threading.Thread(target=copiar, name="export-copy", daemon=True)
+        thread.start()
+        try:
+            cabecalho = io.StringIO()
+            csv.writer(cabecalho).writerow(["ID", "CRO", "Nome Inscrito", "Dúvida", "Observação", "Atendente", "Data/Hora"])
+            yield cabecalho.getvalue().encode("utf-8")
+            while True:
+                bloco = saida.fila.get()
+                if bloco is None:
+                    break
+                yield bloco
+            if saida.erro is not None:
+                raise saida.erro
+        finally:
+            saida.cancelado.set()
+            thread.join()
+        METRICS.observe("ligacoes_export_render_duration_seconds", ("csv", "detalhado"), time.perf_counter() - inicio_render)
+    finally:
+        db.close()
+
+def _exportar(request: Request, formato: str):
+    """Resposta de /api/export/csv|pdf: o relatório pré-gerado, se houver um atual, ou gerado agora"""
+    report_type = request.query_params.get("tipo", "por_duvida")
+    start, end, tipos = _parse_filters(request)
+    historico = _parse_historico(request)
+    nome = f"relatorio_{report_type}_{datetime.now().strftime('%Y%m%d_%H%M')}.{formato}"
+    media_type = "text/csv" if formato == "csv" else "application/pdf"
+
+    cols = _fonte_ligacoes(historico).c
+    filtros = _filter_clauses(start, end, tipos, cols)
 
+    # Só consulta a impressão dos dados se há um arquivo pré-gerado para estes filtros
+    pre_gerado = _pre_gerado(formato, report_type, start, end, tipos, historico)
+    db = _sessao_leitura(request)
+    try:
+        if pre_gerado and _pre_gerado_confere(db, pre_gerado[1], start, end):
+            caminho, meta = pre_gerado
+            return FileResponse(caminho, media_type=media_type, filename=nome,
+                                headers={"X-Prerendered-At": meta["gerado_em"]})
+        if formato == "csv" and report_type == "detalhado" and db.get_bind().dialect.name == "postgresql":
+            # O gerador fecha a sessão ao fim do download
+            corpo, db = _csv_detalhado_copy(db, cols, filtros), None
+            return StreamingResponse(corpo, media_type=media_type,
+                                     headers={"Content-Disposition": f"attachment; filename={nome}"})
+        dados = _dados_export(db, report_type, cols, filtros)
+    finally:
+        if db is not None:
+            db.close()
+
+    conteudo = _gerar_csv(report_type, dados) if formato == "csv" else _gerar_pdf(report_type, start, end, dados)
+    return StreamingResponse(
+        io.BytesIO(conteudo),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={nome}"}
+    )
+
+# API: exportar dados em CSV
+@app.get("/api/export/csv")
+def export_csv(request: Request, session_token: str = Cookie(None, alias=SESSION_COOKIE_NAME)):
+    # Verificar autenticação e permissão para acessar relatórios
+    _require_reports_access(session_token)
+    return _exportar(request, "csv")
 
+# API: exportar dados em PDF
+@app.get("/api/export/pdf")
+def export_pdf(request: Request, session_token: str = Cookie(None, alias=SESSION_COOKIE_NAME)):
+    # Verificar autenticação e permissão para acessar relatórios
+    _require_reports_access(session_token)
+    return _exportar(request, "pdf")
+
+# Relatórios pré-gerados: ontem, semana atual (segunda até hoje) e a eleição inteira, em
+# por_duvida e detalhado, CSV e PDF, ficam prontos em PRERENDER_DIR. Cada arquivo guarda ao
+# lado (.json) a "impressão" dos dados do período (contagem, maior updated_at e maior id);
+# a exportação entrega o arquivo quando a impressão ainda confere e, se não, gera na hora.
+# A thread de fundo confere as impressões a cada PRERENDER_INTERVAL_MINUTES e refaz só os
+# arquivos que mudaram: períodos já encerrados (ontem) a qualquer hora, os que incluem hoje
+# só dentro de PRERENDER_HORAS (fora do pico). Com vários workers, um trava o PRERENDER_DIR/.lock
+# e gera; os demais só leem os arquivos.
+PRERENDER_DIR = os.getenv("PRERENDER_DIR", "prerender")
+PRERENDER_INTERVAL_MINUTES = float(os.getenv("PRERENDER_INTERVAL_MINUTES", "15"))  # 0 = desligado
+PRERENDER_HORAS = os.getenv("PRERENDER_HORAS", "0-6")  # horas de SP (inclusive) fora do pico
+PRERENDER_TIPOS = ("por_duvida", "detalhado")
+PRERENDER_FORMATOS = ("csv", "pdf")
+
+METRICS.define("ligacoes_export_prerender_total", "counter",
+               "Exportações com relatório pré-gerado por resultado (servido, desatualizado)", ("resultado",))
+prerender_logger = logging.getLogger("ligacoes.prerender")
+
+def _horas_fora_de_pico(valor: str):
+    inicio, _, fim = valor.partition("-")
+    inicio = int(inicio)
+    fim = int(fim or inicio)
+    # "22-5" atravessa a meia-noite
+    return set(range(inicio, fim + 1)) if inicio <= fim else set(range(inicio, 24)) | set(range(0, fim + 1))
+
+def _periodos_pre_gerados(hoje: date):
+    """Períodos pré-gerados (datas em SP, inclusive): None = sem limite"""
+    return {
+        "ontem": (hoje - timedelta(days=1), hoje - timedelta(days=1)),
+        "semana": (hoje - timedelta(days=hoje.weekday()), hoje),
+        "eleicao": (None, None),
+    }
+
+def _nome_pre_gerado(formato, report_type, start, end):
+    return f"{report_type}_{start.isoformat() if start else 'inicio'}_{end.isoformat() if end else 'fim'}.{formato}"
+
+def _impressao_dados(db, start, end):
+    """Muda sempre que o período ganha, perde ou altera uma ligação"""
+    t = Ligacao.__table__
+    total, ultima_alteracao, maior_id = db.execute(
+        select(func.count(), func.max(t.c.updated_at), func.max(t.c.id))
+        .where(*_filter_clauses(start, end, set(), t.c))
+    ).one()
+    return [total, ultima_alteracao.isoformat() if ultima_alteracao else None, maior_id]
+
+def _ler_meta(caminho):
+    try:
+        with open(caminho + ".json", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _gravar_atomico(caminho, conteudo: bytes):
+    # Quem estiver servindo o arquivo antigo continua com ele; a troca é atômica
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    with open(temporario, "wb") as f:
+        f.write(conteudo)
+    os.replace(temporario, caminho)
+
+def _pre_gerado(formato, report_type, start, end, tipos, historico):
+    """(caminho, meta) do relatório pré-gerado com os mesmos filtros, se houver; não consulta o banco"""
+    if tipos or historico or report_type not in PRERENDER_TIPOS:
+        return None
+    caminho = os.path.join(PRERENDER_DIR, _nome_pre_gerado(formato, report_type, start, end))
+    meta = _ler_meta(caminho)
+    if not meta or not os.path.exists(caminho):
+        return None
+    return caminho, meta
+
+def _pre_gerado_confere(db, meta, start, end) -> bool:
+    """O arquivo pré-gerado ainda corresponde aos dados do período?"""
+    if meta["impressao"] != _impressao_dados(db, start, end):
+        METRICS.inc("ligacoes_export_prerender_total", ("desatualizado",))
+        return False
+    METRICS.inc("ligacoes_export_prerender_total", ("servido",))
+    return True
+
+def pre_gerar_relatorios(forcar: bool = False, agora: datetime = None) -> Dict[str, Any]:
+    """Gera os relatórios cujo período mudou desde a última geração e apaga os de dias anteriores"""
+    agora = agora or datetime.now(TZ)
+    hoje = agora.date()
+    fora_de_pico = forcar or agora.hour in _horas_fora_de_pico(PRERENDER_HORAS)
+    os.makedirs(PRERENDER_DIR, exist_ok=True)
+    t = Ligacao.__table__
+    esperados, gerados, adiados = set(), [], []
+
+    db = SessionLocal()
+    try:
+        for start, end in _periodos_pre_gerados(hoje).values():
+            impressao = _impressao_dados(db, start, end)
+            encerrado = end is not None and end < hoje
+            for report_type in PRERENDER_TIPOS:
+                dados = None
+                for formato in PRERENDER_FORMATOS:
+                    nome = _nome_pre_gerado(formato, report_type, start, end)
+                    caminho = os.path.join(PRERENDER_DIR, nome)
+                    esperados.update((nome, nome + ".json"))
+                    meta = _ler_meta(caminho)
+                    if meta and meta["impressao"] == impressao and os.path.exists(caminho):
+                        continue
+                    if not (fora_de_pico or encerrado):
+                        adiados.append(nome)
+                        continue
+                    if dados is None:
+                        dados = _dados_export(db, report_type, t.c, _filter_clauses(start, end, set(), t.c))
+                    conteudo = _gerar_csv(report_type, dados) if formato == "csv" else _gerar_pdf(report_type, start, end, dados)
+                    _gravar_atomico(caminho, conteudo)
+                    # A impressão é lida antes dos dados: se algo mudou no meio, o arquivo
+                    # fica desatualizado (gerado de novo) e nunca parece mais novo do que é
+                    _gravar_atomico(caminho + ".json", json.dumps({
+                        "impressao": impressao,
+                        "gerado_em": datetime.now(UTC).isoformat(),
+                    }).encode("utf-8"))
+                    gerados.append(nome)
+    finally:
+        db.close()
+
+    removidos = [nome for nome in os.listdir(PRERENDER_DIR) if not nome.startswith(".") and nome not in esperados]
+    for nome in removidos:
+        os.remove(os.path.join(PRERENDER_DIR, nome))
+
+    resultado = {"gerados": gerados, "adiados": adiados, "removidos": removidos, "fora_de_pico": fora_de_pico}
+    if gerados or removidos:
+        prerender_logger.info("Relatórios pré-gerados: %s", json.dumps(resultado))
+    return resultado
+
+def _travar_pre_geracao():
+    """Trava exclusiva do PRERENDER_DIR (um worker gera); None se outro processo já gera"""
+    try:
+        import fcntl
+    except ImportError:  # Windows: sem flock, cada processo gera os seus
+        return True
+    os.makedirs(PRERENDER_DIR, exist_ok=True)
+    trava = open(os.path.join(PRERENDER_DIR, ".lock"), "w")
+    try:
+        fcntl.flock(trava, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        trava.close()
+        return None
+    return trava  # aberto enquanto o processo viver
+
+def _loop_pre_geracao(trava):
+    while True:
+        try:
+            pre_gerar_relatorios()
+        except Exception:
+            prerender_logger.exception("Falha ao pré-gerar relatórios")
+        time.sleep(PRERENDER_INTERVAL_MINUTES * 60)
+
+def _iniciar_pre_geracao():
+    if PRERENDER_INTERVAL_MINUTES <= 0:
+        return
+    trava = _travar_pre_geracao()
+    if trava is None:
+        return
+    if not prerender_logger.handlers:
+        prerender_logger.setLevel(logging.INFO)
+        prerender_logger.addHandler(logging.StreamHandler())
+    threading.Thread(target=_loop_pre_geracao, args=(trava,), name="pre-geracao-relatorios", daemon=True).start()
+
+app.add_event_handler("startup", _iniciar_pre_geracao)
+
+# API: exportar dados em Excel (XLSX)
+# Workbook do openpyxl em modo write-only (as linhas vão direto para o XML em disco),
+# alimentado pelo banco em lotes e entregue a partir de um arquivo temporário:
+# a memória fica constante mesmo com planilhas grandes.
+XLSX_BATCH_SIZE = 2000
+XLSX_SPOOL_MAX_BYTES = 8 * 1024 * 1024  # acima disso o arquivo temporário vai para o disco
+XLSX_CHUNK_SIZE = 64 * 1024
+XLSX_DATETIME_FORMAT = "DD/MM/YYYY HH:MM"
+
+def _xlsx_header(ws, titulos):
+    """Linha de cabeçalho em negrito (write-only exige WriteOnlyCell para estilo)"""
+    negrito = Font(bold=True)
+    linha = []
+    for titulo in titulos:
+        cell = WriteOnlyCell(ws, value=titulo)
+        cell.font = negrito
+        linha.append(cell)
+    ws.append(linha)
+
+def _iter_arquivo(arquivo):
+    """Lê o arquivo temporário em blocos e o fecha ao final do download"""
+    try:
+        while True:
+            bloco = arquivo.read(XLSX_CHUNK_SIZE)
+            if not bloco:
+                break
+            yield bloco
+    finally:
+        arquivo.close()
+
+@app.get("/api/export/xlsx")
+def export_xlsx(request: Request, session_token: str = Cookie(None, alias=SESSION_COOKIE_NAME)):
+    # Verificar autenticação e permissão para acessar relatórios
+    _require_reports_access(session_token)
+
+    report_type = request.query_params.get("tipo", "por_duvida")
+    start, end, tipos = _parse_filters(request)
+    cols = _fonte_ligacoes(_parse_historico(request)).c
+    filtros = _filter_clauses(start, end, tipos, cols)
+
+    inicio_render = time.perf_counter()
+    wb = Workbook(write_only=True)
+    db = _sessao_leitura(request)
+    try:
+        if report_type == "detalhado":
+            ws = wb.create_sheet("Detalhado")
+            for coluna, largura in zip("ABCDEFG", (8, 16, 32, 48, 48, 28, 18)):
+                ws.column_dimensions[coluna].width = largura
+            ws.freeze_panes = "A2"
+            _xlsx_header(ws, ["ID", "CRO", "Nome Inscrito", "Dúvida", "Observação", "Atendente", "Data/Hora"])
+            stmt = (
+                select(cols.id, cols.cro, cols.nome_inscrito, cols.duvida,
+                       cols.observacao, cols.atendente, cols.created_at)
+                .where(*filtros)
+                .order_by(cols.id)
+                .execution_options(yield_per=XLSX_BATCH_SIZE)
+            )
+            for lote in db.execute(stmt).partitions():
+                for row in lote:
+                    # Data nativa do Excel no horário de SP (o Excel não guarda fuso)
+                    data = WriteOnlyCell(ws, value=to_sp(row.created_at).replace(tzinfo=None))
+                    data.number_format = XLSX_DATETIME_FORMAT
+                    ws.append([row.id, row.cro, row.nome_inscrito, row.duvida,
+                               row.observacao or "", row.atendente or "Não informado", data])
+        else:
+            ws = wb.create_sheet("Por dúvida")
+            ws.column_dimensions["A"].width = 70
+            ws.column_dimensions["B"].width = 14
+            ws.column_dimensions["C"].width = 14
+            _xlsx_header(ws, ["Tipo de Dúvida", "Quantidade", "Percentual"])
+            contagem = _contar_por_duvida(db, cols, filtros)
+            total = sum(contagem.values())
+            for duvida in DUVIDA_OPCOES:
+                count = contagem.get(duvida, 0)
+                if count > 0:
+                    pct = WriteOnlyCell(ws, value=count / total)
+                    pct.number_format = "0.0%"
+                    ws.append([duvida, count, pct])
+    finally:
+        db.close()
+
+    arquivo = tempfile.SpooledTemporaryFile(max_size=XLSX_SPOOL_MAX_BYTES)
+    wb.save(arquivo)
+    arquivo.seek(0)
+    METRICS.observe("ligacoes_export_render_duration_seconds", ("xlsx", "detalhado" if report_type == "detalhado" else "por_duvida"), time.perf_counter() - inicio_render)
+
+    return StreamingResponse(
+        _iter_arquivo(arquivo),
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        headers={"Content-Disposition": f"attachment; filename=relatorio_{report_type}_{datetime.now().strftime('%Y%m%d_%H%M')}.xlsx"}
+    )
+
+# API de dados em NDJSON para ferramentas de BI
+# Uma ligação por linha, com campos crus e datas ISO 8601 em UTC. A leitura usa cursor
+# do lado do servidor (stream_results) e lotes de tamanho fixo; para volumes grandes o
+# consumidor divide a tabela em faixas de id (/api/data/ligacoes/shards) e baixa em paralelo.
+DATA_API_TOKEN = os.getenv("DATA_API_TOKEN")  # opcional: acesso por "Authorization: Bearer <token>"
+DATA_API_BATCH_SIZE = 5000
+DATA_API_MAX_SHARDS = 64
+
+def _require_data_access(request: Request, session_token: str):
+    """Token de API (integrações) ou sessão com acesso aos relatórios"""
+    auth = request.headers.get("authorization", "")
+    if DATA_API_TOKEN and auth.startswith("Bearer "):
+        if not secrets.compare_digest(auth[len("Bearer "):], DATA_API_TOKEN):
+            raise HTTPException(status_code=401, detail="Token inválido")
+        return
+    _require_reports_access(session_token)
+
+def _parse_int_param(request: Request, nome: str, minimo: int = None):
+    valor = request.query_params.get(nome)
+    if valor in (None, ""):
+        return None
+    try:
+        numero = int(valor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Parâmetro '{nome}' deve ser inteiro")
+    if minimo is not None and numero < minimo:
+        raise HTTPException(status_code=400, detail=f"Parâmetro '{nome}' deve ser >= {minimo}")
+    return numero
+
+def _iso_utc(dt):
+    if dt is None:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=UTC)
+    return dt.astimezone(UTC).isoformat()
+
+def _iter_ndjson(db, cols, clauses):
+    """Gera as linhas NDJSON lendo o banco em lotes; a sessão é fechada ao fim do download"""
+    try:
+        stmt = (
+            select(cols.id, cols.cro, cols.nome_inscrito, cols.duvida, cols.observacao,
+                   cols.atendente, cols.created_at, cols.updated_at, cols.deleted_at)
+            .where(*clauses)
+            .order_by(cols.id)
+            .execution_options(stream_results=True, yield_per=DATA_API_BATCH_SIZE)
+        )
+        for lote in db.execute(stmt).partitions():
+            yield "".join(
+                json.dumps({
+                    "id": row.id,
+                    "cro": row.cro,
+                    "nome_inscrito": row.nome_inscrito,
+                    "duvida": row.duvida,
+                    "observacao": row.observacao,
+                    "atendente": row.atendente,
+                    "created_at": _iso_utc(row.created_at),
+                    "updated_at": _iso_utc(row.updated_at),
+                    "deleted_at": _iso_utc(row.deleted_at),
+                }, ensure_ascii=False) + "\n"
+                for row in lote
+            ).encode("utf-8")
+    finally:
+        db.close()
+
+@app.get("/api/data/ligacoes.ndjson")
+def data_ligacoes_ndjson(request: Request, session_token: str = Cookie(None, alias=SESSION_COOKIE_NAME)):
+    """Ligações (inclusive excluídas, com deleted_at) na faixa [desde_id, ate_id), ordenadas por id"""
+    _require_data_access(request, session_token)
+    desde_id = _parse_int_param(request, "desde_id", minimo=0)
+    ate_id = _parse_int_param(request, "ate_id", minimo=0)
+    start, end, tipos = _parse_filters(request)
+    cols = _fonte_ligacoes(_parse_historico(request)).c
+
+    clauses = _filter_clauses(start, end, tipos, cols) if (start or end or tipos) else []
+    if desde_id is not None:
+        clauses.append(cols.id >= desde_id)
+    if ate_id is not None:
+        clauses.append(cols.id < ate_id)
+
+    return StreamingResponse(_iter_ndjson(_sessao_leitura(request), cols, clauses), media_type="application/x-ndjson")
+
+@app.get("/api/data/ligacoes/shards")
+def data_ligacoes_shards(request: Request, session_token: str = Cookie(None, alias=SESSION_COOKIE_NAME)):
+    """Divide a faixa de ids em n partes para download paralelo do NDJSON"""
+    _require_data_access(request, session_token)
+    n = _parse_int_param(request, "n", minimo=1) or 4
+    n = min(n, DATA_API_MAX_SHARDS)
+
+    historico = _parse_historico(request)
+    cols = _fonte_ligacoes(historico).c
+
+    db = _sessao_leitura(request)
+    try:
+        menor, maior = db.execute(select(func.min(cols.id), func.max(cols.id))).one()
+    finally:
+        db.close()
+    if menor is None:
+        return {"min_id": None, "max_id": None, "shards": []}
+
+    passo = max(1, -(-(maior - menor + 1) // n))  # divisão arredondada para cima
+    shards = []
+    for desde in range(menor, maior + 1, passo):
+        ate = min(desde + passo, maior + 1)
+        shards.append({
+            "desde_id": desde,
+            "ate_id": ate,
+            "url": f"/api/data/ligacoes.ndjson?desde_id={desde}&ate_id={ate}" + ("&historico=1" if historico else ""),
+        })
+    return {"min_id": menor, "max_id": maior, "shards": shards}
+
+# API: feed de mudanças (inclusões, edições e exclusões) para cópias incrementais
+# O cursor é a posição (updated_at, id) da última mudança entregue. Mudanças mais recentes
+# que CHANGES_SAFETY_LAG_SECONDS ainda não são entregues: uma transação que começou antes
+# pode confirmar depois com updated_at menor, e seria pulada pelo cursor.
+CHANGES_SAFETY_LAG_SECONDS = float(os.getenv("CHANGES_SAFETY_LAG_SECONDS", "5"))
+CHANGES_MAX_LIMIT = 10000
+
+def _encode_cursor(updated_at, ligacao_id: int) -> str:
+    bruto = f"{updated_at.replace(tzinfo=None).isoformat()}|{ligacao_id}"
+    return base64.urlsafe_b64encode(bruto.encode()).decode().rstrip("=")
+
+def _decode_cursor(cursor: str):
+    try:
+        bruto = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        data, ligacao_id = bruto.split("|")
+        return datetime.fromisoformat(data), int(ligacao_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+def _tipo_mudanca(row) -> str:
+    if row.deleted_at is not None:
+        return "delete"
+    if row.versao is not None:
+        return "insert" if row.versao == 1 else "update"
+    if row.created_at is not None and row.updated_at.replace(tzinfo=None) == row.created_at.replace(tzinfo=None):
+        return "insert"
+    return "update"
+
+@app.get("/api/changes")
+def changes(request: Request, session_token: str = Cookie(None, alias=SESSION_COOKIE_NAME)):
+    """Mudanças em ordem de (updated_at, id) a partir do cursor; repita com o cursor devolvido até has_more=false"""
+    _require_data_access(request, session_token)
+    limite = min(_parse_int_param(request, "limit", minimo=1) or 1000, CHANGES_MAX_LIMIT)
+    since = request.query_params.get("since")
+
+    clauses = [
+        Ligacao.updated_at.isnot(None),
+        Ligacao.updated_at <= datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=CHANGES_SAFETY_LAG_SECONDS),
+    ]
+    if since:
+        desde, desde_id = _decode_cursor(since)
+        clauses.append(or_(Ligacao.updated_at > desde, and_(Ligacao.updated_at == desde, Ligacao.id > desde_id)))
+
+    # Sempre no primário: uma réplica atrasada poderia fazer o cursor pular mudanças
+    db = SessionLocal()
+    try:
+        rows = db.execute(
+            select(Ligacao.id, Ligacao.cro, Ligacao.nome_inscrito, Ligacao.duvida, Ligacao.observacao,
+                   Ligacao.atendente, Ligacao.created_at, Ligacao.updated_at, Ligacao.deleted_at, Ligacao.versao)
+            .where(*clauses)
+            .order_by(Ligacao.updated_at, Ligacao.id)
+            .limit(limite + 1)
+        ).all()
+    finally:
+        db.close()
+
+    has_more = len(rows) > limite
+    rows = rows[:limite]
+    return {
+        "changes": [
+            {
+                "op": _tipo_mudanca(row),
+                "id": row.id,
+                "cro": row.cro,
+                "nome_inscrito": row.nome_inscrito,
+                "duvida": row.duvida,
+                "observacao": row.observacao,
+                "atendente": row.atendente,
+                "created_at": _iso_utc(row.created_at),
+                "updated_at": _iso_utc(row.updated_at),
+                "deleted_at": _iso_utc(row.deleted_at),
+            }
+            for row in rows
+        ],
+        # Sem mudanças novas o cursor recebido é devolvido, para a próxima sincronização
+        "cursor": _encode_cursor(rows[-1].updated_at, rows[-1].id) if rows else since,
+        "has_more": has_more,
+    }
+
+# Importação em lote (manutencao.py importar): no PostgreSQL as linhas entram por
+# COPY ... FROM STDIN (um CSV gerado em memória por lote); nos demais bancos, um
+# executemany por lote. Em ambos, o índice de termos é ajustado na mesma transação.
+IMPORT_BATCH_SIZE = 10000
+IMPORT_COLUNAS = ("cro", "nome_inscrito", "duvida", "observacao", "atendente", "created_at", "updated_at", "deleted_at", "versao")
+
+def _utc_sem_tz(dt):
+    if dt is None or dt.tzinfo is None:
+        return dt
+    return dt.astimezone(UTC).replace(tzinfo=None)
+
+def _campo_copy(valor) -> str:
+    # NULL padrão do COPY csv: campo vazio sem aspas. Todo valor vai entre aspas, então
+    # texto vazio (e qualquer texto, inclusive "\N") continua texto
+    if valor is None:
+        return ""
+    return '"' + str(valor).replace('"', '""') + '"'
+
+def _copiar_lote(conn, linhas):
+    arquivo = io.StringIO()
+    for linha in linhas:
+        arquivo.write(",".join(_campo_copy(linha[c]) for c in IMPORT_COLUNAS) + "\n")
+    arquivo.seek(0)
+    with conn.connection.dbapi_connection.cursor() as cur:
+        cur.copy_expert(f"COPY ligacoes ({', '.join(IMPORT_COLUNAS)}) FROM STDIN WITH (FORMAT csv)", arquivo)
+    # O COPY não passa pelos eventos do SQLAlchemy: marca a gravação para limpar o STATS_CACHE
+    conn.info["gravou"] = True
+
+def importar_ligacoes(linhas, lote: int = IMPORT_BATCH_SIZE, usar_copy: bool = None) -> int:
+    """Insere ligações (dicts com cro, nome_inscrito, duvida, observacao, atendente, created_at
+    e, opcionalmente, deleted_at) em lotes; devolve quantas foram inseridas. O updated_at
+    de origem é ignorado."""
+    tabela = Ligacao.__table__
+    inseridas = 0
+    # updated_at = momento da importação (como na ingestão por API): com o updated_at de origem
+    # as linhas ficariam atrás do cursor de quem já sincronizou e o /api/changes as pularia
+    agora = datetime.now(UTC).replace(tzinfo=None)
+    with engine.begin() as conn:
+        if usar_copy is None:
+            usar_copy = conn.dialect.name == "postgresql"
+        buffer = []
+
+        def gravar():
+            if usar_copy:
+                _copiar_lote(conn, buffer)
+            else:
+                conn.execute(tabela.insert(), buffer)
+            _ajustar_termos(conn, incluidas=[
+                (linha["created_at"], linha["duvida"], linha["observacao"]) for linha in buffer if linha["deleted_at"] is None
+            ])
+
+        for linha in linhas:
+            created_at = _utc_sem_tz(linha["created_at"])
+            buffer.append({
+                "cro": linha["cro"],
+                "nome_inscrito": linha["nome_inscrito"],
+                "duvida": linha["duvida"],
+                "observacao": linha.get("observacao") or "",
+                "atendente": linha.get("atendente"),
+                "created_at": created_at,
+                "updated_at": agora,
+                "deleted_at": _utc_sem_tz(linha.get("deleted_at")),
+                "versao": 1,  # o COPY não aplica os defaults do modelo
+            })
+            if len(buffer) >= lote:
+                gravar()
+                inseridas += len(buffer)
+                buffer = []
+        if buffer:
+            gravar()
+            inseridas += len(buffer)
+    return inseridas
+
+
+# Ingestão por API (central telefônica): POST /api/ligacoes/batch recebe um array JSON de
+# ligações. Cada item é validado isoladamente e os válidos entram com um único executemany
+# (INSERT ... RETURNING id), com o índice de termos e as chaves de idempotência gravados na
+# mesma transação. Itens com "chave" já recebida são devolvidos como "duplicada", com o id original.
+INGEST_API_TOKEN = os.getenv("INGEST_API_TOKEN")  # "Authorization: Bearer <token>" da central
+INGEST_MAX_ITEMS = int(os.getenv("INGEST_MAX_ITEMS", "5000"))
+INGEST_FUTURO_TOLERANCIA = timedelta(minutes=5)  # relógio da central adiantado
+METRICS.define("ligacoes_ingestao_itens_total", "counter", "Itens recebidos em /api/ligacoes/batch por resultado", ("resultado",))
+
+def _require_ingest_access(request: Request, session_token: str):
+    """Token da central (o atendente vem de cada item) ou sessão de qualquer usuário (o atendente
+    é o usuário logado, como no formulário). Devolve (atendente fixo, pode informar created_at):
+    só a central e quem pode editar registros lançam ligações com outro horário."""
+    auth = request.headers.get("authorization", "")
+    if INGEST_API_TOKEN and auth.startswith("Bearer "):
+        if not secrets.compare_digest(auth[len("Bearer "):], INGEST_API_TOKEN):
+            raise HTTPException(status_code=401, detail="Token inválido")
+        return None, True
+    if not session_token or not is_valid_session(session_token):
+        raise HTTPException(status_code=401, detail="Não autorizado")
+    username = active_sessions[session_token]["username"]
+    return get_user_full_name(username), can_edit_delete(username)
+
+def _texto_item(item: dict, campo: str, limite: int, obrigatorio: bool = False) -> Optional[str]:
+    valor = item.get(campo)
+    if valor is None or (isinstance(valor, str) and not valor.strip()):
+        if obrigatorio:
+            raise ValueError(f"'{campo}' é obrigatório")
+        return None
+    if not isinstance(valor, str):
+        raise ValueError(f"'{campo}' deve ser texto")
+    valor = valor.strip()
+    if len(valor) > limite:
+        raise ValueError(f"'{campo}' excede {limite} caracteres")
+    return valor
+
+def _validar_item_ingestao(item, atendente_fixo: Optional[str], pode_datar: bool, agora: datetime):
+    """Converte um item do batch na linha a inserir; devolve (chave, linha) ou levanta ValueError.
+    Sem `pode_datar` o created_at do item é ignorado (vale o horário do recebimento)."""
+    if not isinstance(item, dict):
+        raise ValueError("item deve ser um objeto JSON")
+    duvida = item.get("duvida")
+    if duvida not in DUVIDA_OPCOES:
+        raise ValueError(f"dúvida inválida: {duvida!r}")
+    created_at = agora
+    if pode_datar and item.get("created_at") is not None:
+        try:
+            created_at = _utc_sem_tz(datetime.fromisoformat(str(item["created_at"])))
+        except ValueError:
+            raise ValueError("'created_at' deve estar em ISO 8601")
+        if created_at > agora + INGEST_FUTURO_TOLERANCIA:
+            raise ValueError("'created_at' está no futuro")
+    return _texto_item(item, "chave", 100), {
+        "cro": _texto_item(item, "cro", 50, obrigatorio=True),
+        "nome_inscrito": _texto_item(item, "nome_inscrito", 255, obrigatorio=True),
+        "duvida": duvida,
+        "observacao": _texto_item(item, "observacao", 1000) or "",
+        "atendente": atendente_fixo or _texto_item(item, "atendente", 100),
+        "created_at": created_at,
+        # Recebimento, e não o horário da ligação: o feed /api/changes não pula itens atrasados
+        "updated_at": agora,
+    }
+
+def _gravar_ingestao(validos):
+    """Grava [(indice, chave, linha)] numa transação; devolve {indice: (status, id)}"""
+    tabela, chaves = Ligacao.__table__, LigacaoChave.__table__
+    with engine.begin() as conn:
+        recebidas = {chave for _, chave, _ in validos if chave}
+        conhecidas = dict(conn.execute(
+            select(chaves.c.chave, chaves.c.ligacao_id).where(chaves.c.chave.in_(recebidas))
+        ).all()) if recebidas else {}
+        novos, repetidos = [], []
+        for indice, chave, linha in validos:
+            if chave in conhecidas:
+                repetidos.append((indice, chave))
+                continue
+            if chave:
+                conhecidas[chave] = None  # repetida no próprio batch: recebe o id da primeira
+            novos.append((indice, chave, linha))
+        ids = []
+        if novos:
+            ids = conn.execute(
+                tabela.insert().returning(tabela.c.id, sort_by_parameter_order=True),
+                [linha for _, _, linha in novos],
+            ).scalars().all()
+            for (_, chave, _), ligacao_id in zip(novos, ids):
+                if chave:
+                    conhecidas[chave] = ligacao_id
+            gravadas = [{"chave": chave, "ligacao_id": conhecidas[chave]} for _, chave, _ in novos if chave]
+            if gravadas:
+                conn.execute(chaves.insert(), gravadas)
+            _ajustar_termos(conn, incluidas=[
+                (linha["created_at"], linha["duvida"], linha["observacao"]) for _, _, linha in novos
+            ])
+    resultado = {indice: ("criada", ligacao_id) for (indice, _, _), ligacao_id in zip(novos, ids)}
+    resultado.update({indice: ("duplicada", conhecidas[chave]) for indice, chave in repetidos})
+    return resultado
+
+@app.post("/api/ligacoes/batch")
+def ingerir_batch(
+    request: Request,
+    itens: List[Any] = Body(...),
+    session_token: str = Cookie(None, alias=SESSION_COOKIE_NAME),
+):
+    """Inclui um array de ligações (cro, nome_inscrito, duvida e, opcionais, observacao, atendente,
+    created_at ISO 8601 e chave de idempotência); responde o resultado de cada item, na ordem"""
+    atendente_fixo, pode_datar = _require_ingest_access(request, session_token)
+    if len(itens) > INGEST_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"No máximo {INGEST_MAX_ITEMS} itens por batch")
+
+    agora = datetime.now(UTC).replace(tzinfo=None)
+    resultados, validos = [None] * len(itens), []
+    for indice, item in enumerate(itens):
+        try:
+            chave, linha = _validar_item_ingestao(item, atendente_fixo, pode_datar, agora)
+        except ValueError as e:
+            resultados[indice] = {"indice": indice, "status": "invalida", "erro": str(e)}
+            continue
+        validos.append((indice, chave, linha))
+
+    if validos:
+        try:
+            gravados = _gravar_ingestao(validos)
+        except IntegrityError:
+            # Outro batch gravou a mesma chave ao mesmo tempo: item a item, a chave já é conhecida.
+            # Um conflito que persiste fica no resultado do próprio item, sem perder os demais
+            gravados = {}
+            for valido in validos:
+                try:
+                    gravados.update(_gravar_ingestao([valido]))
+                except IntegrityError:
+                    resultados[valido[0]] = {"indice": valido[0], "status": "erro",
+                                             "erro": "conflito ao gravar; reenvie o item"}
+        for indice, (status, ligacao_id) in gravados.items():
+            resultados[indice] = {"indice": indice, "status": status, "id": ligacao_id}
+
+    contagem = Counter(r["status"] for r in resultados)
+    for status, quantidade in contagem.items():
+        METRICS.inc("ligacoes_ingestao_itens_total", (status,), quantidade)
+    resposta = JSONResponse({
+        "recebidas": len(itens),
+        "criadas": contagem["criada"],
+        "duplicadas": contagem["duplicada"],
+        "invalidas": contagem["invalida"],
+        "erros": contagem["erro"],
+        "resultados": resultados,
+    })
+    return _marcar_gravacao(resposta) if contagem["criada"] else resposta
+
+# Retenção: ligações excluídas (soft delete) são apagadas de vez após PURGE_RETENTION_DAYS.
+# A remoção é feita em lotes curtos por id (sem locks longos) e depois o espaço é recuperado:
+# incremental_vacuum no SQLite, VACUUM ANALYZE no PostgreSQL. Roda pelo manutencao.py purgar
+# ou, com PURGE_INTERVAL_HOURS > 0, em uma thread de fundo do app.
+PURGE_RETENTION_DAYS = int(os.getenv("PURGE_RETENTION_DAYS", "90"))
+PURGE_INTERVAL_HOURS = float(os.getenv("PURGE_INTERVAL_HOURS", "0"))  # 0 = só pelo CLI
+PURGE_BATCH_SIZE = int(os.getenv("PURGE_BATCH_SIZE", "1000"))
+PURGE_PAUSE_SECONDS = 0.05  # folga entre lotes para as gravações dos atendentes
+
+METRICS.define("ligacoes_purged_rows_total", "counter", "Ligações excluídas apagadas definitivamente pela retenção")
+purge_logger = logging.getLogger("ligacoes.purga")
+
+class TamanhoBanco(NamedTuple):
+    dados: int  # bytes ocupados por dados
+    disco: int  # bytes em disco (no SQLite inclui as páginas livres)
+
+def _tamanho_banco(conn) -> TamanhoBanco:
+    """Tamanho do SQLite ou das tabelas/partições no PostgreSQL (onde dados == disco)"""
+    if conn.dialect.name == "sqlite":
+        paginas = conn.execute(text("PRAGMA page_count")).scalar()
+        livres = conn.execute(text("PRAGMA freelist_count")).scalar()
+        tamanho_pagina = conn.execute(text("PRAGMA page_size")).scalar()
+        return TamanhoBanco((paginas - livres) * tamanho_pagina, paginas * tamanho_pagina)
+    total = conn.execute(text(
+        "SELECT coalesce(sum(pg_total_relation_size(c.oid)), 0) FROM pg_class c "
+        "WHERE c.relname IN ('ligacoes', 'ligacoes_arquivo') "
+        "OR c.oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent::regclass::text IN ('ligacoes', 'ligacoes_arquivo'))"
+    )).scalar()
+    return TamanhoBanco(int(total), int(total))
+
+def _recuperar_espaco(conn, vacuum_completo: bool = False):
+    """Devolve ao sistema o espaço das linhas apagadas (conexão em autocommit)"""
+    if conn.dialect.name == "sqlite":
+        if vacuum_completo:
+            # Converte bancos antigos para auto_vacuum incremental (reescreve o arquivo)
+            conn.execute(text("PRAGMA auto_vacuum = INCREMENTAL"))
+            conn.execute(text("VACUUM"))
+        elif conn.execute(text("PRAGMA auto_vacuum")).scalar() == 2:
+            # O execute() do sqlite3 dá um único passo (libera uma página);
+            # o executescript() roda o PRAGMA até o fim
+            conn.connection.dbapi_connection.executescript("PRAGMA incremental_vacuum;")
+        else:
+            purge_logger.info("SQLite sem auto_vacuum incremental: o espaço é reaproveitado, mas o arquivo "
+                              "só diminui com 'python manutencao.py purgar --vacuum-completo'")
+        return
+    for tabela in ("ligacoes", "ligacoes_arquivo"):
+        conn.execute(text(f"VACUUM {'FULL ' if vacuum_completo else ''}ANALYZE {tabela}"))
+
+def purgar_excluidas(dias: int = None, lote: int = None, vacuum: bool = True, vacuum_completo: bool = False) -> Dict[str, Any]:
+    """Apaga definitivamente as ligações excluídas há mais de `dias` (tabela ativa e arquivo)"""
+    dias = PURGE_RETENTION_DAYS if dias is None else dias
+    lote = lote or PURGE_BATCH_SIZE
+    corte = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=dias)
+    inicio = time.perf_counter()
+
+    with engine.connect() as conn:
+        usado_antes, arquivo_antes = _tamanho_banco(conn)
+
+    apagadas = 0
+    for tabela in (Ligacao.__table__, LigacaoArquivo.__table__):
+        while True:
+            with engine.begin() as conn:
+                ids = conn.execute(
+                    select(tabela.c.id)
+                    .where(tabela.c.deleted_at.isnot(None), tabela.c.deleted_at < corte)
+                    .order_by(tabela.c.id)
+                    .limit(lote)
+                ).scalars().all()
+                if not ids:
+                    break
+                conn.execute(tabela.delete().where(tabela.c.id.in_(ids)))
+            apagadas += len(ids)
+            METRICS.inc("ligacoes_purged_rows_total", value=len(ids))
+            time.sleep(PURGE_PAUSE_SECONDS)
+
+    if vacuum and (apagadas or vacuum_completo):
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            _recuperar_espaco(conn, vacuum_completo)
+
+    with engine.connect() as conn:
+        usado_depois, arquivo_depois = _tamanho_banco(conn)
+    resultado = {
+        "apagadas": apagadas,
+        "retencao_dias": dias,
+        "corte_utc": corte.isoformat(),
+        "bytes_liberados": max(0, arquivo_antes - arquivo_depois),
+        "bytes_dados_antes": usado_antes,
+        "bytes_dados_depois": usado_depois,
+        "duracao_s": round(time.perf_counter() - inicio, 3),
+    }
+    purge_logger.info("Purga de excluídas: %s", json.dumps(resultado))
+    return resultado
+
+def _loop_purga():
+    while True:
+        time.sleep(PURGE_INTERVAL_HOURS * 3600)
+        try:
+            purgar_excluidas()
+        except Exception:
+            purge_logger.exception("Falha na purga de ligações excluídas")
+
+def _iniciar_purga_periodica():
+    if PURGE_INTERVAL_HOURS > 0 and PURGE_RETENTION_DAYS > 0:
+        if not purge_logger.handlers:
+            purge_logger.setLevel(logging.INFO)
+            purge_logger.addHandler(logging.StreamHandler())
+        threading.Thread(target=_loop_purga, name="purga-excluidas", daemon=True).start()
+
+app.add_event_handler("startup", _iniciar_purga_periodica)
+
+# API: perfis gravados com ?_profile=salvar
+@app.get("/api/profiles")
+def listar_profiles(session_token: str = Cookie(None, alias=SESSION_COOKIE_NAME)):
+    _require_reports_access(session_token)
+    if not os.path.isdir(PROFILE_DIR):
+        return {"profiles": []}
+    ids = sorted({nome.rsplit(".", 1)[0] for nome in os.listdir(PROFILE_DIR)}, reverse=True)
+    return {"profiles": ids}
+
+@app.get("/api/profiles/{profile_id}.{formato}")
+def baixar_profile(profile_id: str, formato: str, session_token: str = Cookie(None, alias=SESSION_COOKIE_NAME)):
+    _require_reports_access(session_token)
+    if formato not in ("json", "folded", "prof") or os.path.basename(profile_id) != profile_id:
+        raise HTTPException(status_code=404, detail="Perfil não encontrado")
+    caminho = os.path.join(PROFILE_DIR, f"{profile_id}.{formato}")
+    if not os.path.isfile(caminho):
+        raise HTTPException(status_code=404, detail="Perfil não encontrado")
+    return FileResponse(caminho, filename=os.path.basename(caminho))
+
+# Admin: queries mais lentas registradas (ver SLOW_QUERY_MS)
+@app.get("/admin/queries-lentas")
+def admin_queries_lentas(request: Request, session_token: str = Cookie(None, alias=SESSION_COOKIE_NAME)):
+    # Verificar autenticação
+    if not session_token or not is_valid_session(session_token):
+        return RedirectResponse("/login", status_code=302)
+
+    current_user = active_sessions[session_token]
+    current_username = current_user['username']
+    if not can_access_reports(current_username):
+        raise HTTPException(status_code=403, detail="Acesso negado - Você não tem permissão para acessar relatórios")
+
+    ordem = request.query_params.get("ordem", "total_ms")
+    if ordem not in ("total_ms", "max_ms", "media_ms", "vezes"):
+        ordem = "total_ms"
+    return templates.TemplateResponse("queries_lentas.html", {
+        "request": request,
+        "queries": piores_queries(ordem),
+        "ordem": ordem,
+        "limite_ms": SLOW_QUERY_MS,
+        "arquivo_log": SLOW_QUERY_LOG,
+        "current_user": current_user,
+        "current_username": current_username,
+        "current_user_fullname": get_user_full_name(current_username),
+        "can_access_reports": can_access_reports(current_username),
+    })
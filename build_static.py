@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Pipeline dos arquivos estáticos
+
+1. --baixar: copia para static/vendor/ as bibliotecas listadas em static/vendor.json
+   (Bootstrap, Font Awesome, Chart.js, plugin de zoom), para que as páginas funcionem
+   sem acesso às CDNs. Cada arquivo é conferido com o sha256 fixado no vendor.json:
+   conteúdo diferente interrompe o build. Arquivo ainda sem sha256 só gera um aviso
+   (--exigir-sha256 o transforma em erro). --fixar grava os sha256 do que foi baixado
+   (ao adicionar ou atualizar uma biblioteca; revise o diff).
+2. Build (padrão): gera static/dist/ com
+   - nomes com hash do conteúdo (base.3f9a1c2b7e.css), servidos com cache "immutable";
+   - url(...) dos CSS reescritas para os nomes com hash (fontes do Font Awesome, imagens);
+   - variantes pré-comprimidas .gz e .br (brotli, se o pacote estiver instalado);
+   - static/dist/manifest.json, usado pelo helper asset() dos templates.
+
+Uso:
+  python build_static.py --baixar     # baixa o que faltar, confere os sha256 e gera o dist
+  python build_static.py --baixar --forcar --fixar   # baixa tudo de novo e grava os sha256
+  python build_static.py              # só gera o dist
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import posixpath
+import re
+import shutil
+import sys
+import urllib.request
+
+try:
+    import brotli
+except ImportError:  # opcional: sem o pacote, gera só .gz
+    brotli = None
+
+RAIZ = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(RAIZ, "static")
+DIST_DIR = os.path.join(STATIC_DIR, "dist")
+VENDOR_FILE = os.path.join(STATIC_DIR, "vendor.json")
+
+# Arquivos que não entram no dist
+IGNORAR = {".gitkeep", "vendor.json"}
+# Tipos que valem a pena comprimir (woff2/png já são comprimidos)
+COMPRIMIR = {".css", ".js", ".svg", ".json", ".ttf", ".txt", ".map"}
+URL_CSS = re.compile(r"url\(\s*(['\"]?)([^'\")]+)\1\s*\)")
+
+
+class VendorInvalido(Exception):
+    """Biblioteca de terceiros com conteúdo diferente do sha256 fixado (ou sem sha256)"""
+
+
+def baixar(forcar: bool = False, fixar: bool = False, exigir_sha256: bool = False):
+    """Baixa para static/ as bibliotecas de static/vendor.json que ainda não existem e confere
+    o sha256 de todas; com `fixar`, grava no vendor.json os sha256 em vez de conferir"""
+    with open(VENDOR_FILE, encoding="utf-8") as f:
+        vendor = json.load(f)
+    erros = []
+    for destino, item in vendor.items():
+        caminho = os.path.join(STATIC_DIR, destino)
+        if os.path.exists(caminho) and not forcar:
+            with open(caminho, "rb") as f:
+                conteudo = f.read()
+        else:
+            print(f"⬇️  {item['url']}")
+            with urllib.request.urlopen(item["url"], timeout=60) as resp:
+                conteudo = resp.read()
+        sha256 = hashlib.sha256(conteudo).hexdigest()
+        if fixar:
+            item["sha256"] = sha256
+        elif not item.get("sha256"):
+            if exigir_sha256:
+                erros.append(f"{destino}: sem sha256 em vendor.json (rode com --fixar e revise)")
+                continue
+            print(f"⚠️  {destino}: sem sha256 em vendor.json, conteúdo não conferido (sha256 {sha256})")
+        elif sha256 != item["sha256"]:
+            erros.append(f"{destino}: sha256 {sha256} difere do fixado {item['sha256']}")
+            continue
+        # Só grava depois de conferido: um download adulterado não fica em static/vendor
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        with open(caminho, "wb") as f:
+            f.write(conteudo)
+    if fixar:
+        with open(VENDOR_FILE, "w", encoding="utf-8") as f:
+            json.dump(vendor, f, indent=2)
+            f.write("\n")
+    if erros:
+        raise VendorInvalido("\n".join(erros))
+
+
+def _hash(conteudo: bytes) -> str:
+    return hashlib.sha256(conteudo).hexdigest()[:10]
+
+
+def _nome_com_hash(rel: str, conteudo: bytes) -> str:
+    base, ext = posixpath.splitext(rel)
+    return f"{base}.{_hash(conteudo)}{ext}"
+
+
+def _reescrever_css(rel: str, conteudo: bytes, manifest: dict) -> bytes:
+    """Troca url(...) relativas pelos caminhos com hash, relativos ao próprio CSS no dist"""
+    # O dist preserva a estrutura de pastas: o CSS com hash fica na mesma pasta relativa
+    pasta = posixpath.dirname(rel)
+
+    def trocar(m):
+        url = m.group(2)
+        if url.startswith(("data:", "http:", "https:", "//", "/", "#")):
+            return m.group(0)
+        caminho, sufixo = re.match(r"([^?#]*)(.*)", url).groups()
+        alvo = posixpath.normpath(posixpath.join(pasta, caminho))
+        if alvo not in manifest:
+            return m.group(0)
+        novo = posixpath.relpath(manifest[alvo], pasta or ".")
+        return f"url({novo}{sufixo})"
+
+    return URL_CSS.sub(trocar, conteudo.decode("utf-8")).encode("utf-8")
+
+
+def _gravar(caminho: str, conteudo: bytes):
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    with open(caminho, "wb") as f:
+        f.write(conteudo)
+    if os.path.splitext(caminho)[1] not in COMPRIMIR:
+        return
+    gz = gzip.compress(conteudo, compresslevel=9, mtime=0)
+    if len(gz) < len(conteudo):
+        with open(caminho + ".gz", "wb") as f:
+            f.write(gz)
+    if brotli is not None:
+        br = brotli.compress(conteudo, quality=11)
+        if len(br) < len(conteudo):
+            with open(caminho + ".br", "wb") as f:
+                f.write(br)
+
+
+def build():
+    """Gera static/dist/ e o manifest.json a partir do conteúdo de static/"""
+    arquivos = []
+    for pasta, subpastas, nomes in os.walk(STATIC_DIR):
+        if os.path.abspath(pasta) == DIST_DIR:
+            subpastas[:] = []
+            continue
+        subpastas[:] = [s for s in subpastas if os.path.join(pasta, s) != DIST_DIR]
+        for nome in nomes:
+            if nome in IGNORAR:
+                continue
+            rel = os.path.relpath(os.path.join(pasta, nome), STATIC_DIR).replace(os.sep, "/")
+            arquivos.append(rel)
+
+    if os.path.isdir(DIST_DIR):
+        shutil.rmtree(DIST_DIR)
+
+    # CSS por último: as url(...) precisam dos nomes com hash das fontes e imagens
+    arquivos.sort(key=lambda rel: (rel.endswith(".css"), rel))
+    manifest = {}
+    total = comprimidos = 0
+    for rel in arquivos:
+        with open(os.path.join(STATIC_DIR, rel), "rb") as f:
+            conteudo = f.read()
+        if rel.endswith(".css"):
+            conteudo = _reescrever_css(rel, conteudo, manifest)
+        destino = _nome_com_hash(rel, conteudo)
+        manifest[rel] = destino
+        _gravar(os.path.join(DIST_DIR, destino), conteudo)
+        total += 1
+        comprimidos += os.path.splitext(rel)[1] in COMPRIMIR
+
+    with open(os.path.join(DIST_DIR, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    print(f"✅ {total} arquivos em static/dist ({comprimidos} pré-comprimidos"
+          f"{'' if brotli else ', sem brotli: instale o pacote Brotli'})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera os arquivos estáticos com hash e pré-comprimidos")
+    parser.add_argument("--baixar", action="store_true", help="baixa as bibliotecas de static/vendor.json que faltarem")
+    parser.add_argument("--forcar", action="store_true", help="com --baixar, baixa de novo mesmo se já existirem")
+    parser.add_argument("--fixar", action="store_true", help="com --baixar, grava em vendor.json os sha256 baixados")
+    parser.add_argument("--exigir-sha256", action="store_true",
+                        help="com --baixar, falha se alguma biblioteca ainda não tiver sha256 fixado")
+    args = parser.parse_args()
+    if args.baixar:
+        try:
+            baixar(args.forcar, args.fixar, args.exigir_sha256)
+        except OSError as e:
+            print(f"❌ Falha ao baixar bibliotecas: {e}")
+            sys.exit(1)
+        except VendorInvalido as e:
+            print(f"❌ Bibliotecas com conteúdo não conferido:\n{e}")
+            sys.exit(1)
+    build()
+
+
+if __name__ == "__main__":
+    main()
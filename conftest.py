@@ -0,0 +1,57 @@
+"""
+Configuração compartilhada dos testes
+
+Aponta o app para um banco SQLite temporário ANTES de importar app.py
+(o engine é criado na importação), para que os testes não usem o data.db local.
+"""
+import os
+import tempfile
+
+_TMP_DIR = tempfile.mkdtemp(prefix="ligacoes-testes-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_TMP_DIR, 'testes.db')}"
+os.environ["PRERENDER_DIR"] = os.path.join(_TMP_DIR, "prerender")
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app as app_module
+
+ADMIN_USERNAME = "igorsansone"
+ATENDENTE_USERNAME = "andreflores"
+
+
+def _login(username: str) -> TestClient:
+    client = TestClient(app_module.app)
+    r = client.post("/login", data={"username": username, "password": app_module.VALID_USERS[username]},
+                    follow_redirects=False)
+    assert r.status_code == 302
+    return client
+
+
+@pytest.fixture
+def admin_client():
+    """Cliente autenticado como usuário com acesso aos relatórios"""
+    return _login(ADMIN_USERNAME)
+
+
+@pytest.fixture
+def atendente_client():
+    """Cliente autenticado como atendente comum (sem acesso aos relatórios)"""
+    return _login(ATENDENTE_USERNAME)
+
+
+@pytest.fixture
+def anon_client():
+    return TestClient(app_module.app)
+
+
+def cadastrar(client: TestClient, duvida: str = None, observacao: str = "", cro: str = "CRO/RS 1"):
+    """Cadastra uma ligação pelo formulário, como o atendente faria"""
+    r = client.post("/cadastrar", data={
+        "cro": cro,
+        "nome_inscrito": "Inscrito de Teste",
+        "duvida": duvida or app_module.DUVIDA_OPCOES[0],
+        "observacao": observacao,
+    }, follow_redirects=False)
+    assert r.status_code == 303
+    return r
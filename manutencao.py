@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+"""
+Manutenção do banco de ligações
+
+Comandos:
+  particionar       (PostgreSQL) converte `ligacoes` e `ligacoes_arquivo` em tabelas
+                    particionadas por mês de created_at (partições no mês de SP)
+  criar-particoes   (PostgreSQL) cria as partições dos próximos meses; rode mensalmente
+  arquivar          move as ligações até uma data (eleições encerradas) para `ligacoes_arquivo`.
+                    No PostgreSQL particionado, meses inteiros são movidos desanexando a
+                    partição (sem copiar linhas); o restante é movido em lotes.
+  purgar            apaga de vez as ligações excluídas há mais de N dias (PURGE_RETENTION_DAYS),
+                    em lotes, e recupera o espaço (incremental_vacuum / VACUUM ANALYZE)
+  importar          insere ligações de um arquivo NDJSON (formato de /api/data/ligacoes.ndjson);
+                    no PostgreSQL usa COPY FROM STDIN
+  reindexar-termos  recria o índice de termos das observações (ligacoes_termos)
+  pre-gerar         gera em PRERENDER_DIR os relatórios de ontem, da semana e da eleição
+                    (CSV e PDF) que mudaram desde a última geração
+
+As consultas padrão do app leem só `ligacoes`; os relatórios incluem o arquivo com ?historico=1.
+
+Uso:
+  python manutencao.py particionar --meses-a-frente 3
+  python manutencao.py criar-particoes --meses-a-frente 3
+  python manutencao.py arquivar --ate 2025-12-31
+  python manutencao.py purgar --dias 90
+  python manutencao.py importar ligacoes.ndjson --lote 5000
+  python manutencao.py reindexar-termos
+  python manutencao.py pre-gerar
+"""
+import argparse
+import json
+import re
+import sys
+from datetime import date, datetime
+
+from sqlalchemy import delete, insert, select, text
+
+from app import (DUVIDA_OPCOES, IS_SQLITE, TZ, UTC, Ligacao, LigacaoArquivo, PURGE_BATCH_SIZE, PURGE_RETENTION_DAYS,
+                 _sp_bounds_utc, engine, importar_ligacoes, pre_gerar_relatorios, purgar_excluidas, reindexar_termos, to_sp)
+
+TABELAS = {"ligacoes": Ligacao.__table__, "ligacoes_arquivo": LigacaoArquivo.__table__}
+PARTICAO_RE = re.compile(r"^(?P<tabela>ligacoes(?:_arquivo)?)_p(?P<ano>\d{4})_(?P<mes>\d{2})$")
+LOTE_PADRAO = 5000
+
+
+def _proximo_mes(ano: int, mes: int):
+    return (ano + 1, 1) if mes == 12 else (ano, mes + 1)
+
+
+def _inicio_mes_utc(ano: int, mes: int) -> datetime:
+    """Meia-noite do dia 1º em SP, como UTC sem tzinfo (formato gravado em created_at)"""
+    return datetime(ano, mes, 1, tzinfo=TZ).astimezone(UTC).replace(tzinfo=None)
+
+
+def _nome_particao(tabela: str, ano: int, mes: int) -> str:
+    return f"{tabela}_p{ano}_{mes:02d}"
+
+
+def _limites_particao(nome: str):
+    m = PARTICAO_RE.match(nome)
+    if not m:
+        return None
+    ano, mes = int(m["ano"]), int(m["mes"])
+    return _inicio_mes_utc(ano, mes), _inicio_mes_utc(*_proximo_mes(ano, mes))
+
+
+def _particionada(conn, tabela: str) -> bool:
+    return conn.execute(
+        text("SELECT relkind FROM pg_class WHERE relname = :t AND relnamespace = 'public'::regnamespace"),
+        {"t": tabela},
+    ).scalar() == "p"
+
+
+def _particoes(conn, tabela: str):
+    return [r[0] for r in conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = :t ORDER BY c.relname"
+    ), {"t": tabela})]
+
+
+def _criar_particao(conn, tabela: str, ano: int, mes: int) -> bool:
+    nome = _nome_particao(tabela, ano, mes)
+    if conn.execute(text("SELECT to_regclass(:n)"), {"n": nome}).scalar():
+        return False
+    inicio, fim = _inicio_mes_utc(ano, mes), _inicio_mes_utc(*_proximo_mes(ano, mes))
+    conn.execute(text(
+        f"CREATE TABLE {nome} PARTITION OF {tabela} FOR VALUES FROM ('{inicio.isoformat(' ')}') TO ('{fim.isoformat(' ')}')"
+    ))
+    return True
+
+
+def _criar_particoes_intervalo(conn, tabela: str, de, ate) -> int:
+    """Cria as partições mensais de `de` até `ate` (tuplas (ano, mes), inclusive)"""
+    criadas = 0
+    atual = de
+    while atual <= ate:
+        criadas += _criar_particao(conn, tabela, *atual)
+        atual = _proximo_mes(*atual)
+    return criadas
+
+
+def _mes_sp(dt):
+    local = to_sp(dt)
+    return local.year, local.month
+
+
+def _somar_meses(ano_mes, n: int):
+    for _ in range(n):
+        ano_mes = _proximo_mes(*ano_mes)
+    return ano_mes
+
+
+def _exigir_postgres(comando: str):
+    if IS_SQLITE:
+        print(f"❌ '{comando}' só se aplica ao PostgreSQL. No SQLite use 'arquivar' para separar o histórico.")
+        sys.exit(1)
+
+
+def _converter_para_particionada(conn, tabela: str, meses_a_frente: int):
+    """Recria a tabela como particionada por RANGE(created_at) e copia os dados.
+    Roda em uma única transação: em caso de erro nada muda."""
+    modelo = TABELAS[tabela]
+    legado = f"{tabela}_legado"
+    conn.execute(text(f"ALTER TABLE {tabela} RENAME TO {legado}"))
+    # Libera os nomes da PK e dos índices para a tabela nova
+    for (indice,) in conn.execute(text("SELECT indexname FROM pg_indexes WHERE tablename = :t"), {"t": legado}).all():
+        conn.execute(text(f'ALTER INDEX "{indice}" RENAME TO "{indice}_legado"'))
+    sequencia = conn.execute(text("SELECT pg_get_serial_sequence(:t, 'id')"), {"t": legado}).scalar()
+
+    colunas = []
+    for col in modelo.c:
+        definicao = f"{col.name} {col.type.compile(dialect=engine.dialect)}"
+        if col.name == "id" and sequencia:
+            definicao += f" DEFAULT nextval('{sequencia}')"
+        elif col.server_default is not None:
+            definicao += " DEFAULT now()"
+        if not col.nullable:
+            definicao += " NOT NULL"
+        colunas.append(definicao)
+    # A chave de partição precisa fazer parte da chave primária
+    conn.execute(text(
+        f"CREATE TABLE {tabela} ({', '.join(colunas)}, PRIMARY KEY (id, created_at)) PARTITION BY RANGE (created_at)"
+    ))
+    if sequencia:
+        conn.execute(text(f"ALTER SEQUENCE {sequencia} OWNED BY {tabela}.id"))
+
+    menor, maior = conn.execute(text(f"SELECT min(created_at), max(created_at) FROM {legado}")).one()
+    hoje = _mes_sp(datetime.now(UTC))
+    de = _mes_sp(menor) if menor else hoje
+    ate = max(_mes_sp(maior) if maior else hoje, hoje)
+    criadas = _criar_particoes_intervalo(conn, tabela, de, _somar_meses(ate, meses_a_frente))
+    # Partição padrão: recebe o que cair fora dos meses criados (nada se perde)
+    conn.execute(text(f"CREATE TABLE {tabela}_padrao PARTITION OF {tabela} DEFAULT"))
+
+    nomes = ", ".join(c.name for c in modelo.c)
+    copiadas = conn.execute(text(f"INSERT INTO {tabela} ({nomes}) SELECT {nomes} FROM {legado}")).rowcount
+    conn.execute(text(f"DROP TABLE {legado}"))
+    for indice in modelo.indexes:
+        indice.create(bind=conn)
+    print(f"✅ {tabela}: {copiadas} linhas em {criadas} partições mensais (+ padrão)")
+
+
+def particionar(meses_a_frente: int = 3):
+    _exigir_postgres("particionar")
+    with engine.begin() as conn:
+        for tabela in TABELAS:
+            if _particionada(conn, tabela):
+                print(f"ℹ️  {tabela} já é particionada")
+                continue
+            _converter_para_particionada(conn, tabela, meses_a_frente if tabela == "ligacoes" else 0)
+    criar_particoes(meses_a_frente)
+
+
+def criar_particoes(meses_a_frente: int = 3):
+    _exigir_postgres("criar-particoes")
+    with engine.begin() as conn:
+        if not _particionada(conn, "ligacoes"):
+            print("❌ A tabela ligacoes não é particionada. Rode 'particionar' antes.")
+            sys.exit(1)
+        hoje = _mes_sp(datetime.now(UTC))
+        criadas = _criar_particoes_intervalo(conn, "ligacoes", hoje, _somar_meses(hoje, meses_a_frente))
+    print(f"✅ {criadas} partições novas em ligacoes")
+
+
+def _desanexar_particoes(corte: datetime) -> int:
+    """PostgreSQL particionado: move meses inteiros anteriores ao corte trocando a partição de tabela"""
+    movidas = 0
+    with engine.begin() as conn:
+        if not (_particionada(conn, "ligacoes") and _particionada(conn, "ligacoes_arquivo")):
+            return 0
+        for nome in _particoes(conn, "ligacoes"):
+            limites = _limites_particao(nome)
+            if not limites or limites[1] > corte:
+                continue
+            m = PARTICAO_RE.match(nome)
+            destino = _nome_particao("ligacoes_arquivo", int(m["ano"]), int(m["mes"]))
+            conn.execute(text(f"ALTER TABLE ligacoes DETACH PARTITION {nome}"))
+            if conn.execute(text("SELECT to_regclass(:n)"), {"n": destino}).scalar():
+                # O arquivo já tem esse mês (arquivamento parcial anterior): copia e descarta
+                nomes = ", ".join(c.name for c in Ligacao.__table__.c)
+                conn.execute(text(f"INSERT INTO ligacoes_arquivo ({nomes}) SELECT {nomes} FROM {nome}"))
+                conn.execute(text(f"DROP TABLE {nome}"))
+            else:
+                conn.execute(text(f"ALTER TABLE {nome} RENAME TO {destino}"))
+                inicio, fim = limites
+                if conn.execute(text("SELECT to_regclass('ligacoes_arquivo_padrao')")).scalar():
+                    # Linhas do mês já arquivadas em lotes (corte no meio do mês) estão na partição
+                    # padrão, e o ATTACH falharia: vão para a partição do mês antes de anexá-la
+                    nomes = ", ".join(c.name for c in Ligacao.__table__.c)
+                    conn.execute(text(
+                        f"WITH movidas AS (DELETE FROM ligacoes_arquivo_padrao "
+                        f"WHERE created_at >= :inicio AND created_at < :fim RETURNING {nomes}) "
+                        f"INSERT INTO {destino} ({nomes}) SELECT {nomes} FROM movidas"
+                    ), {"inicio": inicio, "fim": fim})
+                conn.execute(text(
+                    f"ALTER TABLE ligacoes_arquivo ATTACH PARTITION {destino} "
+                    f"FOR VALUES FROM ('{inicio.isoformat(' ')}') TO ('{fim.isoformat(' ')}')"
+                ))
+            movidas += 1
+    return movidas
+
+
+def _garantir_autoincrement_sqlite(conn):
+    """SQLite: ids de ligacoes nunca reaproveitados. Bancos criados antes do AUTOINCREMENT têm a
+    tabela recriada (uma vez); a sequência parte do maior id já visto na ativa ou no arquivo."""
+    ddl = conn.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'ligacoes'")).scalar()
+    if "AUTOINCREMENT" not in ddl.upper():
+        conn.execute(text("ALTER TABLE ligacoes RENAME TO ligacoes_legado"))
+        # Os índices acompanham a tabela renomeada: libera os nomes para a tabela nova
+        for (indice,) in conn.execute(text(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'ligacoes_legado' AND sql IS NOT NULL"
+        )).all():
+            conn.execute(text(f'DROP INDEX "{indice}"'))
+        Ligacao.__table__.create(bind=conn)
+        nomes = ", ".join(c.name for c in Ligacao.__table__.c)
+        conn.execute(text(f"INSERT INTO ligacoes ({nomes}) SELECT {nomes} FROM ligacoes_legado"))
+        conn.execute(text("DROP TABLE ligacoes_legado"))
+        print("ℹ️  ligacoes recriada com AUTOINCREMENT (ids não são mais reaproveitados)")
+    maior = conn.execute(text(
+        "SELECT max(m) FROM (SELECT max(id) AS m FROM ligacoes UNION ALL SELECT max(id) FROM ligacoes_arquivo)"
+    )).scalar() or 0
+    atual = conn.execute(text("SELECT seq FROM sqlite_sequence WHERE name = 'ligacoes'")).scalar()
+    if atual is None:
+        conn.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES ('ligacoes', :m)"), {"m": maior})
+    elif atual < maior:
+        conn.execute(text("UPDATE sqlite_sequence SET seq = :m WHERE name = 'ligacoes'"), {"m": maior})
+
+
+def arquivar(ate: date, lote: int = LOTE_PADRAO) -> int:
+    """Move para ligacoes_arquivo as ligações criadas até `ate` (dia em SP, inclusive)"""
+    _, corte = _sp_bounds_utc(None, ate)
+    if IS_SQLITE:
+        with engine.begin() as conn:
+            _garantir_autoincrement_sqlite(conn)
+    particoes = 0 if IS_SQLITE else _desanexar_particoes(corte)
+
+    ativa, arquivo = TABELAS["ligacoes"], TABELAS["ligacoes_arquivo"]
+    colunas = list(ativa.c)
+    movidas = 0
+    while True:
+        # Lotes curtos em transações separadas: não segura lock por muito tempo
+        with engine.begin() as conn:
+            ids = conn.execute(
+                select(ativa.c.id).where(ativa.c.created_at < corte).order_by(ativa.c.id).limit(lote)
+            ).scalars().all()
+            if not ids:
+                break
+            conn.execute(insert(arquivo).from_select(
+                [c.name for c in colunas], select(*colunas).where(ativa.c.id.in_(ids))
+            ))
+            conn.execute(delete(ativa).where(ativa.c.id.in_(ids)))
+            movidas += len(ids)
+
+    print(f"✅ Arquivamento até {ate.strftime('%d/%m/%Y')}: {particoes} partições desanexadas, {movidas} linhas movidas em lotes")
+    return movidas
+
+
+def purgar(dias: int, lote: int, vacuum: bool, vacuum_completo: bool):
+    r = purgar_excluidas(dias, lote, vacuum=vacuum, vacuum_completo=vacuum_completo)
+    print(f"✅ {r['apagadas']} ligações excluídas há mais de {r['retencao_dias']} dias apagadas em {r['duracao_s']} s")
+    print(f"   Espaço liberado: {r['bytes_liberados'] / 1024 / 1024:.2f} MB "
+          f"(dados: {r['bytes_dados_antes'] / 1024 / 1024:.2f} MB -> {r['bytes_dados_depois'] / 1024 / 1024:.2f} MB)")
+
+
+def _ler_ndjson(caminho: str):
+    """Linhas de um NDJSON exportado por /api/data/ligacoes.ndjson (o id de origem é ignorado)"""
+    with (sys.stdin if caminho == "-" else open(caminho, encoding="utf-8")) as arquivo:
+        for numero, texto in enumerate(arquivo, 1):
+            if not texto.strip():
+                continue
+            try:
+                linha = json.loads(texto)
+                if linha["duvida"] not in DUVIDA_OPCOES:
+                    raise ValueError(f"dúvida desconhecida: {linha['duvida']!r}")
+                for campo in ("created_at", "updated_at", "deleted_at"):
+                    if linha.get(campo):
+                        linha[campo] = datetime.fromisoformat(linha[campo])
+                if not (linha.get("cro") and linha.get("nome_inscrito") and linha.get("created_at")):
+                    raise ValueError("cro, nome_inscrito e created_at são obrigatórios")
+            except (ValueError, KeyError) as e:
+                raise SystemExit(f"❌ Linha {numero}: {e}")
+            yield linha
+
+
+def importar(caminho: str, lote: int):
+    inseridas = importar_ligacoes(_ler_ndjson(caminho), lote)
+    print(f"✅ {inseridas} ligações importadas ({'executemany' if IS_SQLITE else 'COPY FROM STDIN'})")
+
+
+def reindexar():
+    lidas = reindexar_termos()
+    print(f"✅ Índice de termos recriado a partir de {lidas} observações")
+
+
+def pre_gerar():
+    r = pre_gerar_relatorios(forcar=True)
+    print(f"✅ {len(r['gerados'])} relatórios gerados, {len(r['removidos'])} arquivos antigos removidos")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manutenção do banco de ligações")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p = sub.add_parser("particionar", help="converte as tabelas em particionadas por mês (PostgreSQL)")
+    p.add_argument("--meses-a-frente", type=int, default=3)
+
+    p = sub.add_parser("criar-particoes", help="cria partições dos próximos meses (PostgreSQL)")
+    p.add_argument("--meses-a-frente", type=int, default=3)
+
+    p = sub.add_parser("arquivar", help="move ligações antigas para o arquivo histórico")
+    p.add_argument("--ate", type=date.fromisoformat, required=True, help="último dia (YYYY-MM-DD, horário de SP) a arquivar")
+    p.add_argument("--lote", type=int, default=LOTE_PADRAO)
+
+    p = sub.add_parser("purgar", help="apaga de vez as ligações excluídas há mais de N dias")
+    p.add_argument("--dias", type=int, default=PURGE_RETENTION_DAYS, help=f"retenção após a exclusão (padrão {PURGE_RETENTION_DAYS})")
+    p.add_argument("--lote", type=int, default=PURGE_BATCH_SIZE)
+    p.add_argument("--sem-vacuum", action="store_true", help="não recupera o espaço depois de apagar")
+    p.add_argument("--vacuum-completo", action="store_true",
+                   help="SQLite: VACUUM completo (ativa o modo incremental em bancos antigos); PostgreSQL: VACUUM FULL")
+
+    p = sub.add_parser("importar", help="insere ligações de um arquivo NDJSON (COPY no PostgreSQL)")
+    p.add_argument("arquivo", help="NDJSON no formato de /api/data/ligacoes.ndjson ('-' = entrada padrão)")
+    p.add_argument("--lote", type=int, default=LOTE_PADRAO)
+
+    sub.add_parser("reindexar-termos", help="recria o índice de termos das observações")
+    sub.add_parser("pre-gerar", help="gera os relatórios de ontem, da semana e da eleição que mudaram")
+
+    args = parser.parse_args()
+    if args.comando == "particionar":
+        particionar(args.meses_a_frente)
+    elif args.comando == "criar-particoes":
+        criar_particoes(args.meses_a_frente)
+    elif args.comando == "arquivar":
+        arquivar(args.ate, args.lote)
+    elif args.comando == "purgar":
+        purgar(args.dias, args.lote, not args.sem_vacuum, args.vacuum_completo)
+    elif args.comando == "importar":
+        importar(args.arquivo, args.lote)
+    elif args.comando == "reindexar-termos":
+        reindexar()
+    elif args.comando == "pre-gerar":
+        pre_gerar()
+
+
+if __name__ == "__main__":
+    main()
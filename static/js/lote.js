@@ -0,0 +1,51 @@
+// Operações em lote na listagem da tela inicial (só para quem pode editar/excluir):
+// as ligações marcadas são excluídas ou reclassificadas em uma única requisição.
+const loteTodas = document.getElementById('loteTodas');
+const loteDuvida = document.getElementById('loteDuvida');
+const loteReclassificar = document.getElementById('loteReclassificar');
+const loteExcluir = document.getElementById('loteExcluir');
+
+function idsSelecionados() {
+  return Array.from(document.querySelectorAll('.lote-item:checked')).map(c => c.value);
+}
+
+function atualizarBarraLote() {
+  const n = idsSelecionados().length;
+  document.getElementById('loteContagem').innerText = `${n} selecionada(s)`;
+  loteExcluir.disabled = n === 0;
+  loteReclassificar.disabled = n === 0 || !loteDuvida.value;
+}
+
+async function enviarLote(url, campos) {
+  const form = new FormData();
+  idsSelecionados().forEach(id => form.append('ids', id));
+  Object.entries(campos).forEach(([k, v]) => form.append(k, v));
+  const res = await fetch(url, { method: 'POST', body: form });
+  const data = await res.json().catch(() => ({}));
+  if (!res.ok) {
+    alert(`Erro: ${data.detail || res.status}`);
+    return;
+  }
+  alert(`${data.afetadas} ligação(ões) atualizada(s).`);
+  window.location.reload();
+}
+
+loteTodas.addEventListener('change', () => {
+  document.querySelectorAll('.lote-item').forEach(c => { c.checked = loteTodas.checked; });
+  atualizarBarraLote();
+});
+document.querySelectorAll('.lote-item').forEach(c => c.addEventListener('change', atualizarBarraLote));
+loteDuvida.addEventListener('change', atualizarBarraLote);
+
+loteExcluir.addEventListener('click', () => {
+  const n = idsSelecionados().length;
+  if (confirm(`Excluir ${n} ligação(ões) selecionada(s)?`)) {
+    enviarLote('/api/ligacoes/lote/excluir', {});
+  }
+});
+loteReclassificar.addEventListener('click', () => {
+  const n = idsSelecionados().length;
+  if (confirm(`Reclassificar ${n} ligação(ões) como "${loteDuvida.value}"?`)) {
+    enviarLote('/api/ligacoes/lote/reclassificar', { duvida: loteDuvida.value });
+  }
+});
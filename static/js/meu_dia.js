@@ -0,0 +1,37 @@
+// Widget "Meu dia" da tela inicial: ligações de hoje do atendente logado, por tipo de dúvida.
+// Atualiza ao abrir a página, a cada minuto e ao voltar para a aba.
+const MEU_DIA_INTERVALO_MS = 60000;
+
+async function carregarMeuDia() {
+  try {
+    const res = await fetch('/api/meu_dia');
+    if (!res.ok) return;
+    const data = await res.json();
+
+    document.getElementById('meuDiaTotal').innerText =
+      `${data.total.toLocaleString('pt-BR')} ${data.total === 1 ? 'ligação' : 'ligações'} hoje`;
+
+    const lista = document.getElementById('meuDiaTipos');
+    lista.replaceChildren(...data.por_duvida.map(item => {
+      const li = document.createElement('li');
+      li.className = 'd-flex justify-content-between gap-3';
+      const tipo = document.createElement('span');
+      tipo.innerText = item.duvida;
+      const qtd = document.createElement('span');
+      qtd.className = 'fw-semibold';
+      qtd.innerText = item.count.toLocaleString('pt-BR');
+      li.append(tipo, qtd);
+      return li;
+    }));
+  } catch (error) {
+    console.error('Erro ao carregar o "Meu dia":', error);
+  }
+}
+
+carregarMeuDia();
+setInterval(() => {
+  if (document.visibilityState === 'visible') carregarMeuDia();
+}, MEU_DIA_INTERVALO_MS);
+document.addEventListener('visibilitychange', () => {
+  if (document.visibilityState === 'visible') carregarMeuDia();
+});
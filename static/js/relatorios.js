@@ -0,0 +1,1073 @@
+// Modern color palette for charts
+const chartColors = {
+  primary: ['#667eea', '#764ba2', '#4facfe', '#00f2fe'],
+  gradient: {
+    purple: ['#667eea', '#764ba2'],
+    blue: ['#4facfe', '#00f2fe'],
+    green: ['#11998e', '#38ef7d'],
+    pink: ['#f093fb', '#f5576c'],
+    orange: ['#ffecd2', '#fcb69f']
+  },
+  rainbow: [
+    '#667eea', '#764ba2', '#4facfe', '#00f2fe',
+    '#11998e', '#38ef7d', '#f093fb', '#f5576c',
+    '#ffecd2', '#fcb69f', '#a8edea', '#fed6e3'
+  ]
+};
+
+// Function to create gradient background
+function createGradient(ctx, colors, direction = 'vertical') {
+  // Handle canvas context or chart context
+  const canvas = ctx.canvas || ctx;
+  const context = ctx.getContext ? ctx.getContext('2d') : ctx;
+  
+  const gradient = direction === 'vertical' 
+    ? context.createLinearGradient(0, 0, 0, canvas.height || 400)
+    : context.createLinearGradient(0, 0, canvas.width || 400, 0);
+  
+  gradient.addColorStop(0, colors[0]);
+  gradient.addColorStop(1, colors[1]);
+  return gradient;
+}
+
+// Enhanced Chart.js default configuration
+Chart.defaults.font.family = "'Inter', system-ui, -apple-system, sans-serif";
+Chart.defaults.font.size = 13;
+Chart.defaults.color = '#374151';
+Chart.defaults.plugins.legend.labels.usePointStyle = true;
+Chart.defaults.plugins.legend.labels.boxWidth = 8;
+Chart.defaults.plugins.tooltip.backgroundColor = 'rgba(255, 255, 255, 0.95)';
+Chart.defaults.plugins.tooltip.titleColor = '#1f2937';
+Chart.defaults.plugins.tooltip.bodyColor = '#4b5563';
+Chart.defaults.plugins.tooltip.borderColor = '#e5e7eb';
+Chart.defaults.plugins.tooltip.borderWidth = 1;
+Chart.defaults.plugins.tooltip.cornerRadius = 10;
+Chart.defaults.plugins.tooltip.displayColors = true;
+Chart.defaults.plugins.tooltip.padding = 12;
+
+// Animation configuration
+const chartAnimation = {
+  duration: 1200,
+  easing: 'easeOutQuart',
+  delay: (context) => context.dataIndex * 100
+};
+
+// Global KPI data store to persist values across function calls
+// IMPORTANTE: 'totalAbsoluto' é o total de ligações cadastradas no sistema (nunca muda com filtros)
+// Os demais KPIs refletem os dados filtrados pelas opções selecionadas
+window.kpiData = {
+  totalAbsoluto: '0',  // Total absoluto de ligações (sem filtros)
+  mediaDiaria: '0',
+  picoHorario: '--:--',
+  atendentesAtivos: '0'
+};
+
+// Function to update KPI cards
+// NOTA: Esta função NÃO atualiza o totalAbsoluto, pois ele é carregado separadamente
+function updateKPICards(data) {
+  // Update global KPI data with provided values only
+  // totalAbsoluto não é atualizado aqui - ele é fixo e vem do endpoint /api/stats/total
+  if (data.mediaDiaria !== undefined) window.kpiData.mediaDiaria = data.mediaDiaria;
+  if (data.picoHorario !== undefined) window.kpiData.picoHorario = data.picoHorario;
+  if (data.atendentesAtivos !== undefined) window.kpiData.atendentesAtivos = data.atendentesAtivos;
+
+  // Get elements and update with current values
+  const kpiElements = {
+    total: document.getElementById('kpiTotalLigacoes'),
+    media: document.getElementById('kpiMediaDiaria'),
+    pico: document.getElementById('kpiPicoHorario'),
+    atendentes: document.getElementById('kpiAtendentesAtivos')
+  };
+
+  // Update display with current data
+  // Total sempre mostra o valor absoluto (totalAbsoluto), não o valor filtrado
+  if (kpiElements.total) kpiElements.total.textContent = window.kpiData.totalAbsoluto;
+  if (kpiElements.media) kpiElements.media.textContent = window.kpiData.mediaDiaria;
+  if (kpiElements.pico) kpiElements.pico.textContent = window.kpiData.picoHorario;
+  if (kpiElements.atendentes) kpiElements.atendentes.textContent = window.kpiData.atendentesAtivos;
+}
+
+// Função para carregar o total absoluto de ligações (sem filtros)
+// Este valor é carregado uma única vez ao iniciar a página e nunca muda
+async function loadAbsoluteTotal() {
+  try {
+    console.log('Loading absolute total from /api/stats/total...');
+    const res = await fetch('/api/stats/total');
+    
+    if (!res.ok) {
+      console.error('Error loading absolute total:', res.status, res.statusText);
+      return;
+    }
+    
+    const data = await res.json();
+    console.log('Absolute total received:', data);
+    
+    if (data?.total !== undefined) {
+      // Armazena o total absoluto e atualiza o display
+      window.kpiData.totalAbsoluto = data.total.toLocaleString('pt-BR');
+      const totalElement = document.getElementById('kpiTotalLigacoes');
+      if (totalElement) {
+        totalElement.textContent = window.kpiData.totalAbsoluto;
+      }
+      console.log('Absolute total set to:', window.kpiData.totalAbsoluto);
+    }
+  } catch (error) {
+    console.error('Exception loading absolute total:', error);
+  }
+}
+
+const elStart = document.getElementById('fStart');
+const elEnd = document.getElementById('fEnd');
+const elTipos = document.getElementById('fTipos');
+
+function getTiposSelecionados() {
+  return Array.from(elTipos.selectedOptions).map(o => o.value);
+}
+
+function buildQuery() {
+  const params = new URLSearchParams();
+  if (elStart.value) params.set('start', elStart.value);
+  if (elEnd.value) params.set('end', elEnd.value);
+  const tipos = getTiposSelecionados();
+  if (tipos.length) params.set('tipos', tipos.join(','));
+  return params.toString();
+}
+
+function pct(value, total) {
+  if (!total) return '0%';
+  return ((value / total) * 100).toFixed(1) + '%';
+}
+
+let chartDuvida, chartDia;
+
+function destroyChart(c) { 
+  if (c && typeof c.destroy === 'function') { 
+    c.destroy(); 
+  } 
+}
+
+function showDataAsTable(canvasId, data, title) {
+  const canvas = document.getElementById(canvasId);
+  if (!canvas) return;
+  
+  const container = canvas.parentElement;
+  if (!container) return;
+  
+  // Replace canvas with table
+  let html = `<div class="chart-fallback">
+    <div class="alert alert-info mb-2">
+      <small>📊 Chart.js não disponível - mostrando dados em tabela</small>
+    </div>
+    <div class="table-responsive">
+      <table class="table table-sm table-striped">
+        <thead class="table-dark">
+          <tr><th>Item</th><th>Quantidade</th></tr>
+        </thead>
+        <tbody>`;
+  
+  for (let i = 0; i < data.labels.length; i++) {
+    const label = data.labels[i] || 'N/A';
+    const count = data.counts[i] || 0;
+    html += `<tr><td>${label}</td><td><strong>${count}</strong></td></tr>`;
+  }
+  
+  html += `</tbody></table></div></div>`;
+  container.innerHTML = html;
+}
+
+async function loadDuvida() {
+  try {
+    if (typeof Chart === 'undefined') {
+      console.error('Chart.js is not loaded - cannot create duvida chart');
+      document.getElementById('totalDuvidas').innerText = 'Chart.js não carregado - recarregue a página';
+      return;
+    }
+    
+    const q = buildQuery();
+    console.log('Loading duvida chart with params:', q);
+    
+    const res = await fetch('/api/stats/por_duvida' + (q ? '?' + q : ''));
+    
+    if (!res.ok) {
+      console.error('Error loading duvida data:', res.status, res.statusText);
+      document.getElementById('totalDuvidas').innerText = `Erro ao carregar dados: ${res.status}`;
+      return;
+    }
+    
+    const data = await res.json();
+    console.log('Duvida data received:', data);
+
+    if (!data.labels || !data.counts) {
+      console.error('Invalid data format for duvida:', data);
+      document.getElementById('totalDuvidas').innerText = 'Dados em formato inválido';
+      return;
+    }
+
+    const ctx = document.getElementById('chartDuvida');
+    if (!ctx) {
+      console.error('Canvas element chartDuvida not found');
+      return;
+    }
+    
+    destroyChart(chartDuvida);
+
+    const total = data.total || data.counts.reduce((a,b)=>a+b,0);
+    document.getElementById('totalDuvidas').innerHTML = `
+      <i class="fas fa-chart-pie text-primary me-2"></i>
+      <strong>Total de ligações:</strong> ${total.toLocaleString('pt-BR')}
+    `;
+
+    // Create gradients for backgrounds
+    const backgroundColors = window._tipoDuvida === 'pie' 
+      ? chartColors.rainbow.slice(0, data.labels.length)
+      : chartColors.rainbow.slice(0, data.labels.length).map(color => color + '80'); // 50% opacity
+
+    chartDuvida = new Chart(ctx, {
+      type: window._tipoDuvida || 'bar',
+      data: {
+        labels: data.labels || [],
+        datasets: [{
+          label: 'Quantidade',
+          data: data.counts || [],
+          backgroundColor: backgroundColors,
+          borderColor: chartColors.gradient.purple[0],
+          borderWidth: window._tipoDuvida === 'pie' ? 0 : 2,
+          borderRadius: window._tipoDuvida === 'pie' ? 0 : 8,
+          borderSkipped: false,
+        }]
+      },
+      options: {
+        responsive: true,
+        maintainAspectRatio: false,
+        animation: chartAnimation,
+        plugins: {
+          legend: { 
+            display: window._tipoDuvida === 'pie',
+            position: 'bottom',
+            labels: {
+              padding: 20,
+              font: { weight: '500' }
+            }
+          },
+          tooltip: {
+            callbacks: {
+              label: (ctx) => {
+                const val = ctx.raw ?? 0;
+                const percentage = pct(val, total);
+                return `${ctx.label}: ${val.toLocaleString('pt-BR')} (${percentage})`;
+              }
+            }
+          }
+        },
+        scales: window._tipoDuvida === 'pie' ? {} : {
+          x: { 
+            ticks: { 
+              autoSkip: false,
+              font: { weight: '500' }
+            },
+            grid: { display: false }
+          },
+          y: { 
+            beginAtZero: true,
+            ticks: {
+              font: { weight: '500' },
+              callback: function(value) {
+                return value.toLocaleString('pt-BR');
+              }
+            },
+            grid: { color: 'rgba(0,0,0,0.05)' }
+          }
+        }
+      }
+    });
+
+    console.log('Duvida chart created successfully');
+  } catch (error) {
+    console.error('Exception in loadDuvida:', error);
+    document.getElementById('totalDuvidas').innerText = 'Erro ao carregar gráfico';
+  }
+}
+
+// Série por dia: o servidor reduz para ~3px por ponto (LTTB, ?max_points) e o zoom
+// busca a janela visível em resolução cheia, então payload e desenho não crescem com o período
+let diaJanela = null;     // {start, end} da janela carregada pelo zoom (null = visão geral)
+let diaAmostrado = false; // a série exibida foi reduzida no servidor?
+
+function maxPontosDia() {
+  const canvas = document.getElementById('chartDia');
+  return Math.max(50, Math.round(((canvas && canvas.clientWidth) || 900) / 3));
+}
+
+function carregarJanelaDia(chart) {
+  // Sem redução, o gráfico já tem todos os pontos: o plugin de zoom resolve sozinho
+  if (!diaAmostrado) return;
+  const labels = chart.data.labels;
+  const escala = chart.scales.x;
+  const ini = labels[Math.max(0, Math.ceil(escala.min))];
+  const fim = labels[Math.min(labels.length - 1, Math.floor(escala.max))];
+  if (ini && fim) loadDia({ start: ini, end: fim });
+}
+
+async function loadDia(janela = null) {
+  try {
+    if (typeof Chart === 'undefined') {
+      console.error('Chart.js is not loaded - cannot create dia chart');
+      return;
+    }
+    
+    const params = new URLSearchParams(buildQuery());
+    if (janela) {
+      params.set('start', janela.start);
+      params.set('end', janela.end);
+    }
+    params.set('periodo', 'dia');
+    params.set('janela', 7);
+    params.set('max_points', maxPontosDia());
+    console.log('Loading dia chart with params:', params.toString());
+    
+    // Média móvel calculada no banco sobre a série completa (antes da redução)
+    const res = await fetch('/api/stats/serie?' + params.toString());
+    
+    if (!res.ok) {
+      console.error('Error loading dia data:', res.status, res.statusText);
+      return;
+    }
+    
+    const data = await res.json();
+    console.log('Dia data received:', data);
+
+    if (!data.labels || !data.counts) {
+      console.error('Invalid data format for dia:', data);
+      return;
+    }
+
+    const ctx = document.getElementById('chartDia');
+    if (!ctx) {
+      console.error('Canvas element chartDia not found');
+      return;
+    }
+    
+    destroyChart(chartDia);
+    diaJanela = janela;
+    diaAmostrado = !!data.amostrado;
+
+    const baseDataset = {
+      label: 'Ligações por dia',
+      data: data.counts || [],
+      borderColor: chartColors.gradient.green[0],
+      backgroundColor: chartColors.gradient.green[0] + '20', // 12.5% opacity
+      borderWidth: 3,
+      fill: true,
+      tension: 0.4,
+      pointBackgroundColor: chartColors.gradient.green[0],
+      pointBorderColor: '#ffffff',
+      pointBorderWidth: 2,
+      pointRadius: 5,
+      pointHoverRadius: 7
+    };
+    const datasets = [baseDataset];
+
+    if (document.getElementById('chkMedia').checked) {
+      datasets.push({
+        label: 'Média móvel 7d',
+        data: data.media_movel || [],
+        borderColor: chartColors.gradient.pink[0],
+        backgroundColor: 'rgba(240, 147, 251, 0.1)',
+        borderWidth: 2,
+        tension: 0.2,
+        pointRadius: 3,
+        pointHoverRadius: 5,
+        fill: false,
+        borderDash: [5, 5]
+      });
+    }
+
+    const total = data.counts.reduce((a, b) => a + b, 0);
+    const media = total / data.counts.length || 0;
+
+    chartDia = new Chart(ctx, {
+      type: 'line',
+      data: { labels: data.labels || [], datasets },
+      options: {
+        responsive: true,
+        maintainAspectRatio: false,
+        animation: {
+          duration: 1500,
+          easing: 'easeOutQuart'
+        },
+        interaction: {
+          intersect: false,
+          mode: 'index'
+        },
+        plugins: {
+          legend: { 
+            display: true,
+            position: 'top',
+            labels: {
+              padding: 20,
+              usePointStyle: true,
+              font: { weight: '500' }
+            }
+          },
+          tooltip: {
+            callbacks: {
+              title: function(context) {
+                return `Data: ${context[0].label}`;
+              },
+              label: function(context) {
+                return `${context.dataset.label}: ${context.raw.toLocaleString('pt-BR')}`;
+              }
+            }
+          },
+          zoom: {
+            zoom: {
+              wheel: { enabled: true },
+              drag: { enabled: true },
+              mode: 'x',
+              onZoomComplete: ({ chart }) => carregarJanelaDia(chart)
+            },
+            pan: {
+              enabled: true,
+              mode: 'x',
+              modifierKey: 'alt',
+              onPanComplete: ({ chart }) => carregarJanelaDia(chart)
+            }
+          }
+        },
+        scales: {
+          x: {
+            ticks: {
+              font: { weight: '500' }
+            },
+            grid: { display: false }
+          },
+          y: { 
+            beginAtZero: true,
+            ticks: {
+              font: { weight: '500' },
+              callback: function(value) {
+                return value.toLocaleString('pt-BR');
+              }
+            },
+            grid: { color: 'rgba(0,0,0,0.05)' }
+          }
+        }
+      }
+    });
+    
+    console.log('Dia chart created successfully');
+  } catch (error) {
+    console.error('Exception in loadDia:', error);
+  }
+}
+
+// Novos relatórios
+async function loadComparativo() {
+  try {
+    const q = buildQuery();
+    const periodo = document.getElementById('selPeriodo').value;
+    const params = new URLSearchParams(q);
+    params.set('periodo', periodo);
+    // Barras de ~6px no mínimo: séries longas chegam reduzidas pelo servidor (LTTB)
+    const canvasComparativo = document.getElementById('chartComparativo');
+    params.set('max_points', Math.max(30, Math.round(((canvasComparativo && canvasComparativo.clientWidth) || 900) / 6)));
+    
+    console.log('Loading comparativo chart with params:', params.toString());
+    
+    const res = await fetch('/api/stats/comparativo_periodo?' + params.toString());
+    
+    if (!res.ok) {
+      console.error('Error loading comparativo data:', res.status, res.statusText);
+      document.getElementById('totalComparativo').innerText = `Erro ao carregar dados: ${res.status}`;
+      return;
+    }
+    
+    const data = await res.json();
+    console.log('Comparativo data received:', data);
+
+    if (!data.labels || !data.counts) {
+      console.error('Invalid data format for comparativo:', data);
+      document.getElementById('totalComparativo').innerText = 'Dados em formato inválido';
+      return;
+    }
+
+    const total = data.total || 0;
+    document.getElementById('totalComparativo').innerHTML = `
+      <i class="fas fa-chart-area text-danger me-2"></i>
+      <strong>Total no período (${data.periodo || periodo}):</strong> ${total.toLocaleString('pt-BR')}
+    `;
+
+    if (typeof Chart === 'undefined') {
+      console.warn('Chart.js is not loaded - showing data as table for comparativo chart');
+      showDataAsTable('chartComparativo', data, `Ligações por ${data.periodo || periodo}`);
+      return;
+    }
+
+    const ctx = document.getElementById('chartComparativo');
+    if (!ctx) {
+      console.error('Canvas element chartComparativo not found');
+      return;
+    }
+    
+    destroyChart(window.chartComparativo);
+
+    // Create gradient backgrounds for each bar
+    const backgroundColors = data.counts.map((value, index) => {
+      return chartColors.gradient.pink[0] + '80'; // 50% opacity
+    });
+
+    window.chartComparativo = new Chart(ctx, {
+      type: 'bar',
+      data: {
+        labels: data.labels || [],
+        datasets: [{
+          label: `Ligações por ${data.periodo || periodo}`,
+          data: data.counts || [],
+          backgroundColor: backgroundColors,
+          borderColor: chartColors.gradient.pink[0],
+          borderWidth: 2,
+          borderRadius: 8,
+          borderSkipped: false,
+        }]
+      },
+      options: {
+        responsive: true,
+        maintainAspectRatio: false,
+        animation: chartAnimation,
+        plugins: {
+          legend: { display: false },
+          tooltip: {
+            callbacks: {
+              title: function(context) {
+                return `${data.periodo || periodo}: ${context[0].label}`;
+              },
+              label: function(context) {
+                return `Ligações: ${context.raw.toLocaleString('pt-BR')}`;
+              }
+            }
+          }
+        },
+        scales: {
+          x: { 
+            ticks: { 
+              autoSkip: true, 
+              maxTicksLimit: 15,
+              font: { weight: '500' }
+            },
+            grid: { display: false }
+          },
+          y: { 
+            beginAtZero: true,
+            ticks: {
+              font: { weight: '500' },
+              callback: function(value) {
+                return value.toLocaleString('pt-BR');
+              }
+            },
+            grid: { color: 'rgba(0,0,0,0.05)' }
+          }
+        }
+      }
+    });
+    
+    console.log('Comparativo chart created successfully');
+  } catch (error) {
+    console.error('Exception in loadComparativo:', error);
+    document.getElementById('totalComparativo').innerText = 'Erro ao carregar gráfico';
+  }
+}
+
+async function loadHorarios() {
+  try {
+    const q = buildQuery();
+    console.log('Loading horarios chart with params:', q);
+    
+    const res = await fetch('/api/stats/pico_horarios' + (q ? '?' + q : ''));
+    
+    if (!res.ok) {
+      console.error('Error loading horarios data:', res.status, res.statusText);
+      document.getElementById('totalHorarios').innerText = `Erro ao carregar dados: ${res.status}`;
+      return;
+    }
+    
+    const data = await res.json();
+    console.log('Horarios data received:', data);
+
+    if (!data.labels || !data.counts) {
+      console.error('Invalid data format for horarios:', data);
+      document.getElementById('totalHorarios').innerText = 'Dados em formato inválido';
+      return;
+    }
+
+    const total = data.total || 0;
+    const maxIndex = data.counts.length > 0 ? data.counts.indexOf(Math.max(...data.counts)) : -1;
+    const maxHour = maxIndex >= 0 ? data.labels[maxIndex] : 'N/A';
+    const maxValue = maxIndex >= 0 ? Math.max(...data.counts) : 0;
+    document.getElementById('totalHorarios').innerHTML = `
+      <i class="fas fa-clock text-info me-2"></i>
+      <strong>Total:</strong> ${total.toLocaleString('pt-BR')} | 
+      <strong>Pico:</strong> ${maxHour} (${maxValue.toLocaleString('pt-BR')} ligações)
+    `;
+
+    if (typeof Chart === 'undefined') {
+      console.warn('Chart.js is not loaded - showing data as table for horarios chart');
+      // Filter out hours with 0 calls for cleaner display
+      const filteredData = {
+        labels: data.labels.filter((_, i) => data.counts[i] > 0),
+        counts: data.counts.filter(count => count > 0)
+      };
+      showDataAsTable('chartHorario', filteredData, 'Ligações por hora');
+      return;
+    }
+
+    const ctx = document.getElementById('chartHorario');
+    if (!ctx) {
+      console.error('Canvas element chartHorario not found');
+      return;
+    }
+    
+    destroyChart(window.chartHorario);
+
+    // Create gradient backgrounds for each bar
+    const backgroundColors = data.counts.map((value, index) => {
+      const intensity = value / Math.max(...data.counts);
+      return value === maxValue 
+        ? chartColors.gradient.pink[0] + '80'  // Peak hour - more intense
+        : chartColors.gradient.blue[0] + Math.floor(20 + intensity * 60).toString(16); // Variable intensity
+    });
+
+    window.chartHorario = new Chart(ctx, {
+      type: 'bar',
+      data: {
+        labels: data.labels || [],
+        datasets: [{
+          label: 'Ligações por hora',
+          data: data.counts || [],
+          backgroundColor: backgroundColors,
+          borderColor: chartColors.gradient.blue[0],
+          borderWidth: 2,
+          borderRadius: 6,
+          borderSkipped: false,
+        }]
+      },
+      options: {
+        responsive: true,
+        maintainAspectRatio: false,
+        animation: chartAnimation,
+        plugins: {
+          legend: { display: false },
+          tooltip: {
+            callbacks: {
+              title: function(context) {
+                return `Horário: ${context[0].label}`;
+              },
+              label: function(context) {
+                return `Ligações: ${context.raw.toLocaleString('pt-BR')}`;
+              }
+            }
+          }
+        },
+        scales: {
+          x: { 
+            ticks: { 
+              autoSkip: false,
+              font: { weight: '500' }
+            },
+            grid: { display: false }
+          },
+          y: { 
+            beginAtZero: true,
+            ticks: {
+              font: { weight: '500' },
+              callback: function(value) {
+                return value.toLocaleString('pt-BR');
+              }
+            },
+            grid: { color: 'rgba(0,0,0,0.05)' }
+          }
+        }
+      }
+    });
+    
+    console.log('Horarios chart created successfully');
+  } catch (error) {
+    console.error('Exception in loadHorarios:', error);
+    document.getElementById('totalHorarios').innerText = 'Erro ao carregar gráfico';
+  }
+}
+
+async function loadAtendentes() {
+  try {
+    const q = buildQuery();
+    console.log('Loading atendentes chart with params:', q);
+    
+    const res = await fetch('/api/stats/por_atendente' + (q ? '?' + q : ''));
+    
+    if (!res.ok) {
+      console.error('Error loading atendentes data:', res.status, res.statusText);
+      document.getElementById('totalAtendentes').innerText = `Erro ao carregar dados: ${res.status}`;
+      return;
+    }
+    
+    const data = await res.json();
+    console.log('Atendentes data received:', data);
+
+    if (!data.labels || !data.counts) {
+      console.error('Invalid data format for atendentes:', data);
+      document.getElementById('totalAtendentes').innerText = 'Dados em formato inválido';
+      return;
+    }
+
+    const total = data.total || 0;
+    const activeAttendees = data.counts.filter(count => count > 0).length;
+    document.getElementById('totalAtendentes').innerHTML = `
+      <i class="fas fa-users text-primary me-2"></i>
+      <strong>Total de ligações:</strong> ${total.toLocaleString('pt-BR')} | 
+      <strong>Atendentes ativos:</strong> ${activeAttendees}
+    `;
+
+    if (typeof Chart === 'undefined') {
+      console.warn('Chart.js is not loaded - showing data as table for atendentes chart');
+      showDataAsTable('chartAtendente', data, 'Ligações por atendente');
+      return;
+    }
+
+    const ctx = document.getElementById('chartAtendente');
+    if (!ctx) {
+      console.error('Canvas element chartAtendente not found');
+      return;
+    }
+    
+    destroyChart(window.chartAtendente);
+
+    // Create color palette for attendees
+    const backgroundColors = window._tipoAtendente === 'pie' 
+      ? chartColors.rainbow.slice(0, data.labels.length)
+      : chartColors.rainbow.slice(0, data.labels.length).map(color => color + '80'); // 50% opacity
+
+    window.chartAtendente = new Chart(ctx, {
+      type: window._tipoAtendente || 'bar',
+      data: {
+        labels: data.labels || [],
+        datasets: [{
+          label: 'Ligações',
+          data: data.counts || [],
+          backgroundColor: backgroundColors,
+          borderColor: chartColors.gradient.purple[0],
+          borderWidth: window._tipoAtendente === 'pie' ? 0 : 2,
+          borderRadius: window._tipoAtendente === 'pie' ? 0 : 8,
+          borderSkipped: false,
+        }]
+      },
+      options: {
+        responsive: true,
+        maintainAspectRatio: false,
+        animation: chartAnimation,
+        plugins: {
+          legend: { 
+            display: window._tipoAtendente === 'pie',
+            position: 'bottom',
+            labels: {
+              padding: 20,
+              font: { weight: '500' }
+            }
+          },
+          tooltip: {
+            callbacks: {
+              title: function(context) {
+                return window._tipoAtendente === 'pie' ? context[0].label : `Atendente: ${context[0].label}`;
+              },
+              label: (ctx) => {
+                const val = ctx.raw ?? 0;
+                const percentage = pct(val, total);
+                return `Ligações: ${val.toLocaleString('pt-BR')} (${percentage})`;
+              }
+            }
+          }
+        },
+        scales: window._tipoAtendente === 'pie' ? {} : {
+          x: { 
+            ticks: { 
+              autoSkip: false,
+              maxRotation: 45,
+              font: { weight: '500' }
+            },
+            grid: { display: false }
+          },
+          y: { 
+            beginAtZero: true,
+            ticks: {
+              font: { weight: '500' },
+              callback: function(value) {
+                return value.toLocaleString('pt-BR');
+              }
+            },
+            grid: { color: 'rgba(0,0,0,0.05)' }
+          }
+        }
+      }
+    });
+    
+    console.log('Atendentes chart created successfully');
+  } catch (error) {
+    console.error('Exception in loadAtendentes:', error);
+    document.getElementById('totalAtendentes').innerText = 'Erro ao carregar gráfico';
+  }
+}
+
+// Produtividade: calculada no banco (intervalos entre ligações consecutivas de cada atendente)
+async function loadProdutividade() {
+  const container = document.getElementById('tabelaProdutividade');
+  try {
+    const params = new URLSearchParams(buildQuery());
+    params.set('pausa', document.getElementById('selPausa').value);
+    const res = await fetch('/api/stats/produtividade?' + params.toString());
+    if (!res.ok) {
+      container.innerHTML = `<p class="text-muted m-0">Erro ao carregar dados: ${res.status}</p>`;
+      return;
+    }
+    const data = await res.json();
+    if (!data.atendentes.length) {
+      container.innerHTML = '<p class="text-muted m-0">Nenhuma ligação no período.</p>';
+      return;
+    }
+    const fmt = (v, casas = 1) => v === null ? '-' : v.toLocaleString('pt-BR', { maximumFractionDigits: casas });
+    let html = `<table class="table table-sm table-hover align-middle mb-0"><thead class="table-light"><tr>
+      <th>Atendente</th><th class="text-end">Ligações</th><th class="text-end">Janelas</th>
+      <th class="text-end">Horas ativas</th><th class="text-end">Ligações/hora</th>
+      <th class="text-end">Intervalo médio (min)</th><th>Dúvida mais frequente</th></tr></thead><tbody>`;
+    for (const a of data.atendentes) {
+      const maior = a.mix.indexOf(Math.max(...a.mix));
+      html += `<tr><td>${a.atendente}</td><td class="text-end"><strong>${a.total.toLocaleString('pt-BR')}</strong></td>
+        <td class="text-end">${a.janelas}</td><td class="text-end">${fmt(a.horas_ativas)}</td>
+        <td class="text-end">${fmt(a.ligacoes_por_hora)}</td><td class="text-end">${fmt(a.intervalo_medio_min)}</td>
+        <td class="small">${data.duvidas[maior]} (${pct(a.mix[maior], a.total)})</td></tr>`;
+    }
+    container.innerHTML = html + '</tbody></table>';
+  } catch (error) {
+    console.error('Exception in loadProdutividade:', error);
+    container.innerHTML = '<p class="text-muted m-0">Erro ao carregar dados</p>';
+  }
+}
+
+function exportData(type, format) {
+  const q = buildQuery();
+  const params = new URLSearchParams(q);
+  params.set('tipo', type);
+  
+  const url = `/api/export/${format}?` + params.toString();
+  window.open(url, '_blank');
+}
+
+// Comprehensive KPI update function that aggregates data from all sources
+// NOTA: Esta função atualiza apenas os KPIs filtrados (média diária, pico horário, atendentes ativos)
+// O total absoluto é mantido fixo e carregado separadamente via loadAbsoluteTotal()
+async function updateAllKPIs() {
+  try {
+    const q = buildQuery();
+    
+    // Get data from all endpoints simultaneously
+    const [diaRes, horariosRes, atendenteRes] = await Promise.all([
+      fetch('/api/stats/por_dia' + (q ? '?' + q : '')),
+      fetch('/api/stats/pico_horarios' + (q ? '?' + q : '')),
+      fetch('/api/stats/por_atendente' + (q ? '?' + q : ''))
+    ]);
+    
+    // Parse all responses
+    const [diaData, horariosData, atendenteData] = await Promise.all([
+      diaRes.ok ? diaRes.json() : null,
+      horariosRes.ok ? horariosRes.json() : null,
+      atendenteRes.ok ? atendenteRes.json() : null
+    ]);
+    
+    // Calculate comprehensive KPI data (exceto total, que é sempre absoluto)
+    const kpiUpdate = {};
+    
+    // Total ligações NÃO é atualizado aqui - sempre mostra o valor absoluto
+    // que foi carregado no início via loadAbsoluteTotal()
+    
+    // Média diária (from dia data)
+    if (diaData?.counts?.length) {
+      const total = diaData.counts.reduce((a, b) => a + b, 0);
+      const media = total / diaData.counts.length;
+      kpiUpdate.mediaDiaria = Math.round(media).toLocaleString('pt-BR');
+    }
+    
+    // Pico horário (from horarios data)
+    if (horariosData?.counts?.length) {
+      const maxIndex = horariosData.counts.indexOf(Math.max(...horariosData.counts));
+      const maxHour = maxIndex >= 0 ? horariosData.labels[maxIndex] : '--:--';
+      const maxValue = maxIndex >= 0 ? Math.max(...horariosData.counts) : 0;
+      kpiUpdate.picoHorario = `${maxHour} (${maxValue.toLocaleString('pt-BR')})`;
+    }
+    
+    // Atendentes ativos (from atendente data)
+    if (atendenteData?.labels?.length) {
+      // Count attendants with at least one call
+      const activeAttendees = atendenteData.counts.filter(count => count > 0).length;
+      kpiUpdate.atendentesAtivos = activeAttendees.toString();
+    }
+    
+    // Update all KPI cards at once (exceto total)
+    updateKPICards(kpiUpdate);
+    console.log('KPI cards updated (filtered data):', kpiUpdate);
+    console.log('Total absoluto permanece:', window.kpiData.totalAbsoluto);
+    
+  } catch (error) {
+    console.error('Error updating KPIs comprehensively:', error);
+  }
+}
+
+/* Botões e eventos */
+document.getElementById('btnAplicar').addEventListener('click', () => {
+  loadDuvida(); loadDia(); loadComparativo(); loadHorarios(); loadAtendentes(); loadProdutividade();
+  // Update KPIs after all charts are loaded
+  setTimeout(updateAllKPIs, 1000);
+});
+document.getElementById('btnLimpar').addEventListener('click', () => {
+  elStart.value = ''; elEnd.value = '';
+  Array.from(elTipos.options).forEach(o=>o.selected=false);
+  loadDuvida(); loadDia(); loadComparativo(); loadHorarios(); loadAtendentes(); loadProdutividade();
+  // Update KPIs after all charts are loaded
+  setTimeout(updateAllKPIs, 1000);
+});
+
+document.getElementById('btnTipoBar').addEventListener('click', () => {
+  window._tipoDuvida = 'bar';
+  loadDuvida();
+});
+document.getElementById('btnTipoPie').addEventListener('click', () => {
+  window._tipoDuvida = 'pie';
+  loadDuvida();
+});
+
+document.getElementById('chkMedia').addEventListener('change', () => {
+  loadDia();
+});
+
+document.getElementById('btnZoomReset').addEventListener('click', () => {
+  // Janela carregada pelo zoom: volta para a visão geral do período filtrado
+  if (diaJanela) loadDia();
+  else if (chartDia) chartDia.resetZoom();
+});
+
+document.getElementById('btnTipoDownload').addEventListener('click', () => {
+  if (!chartDuvida) return;
+  const url = chartDuvida.toBase64Image();
+  const a = document.createElement('a');
+  a.href = url; a.download = 'por_tipo.png'; a.click();
+});
+
+document.getElementById('btnDiaDownload').addEventListener('click', () => {
+  if (!chartDia) return;
+  const url = chartDia.toBase64Image();
+  const a = document.createElement('a');
+  a.href = url; a.download = 'por_dia.png'; a.click();
+});
+
+/* Carrega inicial - Only if Chart.js is available */
+document.addEventListener('DOMContentLoaded', function() {
+  // Carregar o total absoluto primeiro (independente de Chart.js)
+  // Este total nunca muda, mostrando sempre todas as ligações cadastradas
+  loadAbsoluteTotal();
+  
+  // Wait for Chart.js to be available
+  let checkAttempts = 0;
+  const maxAttempts = 10;
+  
+  function checkAndInitialize() {
+    checkAttempts++;
+    if (typeof Chart !== 'undefined') {
+      console.log('Chart.js is available, initializing charts...');
+      loadDuvida(); 
+      loadDia(); 
+      loadComparativo(); 
+      loadHorarios(); 
+      loadAtendentes();
+      loadProdutividade();
+      // Update KPIs after initial chart loading (exceto total, que já foi carregado)
+      setTimeout(updateAllKPIs, 1500);
+    } else if (checkAttempts < maxAttempts) {
+      setTimeout(checkAndInitialize, 500);
+    } else {
+      console.warn('Chart.js not available after waiting, charts will show as tables');
+      // Initialize with fallback tables
+      loadDuvida(); 
+      loadDia(); 
+      loadComparativo(); 
+      loadHorarios(); 
+      loadAtendentes();
+      loadProdutividade();
+      // Still try to update KPIs
+      setTimeout(updateAllKPIs, 1000);
+    }
+  }
+  
+  checkAndInitialize();
+});
+
+// Event listeners para novos controles
+document.getElementById('selPeriodo').addEventListener('change', () => {
+  loadComparativo();
+});
+
+document.getElementById('selPausa').addEventListener('change', () => {
+  loadProdutividade();
+});
+
+// Atendente chart type toggles
+document.getElementById('btnAtendenteBarra').addEventListener('click', () => {
+  window._tipoAtendente = 'bar';
+  loadAtendentes();
+});
+document.getElementById('btnAtendentePizza').addEventListener('click', () => {
+  window._tipoAtendente = 'pie';
+  loadAtendentes();
+});
+
+// Download buttons for new charts
+document.getElementById('btnComparativoDownload').addEventListener('click', () => {
+  if (!window.chartComparativo) return;
+  const url = window.chartComparativo.toBase64Image();
+  const a = document.createElement('a');
+  a.href = url; a.download = 'comparativo_periodo.png'; a.click();
+});
+
+document.getElementById('btnHorarioDownload').addEventListener('click', () => {
+  if (!window.chartHorario) return;
+  const url = window.chartHorario.toBase64Image();
+  const a = document.createElement('a');
+  a.href = url; a.download = 'pico_horarios.png'; a.click();
+});
+
+document.getElementById('btnAtendenteDownload').addEventListener('click', () => {
+  if (!window.chartAtendente) return;
+  const url = window.chartAtendente.toBase64Image();
+  const a = document.createElement('a');
+  a.href = url; a.download = 'por_atendente.png'; a.click();
+});
+
+// Export buttons
+document.getElementById('btnExportCSVResumo').addEventListener('click', () => {
+  exportData('por_duvida', 'csv');
+});
+
+document.getElementById('btnExportPDFResumo').addEventListener('click', () => {
+  exportData('por_duvida', 'pdf');
+});
+
+document.getElementById('btnExportCSVDetalhado').addEventListener('click', () => {
+  exportData('detalhado', 'csv');
+});
+
+document.getElementById('btnExportPDFDetalhado').addEventListener('click', () => {
+  exportData('detalhado', 'pdf');
+});
+
+document.getElementById('btnExportXLSXResumo').addEventListener('click', () => {
+  exportData('por_duvida', 'xlsx');
+});
+
+document.getElementById('btnExportXLSXDetalhado').addEventListener('click', () => {
+  exportData('detalhado', 'xlsx');
+});
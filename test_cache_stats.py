@@ -0,0 +1,112 @@
+"""
+Testes do cache das respostas de /api/stats/* (STATS_CACHE)
+"""
+import threading
+import time
+
+import app as app_module
+from conftest import cadastrar
+
+
+def _contador(resultado):
+    linha = f'ligacoes_stats_cache_total{{resultado="{resultado}"}}'
+    for l in app_module.METRICS.render().splitlines():
+        if l.startswith(linha):
+            return float(l.split()[-1])
+    return 0.0
+
+
+def test_filtros_normalizados_reaproveitam_e_gravacao_invalida(admin_client):
+    d0, d1 = app_module.DUVIDA_OPCOES[0], app_module.DUVIDA_OPCOES[1]
+    base = admin_client.get(f"/api/stats/por_duvida?tipos={d0},{d1}").json()
+
+    hits = _contador("hit")
+    # Mesmos filtros em outra ordem: mesma chave
+    assert admin_client.get(f"/api/stats/por_duvida?tipos={d1},{d0}").json() == base
+    assert _contador("hit") == hits + 1
+
+    cadastrar(admin_client, duvida=d0, observacao="cache-invalida")
+    depois = admin_client.get(f"/api/stats/por_duvida?tipos={d0},{d1}").json()
+    assert depois["total"] == base["total"] + 1
+
+
+def test_permissao_conferida_antes_do_cache(admin_client, atendente_client):
+    admin_client.get("/api/stats/total")
+    assert atendente_client.get("/api/stats/total").status_code == 403
+
+
+def test_calculos_iguais_simultaneos_sao_coalescidos():
+    cache = app_module.CacheRespostas(ttl=60, max_itens=10)
+    chamadas = []
+    liberar = threading.Event()
+
+    def calcular():
+        chamadas.append(1)
+        liberar.wait(5)
+        return {"ok": True}
+
+    resultados = []
+    antes = {r: _contador(r) for r in ("hit", "miss", "coalescido")}
+    threads = [threading.Thread(target=lambda: resultados.append(cache.obter("k", calcular))) for _ in range(5)]
+    for t in threads:
+        t.start()
+    time.sleep(0.1)
+    liberar.set()
+    for t in threads:
+        t.join()
+    assert len(chamadas) == 1
+    assert resultados == [{"ok": True}] * 5
+    # Cada requisição conta uma única vez
+    assert {r: _contador(r) - antes[r] for r in antes} == {"hit": 0, "miss": 1, "coalescido": 4}
+
+
+def test_espera_pelo_calculo_em_curso_tem_limite():
+    cache = app_module.CacheRespostas(ttl=60, max_itens=10, espera=0.05)
+    liberar = threading.Event()
+    lento = threading.Thread(target=lambda: cache.obter("k", lambda: liberar.wait(5) and "lento"))
+    lento.start()
+    time.sleep(0.05)
+
+    antes = _contador("espera_esgotada")
+    try:
+        assert cache.obter("k", lambda: "direto") == "direto"
+        assert _contador("espera_esgotada") == antes + 1
+    finally:
+        liberar.set()
+        lento.join()
+    assert cache.obter("k", lambda: "outro") == "lento"
+
+
+def test_resultado_sem_cache_nao_e_guardado():
+    cache = app_module.CacheRespostas(ttl=60, max_itens=10)
+    chamadas = []
+
+    def calcular():
+        chamadas.append(1)
+        raise app_module.ResultadoSemCache({"fallback": True})
+
+    assert cache.obter("k", calcular) == {"fallback": True}
+    assert cache.obter("k", calcular) == {"fallback": True}
+    assert len(chamadas) == 2
+
+
+def test_limite_lru_e_ttl():
+    cache = app_module.CacheRespostas(ttl=60, max_itens=2)
+    calculos = []
+
+    def calcular(valor):
+        return lambda: calculos.append(valor) or valor
+
+    cache.obter("a", calcular("a"))
+    cache.obter("b", calcular("b"))
+    cache.obter("a", calcular("a"))  # "a" passa a ser o mais recente
+    cache.obter("c", calcular("c"))  # descarta "b"
+    cache.obter("a", calcular("a"))
+    cache.obter("b", calcular("b"))
+    assert calculos == ["a", "b", "c", "b"]
+
+    expira = app_module.CacheRespostas(ttl=0.01, max_itens=2)
+    expira.obter("x", calcular("x"))
+    time.sleep(0.02)
+    expira.obter("x", calcular("x"))
+    assert calculos[-2:] == ["x", "x"]
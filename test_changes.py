@@ -0,0 +1,67 @@
+"""
+Testes do feed de mudanças (/api/changes)
+"""
+import app as app_module
+from conftest import cadastrar
+
+
+def _ultimo_id():
+    db = app_module.SessionLocal()
+    try:
+        return db.query(app_module.func.max(app_module.Ligacao.id)).scalar()
+    finally:
+        db.close()
+
+
+def _consumir(client, cursor=None, limit=1000):
+    """Segue o cursor até has_more=false, como uma sincronização faria"""
+    mudancas = []
+    while True:
+        params = {"limit": limit}
+        if cursor:
+            params["since"] = cursor
+        r = client.get("/api/changes", params=params)
+        assert r.status_code == 200
+        corpo = r.json()
+        mudancas += corpo["changes"]
+        cursor = corpo["cursor"]
+        if not corpo["has_more"]:
+            return mudancas, cursor
+
+
+def test_feed_incremental_com_insert_update_delete(admin_client, monkeypatch):
+    monkeypatch.setattr(app_module, "CHANGES_SAFETY_LAG_SECONDS", 0)
+    _, cursor = _consumir(admin_client)
+
+    cadastrar(admin_client, observacao="cdc-1")
+    cadastrar(admin_client, observacao="cdc-2")
+    novo_id = _ultimo_id()
+    mudancas, cursor = _consumir(admin_client, cursor, limit=1)
+    assert [(m["op"], m["observacao"]) for m in mudancas] == [("insert", "cdc-1"), ("insert", "cdc-2")]
+
+    r = admin_client.post(f"/editar/{novo_id}", data={
+        "cro": "CRO/RS 2", "nome_inscrito": "Editado", "duvida": app_module.DUVIDA_OPCOES[0], "observacao": "cdc-2",
+    }, follow_redirects=False)
+    assert r.status_code == 303
+    assert admin_client.post(f"/excluir/{novo_id - 1}", follow_redirects=False).status_code == 303
+
+    mudancas, cursor = _consumir(admin_client, cursor)
+    assert [(m["op"], m["id"]) for m in mudancas] == [("update", novo_id), ("delete", novo_id - 1)]
+    assert mudancas[0]["nome_inscrito"] == "Editado"
+
+    # Sem mudanças novas: nada a transferir e o cursor é mantido
+    mudancas, cursor_final = _consumir(admin_client, cursor)
+    assert mudancas == [] and cursor_final == cursor
+
+
+def test_mudancas_recentes_aguardam_a_margem(admin_client, monkeypatch):
+    monkeypatch.setattr(app_module, "CHANGES_SAFETY_LAG_SECONDS", 0)
+    _, cursor = _consumir(admin_client)
+    monkeypatch.setattr(app_module, "CHANGES_SAFETY_LAG_SECONDS", 3600)
+    cadastrar(admin_client, observacao="cdc-recente")
+    mudancas, _ = _consumir(admin_client, cursor)
+    assert mudancas == []
+
+
+def test_cursor_invalido(admin_client):
+    assert admin_client.get("/api/changes?since=lixo").status_code == 400
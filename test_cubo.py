@@ -0,0 +1,154 @@
+"""
+Testes do endpoint /api/stats/cube
+"""
+from datetime import datetime, timezone
+
+import app
+from conftest import cadastrar
+
+
+def _inserir(created_at_utc, duvida, atendente):
+    db = app.SessionLocal()
+    try:
+        db.add(app.Ligacao(cro="CRO/RS 9", nome_inscrito="Cubo", duvida=duvida,
+                           atendente=atendente, created_at=created_at_utc))
+        db.commit()
+    finally:
+        db.close()
+
+
+def test_cubo_agrupa_por_dimensoes_no_fuso_sp(admin_client):
+    d0, d1 = app.DUVIDA_OPCOES[0], app.DUVIDA_OPCOES[1]
+    # 02:30 UTC de 11/03/2024 ainda é 10/03 (domingo), 23:30 em SP
+    _inserir(datetime(2024, 3, 11, 2, 30, tzinfo=timezone.utc), d0, "Ana Cubo")
+    _inserir(datetime(2024, 3, 11, 13, 0, tzinfo=timezone.utc), d0, "Ana Cubo")
+    _inserir(datetime(2024, 3, 11, 13, 30, tzinfo=timezone.utc), d1, "Bruno Cubo")
+
+    r = admin_client.get("/api/stats/cube?dims=dia,dia_semana,hora,duvida,atendente&start=2024-03-10&end=2024-03-11")
+    assert r.status_code == 200
+    dados = r.json()
+    assert dados["colunas"] == ["dia", "dia_semana", "hora", "duvida", "atendente", "count"]
+    assert dados["total"] == 3
+    assert dados["linhas"] == [
+        ["2024-03-10", 0, 23, d0, "Ana Cubo", 1],
+        ["2024-03-11", 1, 10, d1, "Bruno Cubo", 1],
+        ["2024-03-11", 1, 10, d0, "Ana Cubo", 1],
+    ]
+
+    semana = admin_client.get(f"/api/stats/cube?dims=dia,duvida&periodo=semana&start=2024-03-10&end=2024-03-11&tipos={d0}").json()
+    assert semana["linhas"] == [["2024-W10", d0, 1], ["2024-W11", d0, 1]]
+
+
+def test_cubo_limite_top_n_mantem_total(admin_client):
+    for _ in range(3):
+        cadastrar(admin_client, duvida=app.DUVIDA_OPCOES[2])
+    cadastrar(admin_client, duvida=app.DUVIDA_OPCOES[3])
+
+    dados = admin_client.get("/api/stats/cube?dims=duvida&limit=1").json()
+    assert len(dados["linhas"]) == 1
+    assert dados["truncado"] is True
+    assert dados["total"] == sum(admin_client.get("/api/stats/por_duvida").json()["counts"])
+
+
+def test_cubo_valida_parametros(admin_client, atendente_client):
+    assert admin_client.get("/api/stats/cube?dims=cro").status_code == 400
+    assert admin_client.get("/api/stats/cube?dims=hora,hora").status_code == 400
+    assert admin_client.get("/api/stats/cube?dims=hora&periodo=trimestre").status_code == 400
+    assert admin_client.get("/api/stats/cube?dims=hora&limit=0").status_code == 400
+    assert atendente_client.get("/api/stats/cube?dims=hora").status_code == 403
+
+
+def test_endpoints_legados_agregam_no_banco(admin_client):
+    d0 = app.DUVIDA_OPCOES[0]
+    # 30/12/2024 (segunda) pertence à semana ISO 2025-W01
+    _inserir(datetime(2024, 12, 30, 15, 0, tzinfo=timezone.utc), d0, "Ana Legado")
+    _inserir(datetime(2024, 12, 30, 16, 0, tzinfo=timezone.utc), d0, "Bruno Legado")
+    _inserir(datetime(2024, 12, 31, 15, 0, tzinfo=timezone.utc), d0, "Bruno Legado")
+    filtro = "start=2024-12-30&end=2024-12-31"
+
+    semana = admin_client.get(f"/api/stats/comparativo_periodo?periodo=semana&{filtro}").json()
+    assert semana["labels"] == ["2025-W01"] and semana["counts"] == [3]
+    assert admin_client.get(f"/api/stats/por_dia?{filtro}").json() == {"labels": ["2024-12-30", "2024-12-31"], "counts": [2, 1]}
+    assert admin_client.get(f"/api/stats/por_atendente?{filtro}").json()["labels"] == ["Bruno Legado", "Ana Legado"]
+    horas = admin_client.get(f"/api/stats/pico_horarios?{filtro}").json()
+    assert horas["counts"][12] == 2 and horas["counts"][13] == 1 and horas["total"] == 3
+
+    linhas = admin_client.get(f"/api/export/csv?tipo=detalhado&{filtro}").text.splitlines()
+    assert len(linhas) == 4 and linhas[1].endswith("30/12/2024 12:00")
+
+
+def test_lttb_preserva_extremos_e_limita_pontos():
+    xs = list(range(100))
+    ys = [1] * 100
+    ys[37], ys[71] = 50, 0
+    indices = app._lttb(xs, ys, 10)
+    assert len(indices) == 10
+    assert indices[0] == 0 and indices[-1] == 99
+    assert 37 in indices
+    assert app._lttb(xs[:5], ys[:5], 10) == [0, 1, 2, 3, 4]
+
+
+def test_por_dia_max_points(admin_client):
+    for dia in range(1, 21):
+        _inserir(datetime(2023, 5, dia, 15, 0, tzinfo=timezone.utc), app.DUVIDA_OPCOES[0], "Série")
+    filtro = "start=2023-05-01&end=2023-05-31"
+
+    dados = admin_client.get(f"/api/stats/por_dia?{filtro}&max_points=5").json()
+    assert dados["pontos_originais"] == 20 and dados["amostrado"] is True
+    assert len(dados["labels"]) == 5
+    assert dados["labels"][0] == "2023-05-01" and dados["labels"][-1] == "2023-05-20"
+
+    comparativo = admin_client.get(f"/api/stats/comparativo_periodo?periodo=dia&{filtro}&max_points=5").json()
+    assert len(comparativo["counts"]) == 5 and comparativo["total"] == 20
+    assert admin_client.get(f"/api/stats/por_dia?{filtro}&max_points=2").status_code == 400
+
+
+def test_serie_media_movel_acumulado_e_delta(admin_client):
+    d0 = app.DUVIDA_OPCOES[0]
+    # 2 ligações em 01/02, nenhuma em 02/02, 4 em 03/02
+    for dia, qtd in ((1, 2), (3, 4)):
+        for _ in range(qtd):
+            _inserir(datetime(2022, 2, dia, 15, 0, tzinfo=timezone.utc), d0, "Série Janela")
+
+    dados = admin_client.get("/api/stats/serie?periodo=dia&janela=2&start=2022-02-01&end=2022-02-28").json()
+    assert dados["labels"] == ["2022-02-01", "2022-02-03"]
+    assert dados["counts"] == [2, 4]
+    # Janela de 2 dias do calendário: 02/02 (zero) + 03/02
+    assert dados["media_movel"] == [2.0, 2.0]
+    assert dados["acumulado"] == [2, 6]
+    # Dia anterior (02/02) sem ligações
+    assert dados["delta"] == [None, 4] and dados["delta_pct"] == [None, None]
+
+    semana = admin_client.get("/api/stats/serie?periodo=semana&start=2022-02-01&end=2022-02-28").json()
+    assert semana["labels"] == ["2022-W05"] and semana["total"] == 6
+    assert admin_client.get("/api/stats/serie?periodo=hora").status_code == 400
+
+
+def test_produtividade_por_atendente_com_janelas_e_intervalos(admin_client, atendente_client):
+    d0, d1 = app.DUVIDA_OPCOES[0], app.DUVIDA_OPCOES[1]
+    base = datetime(2024, 5, 6, 12, 0, tzinfo=timezone.utc)  # 09:00 em SP
+    # Janela 1: 09:00, 09:10, 09:30 (20 min cabem na pausa de 30); janela 2 após 2 h de pausa
+    for minutos, duvida in ((0, d0), (10, d0), (30, d1), (150, d0), (160, d0)):
+        _inserir(base.replace(hour=12 + minutos // 60, minute=minutos % 60), duvida, "Carla Produtiva")
+    _inserir(base, d1, "Davi Unico")
+
+    r = admin_client.get("/api/stats/produtividade?start=2024-05-06&end=2024-05-06")
+    assert r.status_code == 200
+    dados = r.json()
+    assert dados["total"] == 6 and dados["pausa_minutos"] == 30
+    carla, davi = dados["atendentes"]
+    assert carla == {
+        "atendente": "Carla Produtiva", "total": 5, "janelas": 2,
+        "horas_ativas": 0.67, "ligacoes_por_hora": 7.5, "intervalo_medio_min": 13.33,
+        "primeira": "06/05/2024 09:00", "ultima": "06/05/2024 11:40",
+        "mix": [4, 1] + [0] * (len(app.DUVIDA_OPCOES) - 2),
+    }
+    # Uma ligação só: sem intervalo nem taxa
+    assert davi["janelas"] == 1 and davi["ligacoes_por_hora"] is None and davi["intervalo_medio_min"] is None
+
+    # Pausa maior junta as duas janelas (a pausa de 2 h passa a contar como tempo ativo)
+    carla = admin_client.get("/api/stats/produtividade?start=2024-05-06&end=2024-05-06&pausa=180").json()["atendentes"][0]
+    assert carla["janelas"] == 1 and carla["horas_ativas"] == 2.67
+
+    assert admin_client.get("/api/stats/produtividade?pausa=0").status_code == 400
+    assert atendente_client.get("/api/stats/produtividade").status_code == 403
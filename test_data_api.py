@@ -0,0 +1,47 @@
+"""
+Testes da API de dados em NDJSON (/api/data/ligacoes.ndjson)
+"""
+import json
+
+import app as app_module
+from conftest import cadastrar
+
+
+def _linhas(r):
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    return [json.loads(l) for l in r.text.splitlines()]
+
+
+def test_ndjson_campos_crus_e_datas_iso(admin_client):
+    cadastrar(admin_client, observacao="ndjson-campos", cro="CRO/RS 777")
+    registro = next(l for l in _linhas(admin_client.get("/api/data/ligacoes.ndjson")) if l["observacao"] == "ndjson-campos")
+    assert registro["cro"] == "CRO/RS 777"
+    assert registro["created_at"].endswith("+00:00")
+    assert registro["deleted_at"] is None
+    assert isinstance(registro["id"], int)
+
+
+def test_shards_cobrem_todos_os_ids(admin_client):
+    for i in range(5):
+        cadastrar(admin_client, observacao=f"ndjson-shard-{i}")
+    todos = [l["id"] for l in _linhas(admin_client.get("/api/data/ligacoes.ndjson"))]
+
+    plano = admin_client.get("/api/data/ligacoes/shards?n=3").json()
+    assert len(plano["shards"]) <= 3
+    ids = []
+    for shard in plano["shards"]:
+        ids += [l["id"] for l in _linhas(admin_client.get(shard["url"]))]
+    assert ids == todos
+
+
+def test_token_de_api(anon_client, monkeypatch):
+    monkeypatch.setattr(app_module, "DATA_API_TOKEN", "segredo")
+    assert anon_client.get("/api/data/ligacoes.ndjson").status_code == 401
+    assert anon_client.get("/api/data/ligacoes.ndjson", headers={"Authorization": "Bearer errado"}).status_code == 401
+    r = anon_client.get("/api/data/ligacoes.ndjson", headers={"Authorization": "Bearer segredo"})
+    assert r.status_code == 200
+
+
+def test_parametro_invalido(admin_client):
+    assert admin_client.get("/api/data/ligacoes.ndjson?desde_id=abc").status_code == 400
@@ -0,0 +1,45 @@
+"""
+Testes da exportação em Excel (/api/export/xlsx)
+"""
+import io
+from datetime import datetime
+
+from openpyxl import load_workbook
+
+import app as app_module
+from conftest import cadastrar
+
+
+def _abrir(r):
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith(
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+    return load_workbook(io.BytesIO(r.content)).active
+
+
+def test_xlsx_detalhado_com_datas_nativas(admin_client):
+    cadastrar(admin_client, duvida=app_module.DUVIDA_OPCOES[1], observacao="xlsx-detalhado", cro="CRO/RS 321")
+    hoje = datetime.now(app_module.TZ).date().isoformat()
+
+    ws = _abrir(admin_client.get(f"/api/export/xlsx?tipo=detalhado&start={hoje}&end={hoje}"))
+    linhas = list(ws.iter_rows(values_only=True))
+    assert linhas[0] == ("ID", "CRO", "Nome Inscrito", "Dúvida", "Observação", "Atendente", "Data/Hora")
+    linha = next(l for l in linhas[1:] if l[4] == "xlsx-detalhado")
+    assert linha[1] == "CRO/RS 321"
+    assert isinstance(linha[6], datetime)
+    assert linha[6].date().isoformat() == hoje
+
+
+def test_xlsx_por_duvida_respeita_filtro(admin_client):
+    cadastrar(admin_client, duvida=app_module.DUVIDA_OPCOES[2])
+    tipo = app_module.DUVIDA_OPCOES[2]
+
+    ws = _abrir(admin_client.get("/api/export/xlsx", params={"tipo": "por_duvida", "tipos": tipo}))
+    linhas = list(ws.iter_rows(values_only=True))
+    assert linhas[0] == ("Tipo de Dúvida", "Quantidade", "Percentual")
+    assert [l[0] for l in linhas[1:]] == [tipo]
+    assert linhas[1][2] == 1
+
+
+def test_xlsx_exige_acesso_aos_relatorios(atendente_client):
+    assert atendente_client.get("/api/export/xlsx").status_code == 403
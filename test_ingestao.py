@@ -0,0 +1,143 @@
+"""
+Testes da ingestão em lote pela central telefônica (POST /api/ligacoes/batch)
+"""
+from datetime import datetime, timedelta, timezone
+
+from fastapi.testclient import TestClient
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+
+import app as app_module
+
+
+def _item(**campos):
+    item = {"cro": "CRO/RS 4242", "nome_inscrito": "Inscrito da Central", "duvida": app_module.DUVIDA_OPCOES[0]}
+    item.update(campos)
+    return item
+
+
+def _contar(observacao):
+    with app_module.engine.connect() as conn:
+        return conn.execute(
+            select(func.count()).select_from(app_module.Ligacao).where(app_module.Ligacao.observacao == observacao)
+        ).scalar()
+
+
+def test_token_da_central(monkeypatch):
+    monkeypatch.setattr(app_module, "INGEST_API_TOKEN", "segredo-central")
+    client = TestClient(app_module.app)
+    assert client.post("/api/ligacoes/batch", json=[_item()]).status_code == 401
+    assert client.post("/api/ligacoes/batch", json=[_item()],
+                       headers={"Authorization": "Bearer errado"}).status_code == 401
+
+    r = client.post("/api/ligacoes/batch", headers={"Authorization": "Bearer segredo-central"},
+                    json=[_item(observacao="ingestao-token", atendente="Ramal 201")])
+    assert r.status_code == 200
+    with app_module.engine.connect() as conn:
+        ligacao = conn.execute(select(app_module.Ligacao).where(app_module.Ligacao.id == r.json()["resultados"][0]["id"])).one()
+    assert ligacao.atendente == "Ramal 201"
+
+
+def test_resultado_por_item_e_reenvio_idempotente(atendente_client):
+    itens = [
+        _item(chave="ingestao-a", observacao="ingestao-lote", created_at="2025-10-20T13:05:00Z"),
+        _item(duvida="Dúvida inexistente", observacao="ingestao-lote"),
+        _item(chave="ingestao-a", observacao="ingestao-lote"),
+        _item(observacao="ingestao-lote"),
+        _item(cro="", observacao="ingestao-lote"),
+        "não é objeto",
+    ]
+    r = atendente_client.post("/api/ligacoes/batch", json=itens)
+    assert r.status_code == 200
+    corpo = r.json()
+    assert (corpo["recebidas"], corpo["criadas"], corpo["duplicadas"], corpo["invalidas"]) == (6, 2, 1, 3)
+    status = [res["status"] for res in corpo["resultados"]]
+    assert status == ["criada", "invalida", "duplicada", "criada", "invalida", "invalida"]
+    assert corpo["resultados"][2]["id"] == corpo["resultados"][0]["id"]
+    assert "dúvida inválida" in corpo["resultados"][1]["erro"]
+    assert _contar("ingestao-lote") == 2
+
+    # Reenvio (timeout na central): o item com chave não é gravado de novo
+    reenvio = atendente_client.post("/api/ligacoes/batch", json=itens[:1]).json()
+    assert reenvio["resultados"] == [{"indice": 0, "status": "duplicada", "id": corpo["resultados"][0]["id"]}]
+    assert _contar("ingestao-lote") == 2
+
+    with app_module.engine.connect() as conn:
+        ligacao = conn.execute(select(app_module.Ligacao).where(app_module.Ligacao.id == corpo["resultados"][0]["id"])).one()
+    assert ligacao.atendente == app_module.get_user_full_name("andreflores")
+
+
+def test_so_central_e_administrador_informam_created_at(admin_client, atendente_client, monkeypatch):
+    monkeypatch.setattr(app_module, "INGEST_API_TOKEN", "segredo-central")
+    item = _item(observacao="ingestao-retroativa", created_at="2021-03-10T13:05:00Z")
+
+    def created_at(resposta):
+        assert resposta.status_code == 200
+        ligacao_id = resposta.json()["resultados"][0]["id"]
+        with app_module.engine.connect() as conn:
+            return conn.execute(select(app_module.Ligacao.created_at).where(app_module.Ligacao.id == ligacao_id)).scalar()
+
+    # Atendente comum não lança ligação em período passado: vale o horário do recebimento
+    agora = datetime.now(timezone.utc).replace(tzinfo=None)
+    assert abs(created_at(atendente_client.post("/api/ligacoes/batch", json=[item])) - agora) < timedelta(minutes=1)
+
+    esperado = "10/03/2021 10:05"
+    assert app_module.format_sp(created_at(admin_client.post("/api/ligacoes/batch", json=[item]))) == esperado
+    central = TestClient(app_module.app).post("/api/ligacoes/batch", json=[item],
+                                               headers={"Authorization": "Bearer segredo-central"})
+    assert app_module.format_sp(created_at(central)) == esperado
+
+
+def test_retroativas_aparecem_como_inclusao_no_feed(admin_client, monkeypatch):
+    monkeypatch.setattr(app_module, "CHANGES_SAFETY_LAG_SECONDS", 0)
+    cursor, has_more = None, True
+    while has_more:
+        corpo = admin_client.get("/api/changes", params={"limit": 10000, **({"since": cursor} if cursor else {})}).json()
+        cursor, has_more = corpo["cursor"], corpo["has_more"]
+
+    item = _item(observacao="ingestao-feed", created_at="2022-09-12T13:05:00Z")
+    assert admin_client.post("/api/ligacoes/batch", json=[item]).json()["criadas"] == 1
+
+    mudancas = admin_client.get("/api/changes", params={"since": cursor}).json()["changes"]
+    assert [(m["op"], m["observacao"]) for m in mudancas] == [("insert", "ingestao-feed")]
+
+
+def test_conflito_que_persiste_fica_no_resultado_do_item(admin_client, monkeypatch):
+    gravar = app_module._gravar_ingestao
+
+    def gravar_com_conflito(validos):
+        if len(validos) > 1 or validos[0][2]["observacao"] == "ingestao-conflito":
+            raise IntegrityError("INSERT", {}, Exception("chave repetida"))
+        return gravar(validos)
+
+    monkeypatch.setattr(app_module, "_gravar_ingestao", gravar_com_conflito)
+    r = admin_client.post("/api/ligacoes/batch", json=[
+        _item(observacao="ingestao-sem-conflito"), _item(observacao="ingestao-conflito"),
+    ])
+    assert r.status_code == 200
+    corpo = r.json()
+    assert (corpo["criadas"], corpo["erros"]) == (1, 1)
+    assert [res["status"] for res in corpo["resultados"]] == ["criada", "erro"]
+    assert _contar("ingestao-sem-conflito") == 1
+
+
+def test_ingestao_aparece_nos_relatorios_e_termos(admin_client):
+    d1 = app_module.DUVIDA_OPCOES[1]
+    filtro = f"start=2023-08-14&end=2023-08-14&tipos={d1}"
+    antes = admin_client.get(f"/api/stats/por_duvida?{filtro}").json()["total"]
+
+    itens = [_item(duvida=d1, observacao="protocolo ingestaotermo", created_at="2023-08-14T15:00:00+00:00")] * 3
+    assert admin_client.post("/api/ligacoes/batch", json=itens).json()["criadas"] == 3
+
+    assert admin_client.get(f"/api/stats/por_duvida?{filtro}").json()["total"] == antes + 3
+    top = admin_client.get(f"/api/termos/top?{filtro}").json()
+    assert dict(zip(top["labels"], top["counts"]))["ingestaotermo"] == 3
+
+
+def test_limites_do_batch(admin_client, monkeypatch):
+    monkeypatch.setattr(app_module, "INGEST_MAX_ITEMS", 2)
+    assert admin_client.post("/api/ligacoes/batch", json=[_item()] * 3).status_code == 400
+    assert admin_client.post("/api/ligacoes/batch", json={"cro": "x"}).status_code == 422
+    futuro = admin_client.post("/api/ligacoes/batch", json=[_item(created_at="2999-01-01T00:00:00")]).json()
+    assert futuro["resultados"][0]["erro"] == "'created_at' está no futuro"
+    assert TestClient(app_module.app).post("/api/ligacoes/batch", json=[_item()]).status_code == 401
@@ -0,0 +1,65 @@
+"""
+Testes das operações em lote (/api/ligacoes/lote/*)
+"""
+from sqlalchemy import select
+
+import app as app_module
+from conftest import cadastrar
+
+
+def _ultimos_ids(n):
+    with app_module.engine.connect() as conn:
+        return sorted(conn.execute(
+            select(app_module.Ligacao.id).order_by(app_module.Ligacao.id.desc()).limit(n)
+        ).scalars())
+
+
+def _linha(id_):
+    with app_module.engine.connect() as conn:
+        return conn.execute(select(app_module.Ligacao.__table__).where(app_module.Ligacao.id == id_)).one()
+
+
+def test_excluir_em_lote_conta_so_as_ativas(admin_client):
+    for i in range(3):
+        cadastrar(admin_client, observacao=f"lote-excluir-{i}")
+    ids = _ultimos_ids(3)
+    total = admin_client.get("/api/stats/total").json()
+
+    r = admin_client.post("/api/ligacoes/lote/excluir", data={"ids": ids})
+    assert r.status_code == 200
+    assert r.json() == {"solicitadas": 3, "afetadas": 3}
+    assert all(_linha(i).deleted_at is not None for i in ids)
+    assert _linha(ids[0]).updated_at >= _linha(ids[0]).deleted_at
+    # Já excluídas não contam de novo
+    assert admin_client.post("/api/ligacoes/lote/excluir", data={"ids": ids}).json()["afetadas"] == 0
+    assert admin_client.get("/api/stats/total").json() == total
+
+
+def test_reclassificar_por_ids_e_por_filtro_invalida_o_cache(admin_client):
+    d0, d3, d4 = app_module.DUVIDA_OPCOES[0], app_module.DUVIDA_OPCOES[3], app_module.DUVIDA_OPCOES[4]
+    for _ in range(2):
+        cadastrar(admin_client, duvida=d0, observacao="lote-reclassificar")
+    ids = _ultimos_ids(2)
+    antes = admin_client.get("/api/stats/por_duvida").json()
+    n_d3 = antes["counts"][antes["labels"].index(d3)] if d3 in antes["labels"] else 0
+
+    r = admin_client.post("/api/ligacoes/lote/reclassificar", data={"ids": ids, "duvida": d3})
+    assert r.json() == {"afetadas": 2}
+    depois = admin_client.get("/api/stats/por_duvida").json()
+    assert depois["counts"][depois["labels"].index(d3)] == n_d3 + 2
+
+    r = admin_client.post("/api/ligacoes/lote/reclassificar", data={
+        "tipos": d3, "atendente_atual": "Igor Ricardo de Souza Sansone", "duvida": d4, "atendente": "Ana Lote",
+    })
+    assert r.json()["afetadas"] >= 2
+    assert _linha(ids[0]).duvida == d4 and _linha(ids[0]).atendente == "Ana Lote"
+
+
+def test_lote_valida_permissao_e_criterios(admin_client, atendente_client):
+    assert atendente_client.post("/api/ligacoes/lote/excluir", data={"ids": [1]}).status_code == 403
+    # Sem ids nem filtro: recusado para não alterar a tabela inteira
+    assert admin_client.post("/api/ligacoes/lote/reclassificar",
+                             data={"duvida": app_module.DUVIDA_OPCOES[1]}).status_code == 400
+    assert admin_client.post("/api/ligacoes/lote/reclassificar", data={"ids": [1]}).status_code == 400
+    assert admin_client.post("/api/ligacoes/lote/reclassificar",
+                             data={"start": "ontem", "duvida": app_module.DUVIDA_OPCOES[1]}).status_code == 400
@@ -0,0 +1,166 @@
+"""
+Testes do arquivamento de eleições encerradas (manutencao.py arquivar + ?historico=1)
+"""
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine, func, insert, select, text
+from sqlalchemy.schema import CreateTable
+
+import app as app_module
+import manutencao
+from conftest import cadastrar
+
+
+def _contar(tabela, **filtro):
+    with app_module.engine.connect() as conn:
+        query = select(func.count()).select_from(tabela)
+        for coluna, valor in filtro.items():
+            query = query.where(tabela.c[coluna] == valor)
+        return conn.execute(query).scalar()
+
+
+def test_arquivar_move_em_lotes_e_historico_inclui(admin_client):
+    antigas = [
+        dict(cro="CRO/RS 2020", nome_inscrito="Eleição antiga", duvida=app_module.DUVIDA_OPCOES[0],
+             created_at=datetime(2020, 10, d, 15), updated_at=datetime(2020, 10, d, 15))
+        for d in range(1, 8)
+    ]
+    with app_module.engine.begin() as conn:
+        conn.execute(insert(app_module.Ligacao.__table__), antigas)
+
+    filtro = "/api/stats/cube?dims=duvida&start=2020-01-01&end=2020-12-31"
+    assert admin_client.get(filtro).json()["total"] == 7
+
+    assert manutencao.arquivar(date(2020, 12, 31), lote=3) == 7
+    assert _contar(app_module.Ligacao.__table__, cro="CRO/RS 2020") == 0
+    assert _contar(app_module.LigacaoArquivo.__table__, cro="CRO/RS 2020") == 7
+
+    assert admin_client.get(filtro).json()["total"] == 0
+    assert admin_client.get(filtro + "&historico=1").json()["total"] == 7
+    linhas = admin_client.get("/api/data/ligacoes.ndjson?historico=1&start=2020-01-01&end=2020-12-31").text.splitlines()
+    assert len(linhas) == 7
+
+
+def test_arquivar_nao_toca_no_periodo_corrente(admin_client):
+    cadastrar(admin_client, observacao="periodo-corrente")
+    manutencao.arquivar(date(2021, 1, 1))
+    assert _contar(app_module.Ligacao.__table__, observacao="periodo-corrente") == 1
+
+
+def test_ids_nao_sao_reaproveitados_depois_de_arquivar(admin_client):
+    with app_module.engine.begin() as conn:
+        conn.execute(insert(app_module.Ligacao.__table__), [dict(
+            id=9_000_000, cro="CRO/RS id-alto", nome_inscrito="x", duvida=app_module.DUVIDA_OPCOES[0],
+            created_at=datetime(2020, 11, 5, 15), updated_at=datetime(2020, 11, 5, 15),
+        )])
+    manutencao.arquivar(date(2020, 12, 31))
+    assert _contar(app_module.LigacaoArquivo.__table__, cro="CRO/RS id-alto") == 1
+
+    cadastrar(admin_client, observacao="depois-de-arquivar")
+    with app_module.engine.connect() as conn:
+        novo = conn.execute(select(app_module.Ligacao.id).where(app_module.Ligacao.observacao == "depois-de-arquivar")).scalar()
+    assert novo > 9_000_000
+
+
+def test_ligacoes_legada_ganha_autoincrement(tmp_path):
+    legado = create_engine(f"sqlite:///{tmp_path / 'legado.db'}")
+    ddl = str(CreateTable(app_module.Ligacao.__table__).compile(legado)).replace(" AUTOINCREMENT", "")
+    with legado.begin() as conn:
+        conn.execute(text(ddl))
+        for indice in app_module.Ligacao.__table__.indexes:
+            indice.create(bind=conn)
+        app_module.LigacaoArquivo.__table__.create(bind=conn)
+        linha = dict(cro="x", nome_inscrito="x", duvida=app_module.DUVIDA_OPCOES[0], created_at=datetime(2022, 1, 3))
+        conn.execute(insert(app_module.Ligacao.__table__), [dict(linha, id=5)])
+        conn.execute(insert(app_module.LigacaoArquivo.__table__), [dict(linha, id=40)])
+
+        manutencao._garantir_autoincrement_sqlite(conn)
+        manutencao._garantir_autoincrement_sqlite(conn)
+
+        assert conn.execute(select(func.count()).select_from(app_module.Ligacao.__table__)).scalar() == 1
+        novo = conn.execute(insert(app_module.Ligacao.__table__).values(**linha)).inserted_primary_key[0]
+        assert novo == 41
+        ddl = conn.execute(text("SELECT sql FROM sqlite_master WHERE name = 'ligacoes'")).scalar()
+    assert "AUTOINCREMENT" in ddl
+
+
+def test_purgar_apaga_so_excluidas_fora_da_retencao(monkeypatch):
+    monkeypatch.setattr(app_module, "PURGE_PAUSE_SECONDS", 0)
+    agora = datetime.now(timezone.utc).replace(tzinfo=None)
+    tabela = app_module.Ligacao.__table__
+    registros = [
+        dict(cro="CRO/RS purga-velha", nome_inscrito="x", duvida=app_module.DUVIDA_OPCOES[0],
+             created_at=agora - timedelta(days=200), deleted_at=agora - timedelta(days=100)),
+        dict(cro="CRO/RS purga-recente", nome_inscrito="x", duvida=app_module.DUVIDA_OPCOES[0],
+             created_at=agora - timedelta(days=200), deleted_at=agora - timedelta(days=10)),
+        dict(cro="CRO/RS purga-ativa", nome_inscrito="x", duvida=app_module.DUVIDA_OPCOES[0],
+             created_at=agora - timedelta(days=200), deleted_at=None),
+    ]
+    with app_module.engine.begin() as conn:
+        conn.execute(insert(tabela), registros * 3)
+
+    resultado = app_module.purgar_excluidas(dias=90, lote=2)
+    assert resultado["apagadas"] >= 3
+    assert _contar(tabela, cro="CRO/RS purga-velha") == 0
+    assert _contar(tabela, cro="CRO/RS purga-recente") == 3
+    assert _contar(tabela, cro="CRO/RS purga-ativa") == 3
+    assert "ligacoes_purged_rows_total" in app_module.METRICS.render()
+
+
+def test_importar_ndjson_grava_e_indexa_termos(admin_client, tmp_path):
+    d0 = app_module.DUVIDA_OPCOES[0]
+    arquivo = tmp_path / "ligacoes.ndjson"
+    arquivo.write_text("\n".join([
+        '{"id": 99, "cro": "CRO/RS imp-1", "nome_inscrito": "A", "duvida": "%s", "observacao": "importacaoteste",'
+        ' "atendente": "Ana", "created_at": "2019-03-04T12:00:00+00:00", "deleted_at": null}' % d0,
+        '{"cro": "CRO/RS imp-2", "nome_inscrito": "B", "duvida": "%s", "observacao": "importacaoteste",'
+        ' "created_at": "2019-03-04T13:00:00", "deleted_at": "2019-03-05T10:00:00"}' % d0,
+        "",
+    ]), encoding="utf-8")
+    antes = admin_client.get("/api/stats/total?start=2019-03-01&end=2019-03-31").json()
+
+    manutencao.importar(str(arquivo), lote=1)
+    assert _contar(app_module.Ligacao.__table__, observacao="importacaoteste") == 2
+    assert admin_client.get("/api/stats/total?start=2019-03-01&end=2019-03-31").json() != antes
+    top = admin_client.get("/api/termos/top?start=2019-03-01&end=2019-03-31").json()
+    assert dict(zip(top["labels"], top["counts"]))["importacaoteste"] == 1  # a excluída não entra no índice
+
+    arquivo.write_text('{"cro": "x", "nome_inscrito": "x", "duvida": "inexistente", "created_at": "2019-03-04"}\n')
+    with pytest.raises(SystemExit):
+        manutencao.importar(str(arquivo), lote=1)
+
+
+def test_importadas_aparecem_no_feed_de_quem_ja_sincronizou(admin_client, tmp_path, monkeypatch):
+    monkeypatch.setattr(app_module, "CHANGES_SAFETY_LAG_SECONDS", 0)
+    # Cliente que já sincronizou tudo
+    cursor, has_more = None, True
+    while has_more:
+        corpo = admin_client.get("/api/changes", params={"limit": 10000, **({"since": cursor} if cursor else {})}).json()
+        cursor, has_more = corpo["cursor"], corpo["has_more"]
+
+    arquivo = tmp_path / "antigas.ndjson"
+    arquivo.write_text(
+        '{"cro": "CRO/RS imp-feed", "nome_inscrito": "A", "duvida": "%s", "observacao": "importacao-feed",'
+        ' "created_at": "2021-06-01T12:00:00+00:00", "updated_at": "2021-06-01T12:00:00+00:00"}\n'
+        % app_module.DUVIDA_OPCOES[0], encoding="utf-8")
+    manutencao.importar(str(arquivo), lote=10)
+
+    mudancas = admin_client.get("/api/changes", params={"since": cursor}).json()["changes"]
+    # created_at histórico e updated_at da importação: continua sendo uma inclusão
+    assert [(m["op"], m["observacao"]) for m in mudancas] == [("insert", "importacao-feed")]
+
+    r = admin_client.post(f"/editar/{mudancas[0]['id']}", data={
+        "cro": "CRO/RS imp-feed", "nome_inscrito": "Editado", "duvida": app_module.DUVIDA_OPCOES[0],
+        "observacao": "importacao-feed",
+    }, follow_redirects=False)
+    assert r.status_code == 303
+    mudancas = admin_client.get("/api/changes", params={"since": cursor}).json()["changes"]
+    assert [(m["op"], m["nome_inscrito"]) for m in mudancas] == [("update", "Editado")]
+
+
+def test_campos_do_copy_distinguem_nulo_de_texto():
+    assert app_module._campo_copy(None) == ""
+    assert app_module._campo_copy("") == '""'
+    assert app_module._campo_copy("\\N") == '"\\N"'
+    assert app_module._campo_copy('diz "oi"') == '"diz ""oi"""'
@@ -0,0 +1,35 @@
+"""
+Testes do endpoint /metrics (formato Prometheus)
+"""
+import app
+from conftest import cadastrar
+
+
+def test_metrics_expoe_latencia_status_e_sql_por_rota(admin_client):
+    cadastrar(admin_client)
+    admin_client.get("/api/stats/por_duvida")
+
+    r = admin_client.get("/metrics")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain")
+    corpo = r.text
+
+    assert '# TYPE ligacoes_http_request_duration_seconds histogram' in corpo
+    assert 'ligacoes_http_requests_total{route="/api/stats/por_duvida",method="GET",status="200"}' in corpo
+    assert 'ligacoes_http_request_duration_seconds_bucket{route="/cadastrar",method="POST",le="+Inf"}' in corpo
+    assert 'ligacoes_db_queries_total{route="/cadastrar"}' in corpo
+    assert 'ligacoes_db_query_duration_seconds_count{route="/api/stats/por_duvida"}' in corpo
+    assert f"ligacoes_active_sessions {len(app.active_sessions)}" in corpo
+
+
+def test_metrics_registra_tempo_de_exportacao(admin_client):
+    admin_client.get("/api/export/csv?tipo=detalhado")
+    corpo = admin_client.get("/metrics").text
+    assert 'ligacoes_export_render_duration_seconds_count{formato="csv",tipo="detalhado"}' in corpo
+
+
+def test_metrics_exige_token_quando_configurado(anon_client, monkeypatch):
+    monkeypatch.setattr(app, "METRICS_TOKEN", "segredo")
+    assert anon_client.get("/metrics").status_code == 401
+    r = anon_client.get("/metrics", headers={"Authorization": "Bearer segredo"})
+    assert r.status_code == 200
@@ -0,0 +1,44 @@
+"""
+Testes do "Meu dia" do atendente (/api/meu_dia)
+"""
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func, select
+
+import app as app_module
+from conftest import cadastrar
+
+
+def test_conta_so_as_ligacoes_de_hoje_do_proprio_atendente(atendente_client, admin_client):
+    antes = atendente_client.get("/api/meu_dia").json()
+    d0, d2 = app_module.DUVIDA_OPCOES[0], app_module.DUVIDA_OPCOES[2]
+    cadastrar(atendente_client, duvida=d2)
+    cadastrar(atendente_client, duvida=d2)
+    cadastrar(atendente_client, duvida=d0)
+    with app_module.engine.connect() as conn:
+        ultimo_do_atendente = conn.execute(select(func.max(app_module.Ligacao.id))).scalar()
+    cadastrar(admin_client, duvida=d0)
+
+    # Ligação de ontem do mesmo atendente não entra
+    db = app_module.SessionLocal()
+    try:
+        db.add(app_module.Ligacao(cro="CRO/RS 1", nome_inscrito="Ontem", duvida=d0, atendente=antes["atendente"],
+                                  created_at=datetime.now(timezone.utc) - timedelta(days=1, hours=1)))
+        db.commit()
+    finally:
+        db.close()
+
+    dados = atendente_client.get("/api/meu_dia").json()
+    assert dados["atendente"] == "André Nunes Flores"
+    assert dados["total"] == antes["total"] + 3
+    por_duvida = {item["duvida"]: item["count"] for item in dados["por_duvida"]}
+    antes_por_duvida = {item["duvida"]: item["count"] for item in antes["por_duvida"]}
+    assert por_duvida[d2] == antes_por_duvida.get(d2, 0) + 2
+
+    # Excluída sai da contagem
+    assert admin_client.post(f"/excluir/{ultimo_do_atendente}", follow_redirects=False).status_code == 303
+    assert atendente_client.get("/api/meu_dia").json()["total"] == dados["total"] - 1
+
+
+def test_exige_login(anon_client):
+    assert anon_client.get("/api/meu_dia").status_code == 401
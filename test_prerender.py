@@ -0,0 +1,74 @@
+"""
+Testes dos relatórios pré-gerados (PRERENDER_DIR) servidos por /api/export/csv|pdf
+"""
+import os
+from datetime import datetime
+
+import app as app_module
+from conftest import cadastrar
+
+FORA_DE_PICO = datetime(2025, 10, 20, 3, 0, tzinfo=app_module.TZ)
+PICO = datetime(2025, 10, 20, 14, 0, tzinfo=app_module.TZ)
+
+
+def test_servido_enquanto_confere_e_refeito_quando_os_dados_mudam(admin_client):
+    cadastrar(admin_client, observacao="pre-gerado")
+    app_module.pre_gerar_relatorios(forcar=True)
+
+    r = admin_client.get("/api/export/csv?tipo=detalhado")
+    assert r.status_code == 200
+    assert "X-Prerendered-At" in r.headers
+    assert r.headers["content-type"].startswith("text/csv")
+    assert "attachment" in r.headers["content-disposition"]
+    assert "pre-gerado" in r.text
+    assert "X-Prerendered-At" in admin_client.get("/api/export/pdf?tipo=por_duvida").headers
+
+    # Filtros diferentes dos pré-gerados: gerado na hora
+    d0 = app_module.DUVIDA_OPCOES[0]
+    assert "X-Prerendered-At" not in admin_client.get(f"/api/export/csv?tipo=detalhado&tipos={d0}").headers
+    assert "X-Prerendered-At" not in admin_client.get("/api/export/csv?tipo=detalhado&historico=1").headers
+
+    # Nova ligação: o arquivo deixa de conferir e a exportação sai atualizada
+    cadastrar(admin_client, observacao="depois-da-geracao")
+    r = admin_client.get("/api/export/csv?tipo=detalhado")
+    assert "X-Prerendered-At" not in r.headers
+    assert "depois-da-geracao" in r.text
+
+    # No horário de pico só os períodos encerrados são refeitos
+    hoje = datetime.now(app_module.TZ).replace(hour=14)
+    r = app_module.pre_gerar_relatorios(agora=hoje)
+    assert "detalhado_inicio_fim.csv" in r["adiados"]
+    r = app_module.pre_gerar_relatorios(agora=hoje.replace(hour=3))
+    assert "detalhado_inicio_fim.csv" in r["gerados"]
+    r = admin_client.get("/api/export/csv?tipo=detalhado")
+    assert "X-Prerendered-At" in r.headers
+    assert "depois-da-geracao" in r.text
+
+
+def test_sem_arquivo_pre_gerado_nao_consulta_a_impressao(admin_client, monkeypatch):
+    def impressao(*args):
+        raise AssertionError("impressão calculada sem arquivo pré-gerado")
+
+    monkeypatch.setattr(app_module, "_impressao_dados", impressao)
+    r = admin_client.get("/api/export/csv?tipo=detalhado&start=2023-02-06&end=2023-02-07")
+    assert r.status_code == 200
+    assert "X-Prerendered-At" not in r.headers
+
+
+def test_so_refaz_o_que_mudou_e_remove_dias_anteriores(admin_client):
+    app_module.pre_gerar_relatorios(agora=FORA_DE_PICO)
+    assert app_module.pre_gerar_relatorios(agora=FORA_DE_PICO)["gerados"] == []
+
+    # Na quarta, ontem (21/10) é período encerrado: gerado mesmo no pico; a semana espera
+    # e o "ontem" de segunda (19/10) sai
+    r = app_module.pre_gerar_relatorios(agora=PICO.replace(day=22))
+    assert "por_duvida_2025-10-21_2025-10-21.pdf" in r["gerados"]
+    assert "por_duvida_2025-10-20_2025-10-22.pdf" in r["adiados"]
+    assert "por_duvida_2025-10-19_2025-10-19.pdf" in r["removidos"]
+    assert not os.path.exists(os.path.join(app_module.PRERENDER_DIR, "por_duvida_2025-10-19_2025-10-19.pdf"))
+
+
+def test_horas_fora_de_pico():
+    assert app_module._horas_fora_de_pico("0-6") == set(range(0, 7))
+    assert app_module._horas_fora_de_pico("22-2") == {22, 23, 0, 1, 2}
+    assert app_module._horas_fora_de_pico("3") == {3}
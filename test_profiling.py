@@ -0,0 +1,59 @@
+"""
+Testes do profiling sob demanda (?_profile=...)
+"""
+import json
+import os
+
+import app
+from conftest import cadastrar
+
+
+def test_profile_json_substitui_resposta_e_resume_sql(admin_client):
+    cadastrar(admin_client)
+    r = admin_client.get("/api/stats/por_atendente?start=2020-01-01&_profile=json")
+    assert r.status_code == 200
+    perfil = r.json()
+    assert perfil["rota"] == "/api/stats/por_atendente"
+    assert perfil["sql"]["total"] >= 1
+    assert any("FROM ligacoes" in q["sql"] for q in perfil["sql"]["queries"])
+    assert any("stats_por_atendente" in f["funcao"] for f in perfil["top_funcoes"])
+    assert "labels" not in perfil
+
+
+def test_profile_folded_por_header(admin_client):
+    r = admin_client.get("/api/export/pdf?tipo=por_duvida", headers={"X-Profile": "folded"})
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain")
+
+
+def test_profile_salvar_grava_arquivos(admin_client, tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "PROFILE_DIR", str(tmp_path))
+    r = admin_client.get("/api/stats/por_duvida?_profile=salvar")
+    assert r.status_code == 200
+    assert "labels" in r.json()
+    profile_id = r.headers["X-Profile-Id"]
+    for ext in ("json", "folded", "prof"):
+        assert os.path.isfile(tmp_path / f"{profile_id}.{ext}")
+    assert profile_id in admin_client.get("/api/profiles").json()["profiles"]
+    assert admin_client.get(f"/api/profiles/{profile_id}.json").status_code == 200
+
+
+def test_profile_ignorado_para_nao_administrador(atendente_client):
+    r = atendente_client.get("/?_profile=json")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/html")
+
+
+def test_profile_consome_exportacao_em_streaming(admin_client, tmp_path, monkeypatch):
+    cadastrar(admin_client, observacao="perfil-streaming")
+    perfil = admin_client.get("/api/export/csv?tipo=detalhado&_profile=json").json()
+    assert perfil["bytes_resposta"] > 0
+    # As queries da exportação rodam ao iterar o corpo: só aparecem se ele foi consumido no profiler
+    assert any("FROM ligacoes" in q["sql"] for q in perfil["sql"]["queries"])
+
+    # Salvando, o corpo consumido no profiler continua sendo entregue
+    monkeypatch.setattr(app, "PROFILE_DIR", str(tmp_path))
+    r = admin_client.get("/api/export/csv?tipo=detalhado&_profile=salvar")
+    assert "perfil-streaming" in r.text
+    salvo = json.loads((tmp_path / f"{r.headers['X-Profile-Id']}.json").read_text(encoding="utf-8"))
+    assert salvo["bytes_resposta"] == len(r.content)
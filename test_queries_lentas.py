@@ -0,0 +1,63 @@
+"""
+Testes do log de queries lentas
+"""
+import json
+from collections import OrderedDict
+
+import pytest
+from sqlalchemy import text
+
+import app
+from conftest import cadastrar
+
+
+def test_query_lenta_vai_para_log_e_pagina_admin(admin_client, tmp_path, monkeypatch):
+    log_path = tmp_path / "slow.log"
+    monkeypatch.setattr(app, "SLOW_QUERY_MS", 0)
+    monkeypatch.setattr(app, "SLOW_QUERY_LOG", str(log_path))
+    monkeypatch.setattr(app, "_slow_logger", None)
+    monkeypatch.setattr(app, "_slow_queries", {})
+    cadastrar(admin_client)
+
+    admin_client.get("/api/stats/por_atendente")
+
+    entradas = [json.loads(l) for l in log_path.read_text(encoding="utf-8").splitlines()]
+    select = next(e for e in entradas if e["route"] == "/api/stats/por_atendente")
+    assert select["sql"].lstrip().upper().startswith("SELECT")
+    assert "SCAN" in select["explain"]  # full scan em ligacoes
+    assert any(e["route"] == "/cadastrar" and e["explain"] is None for e in entradas)
+
+    r = admin_client.get("/admin/queries-lentas?ordem=max_ms")
+    assert r.status_code == 200
+    assert "/api/stats/por_atendente" in r.text
+
+
+def test_pagina_queries_lentas_restrita(atendente_client):
+    assert atendente_client.get("/admin/queries-lentas").status_code == 403
+
+
+def test_cache_de_planos_limitado(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "SLOW_QUERY_LOG", str(tmp_path / "slow.log"))
+    monkeypatch.setattr(app, "_slow_logger", None)
+    monkeypatch.setattr(app, "_slow_queries", {})
+    monkeypatch.setattr(app, "_explain_cache", OrderedDict())
+    monkeypatch.setattr(app, "SLOW_QUERY_MAX_STATEMENTS", 2)
+    with app.engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+        for n in range(5):
+            app._registrar_query_lenta(conn, f"SELECT {n} FROM ligacoes", (), False, 1.0, "/teste")
+    assert list(app._explain_cache) == ["SELECT 3 FROM ligacoes", "SELECT 4 FROM ligacoes"]
+
+
+def test_query_com_erro_nao_deixa_estado_na_conexao(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "SLOW_QUERY_MS", 0)
+    monkeypatch.setattr(app, "SLOW_QUERY_LOG", str(tmp_path / "slow.log"))
+    monkeypatch.setattr(app, "_slow_logger", None)
+    monkeypatch.setattr(app, "_slow_queries", {})
+    with app.engine.connect() as conn:
+        for _ in range(3):
+            with pytest.raises(Exception):
+                conn.execute(text("SELECT * FROM tabela_que_nao_existe"))
+        conn.execute(text("SELECT 42"))
+        assert not any(isinstance(v, list) for v in conn.info.values())
+    assert app._slow_queries["SELECT 42"]["max_ms"] < 1000
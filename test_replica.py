@@ -0,0 +1,77 @@
+"""
+Testes do roteamento de leituras para a réplica (DATABASE_READ_URL)
+
+A "réplica" é um segundo arquivo SQLite; a replicação é simulada copiando as linhas.
+"""
+import pytest
+from sqlalchemy import create_engine, delete, insert, select
+from sqlalchemy.orm import sessionmaker
+
+import app as app_module
+from conftest import cadastrar
+
+
+@pytest.fixture
+def replica(tmp_path, monkeypatch):
+    read_engine = create_engine(f"sqlite:///{tmp_path / 'replica.db'}", connect_args={"check_same_thread": False})
+    app_module.Base.metadata.create_all(bind=read_engine)
+    monkeypatch.setattr(app_module, "read_engine", read_engine)
+    monkeypatch.setattr(app_module, "ReadSessionLocal", sessionmaker(bind=read_engine))
+    monkeypatch.setattr(app_module, "READ_LAG_CHECK_INTERVAL_SECONDS", 0)
+    monkeypatch.setattr(app_module, "_replica_estado", {"verificado_em": None, "ok": False})
+    yield read_engine
+    read_engine.dispose()
+
+
+def _replicar(read_engine):
+    """Copia a tabela do primário para a réplica"""
+    tabela = app_module.Ligacao.__table__
+    with app_module.engine.connect() as conn:
+        linhas = [dict(r._mapping) for r in conn.execute(select(tabela))]
+    with read_engine.begin() as conn:
+        conn.execute(delete(tabela))
+        if linhas:
+            conn.execute(insert(tabela), linhas)
+
+
+def _total(client):
+    return client.get("/api/stats/cube?dims=duvida").json()["total"]
+
+
+def test_replica_em_dia_atende_os_relatorios(admin_client, replica):
+    cadastrar(admin_client, observacao="replica-1")
+    _replicar(replica)
+    total = _total(admin_client)
+
+    # Linha que só existe na réplica (com updated_at antigo) prova de onde veio a leitura
+    with replica.begin() as conn:
+        conn.execute(insert(app_module.Ligacao.__table__), [dict(
+            cro="só-na-réplica", nome_inscrito="x", duvida=app_module.DUVIDA_OPCOES[0],
+            created_at=app_module.datetime(2020, 1, 1), updated_at=app_module.datetime(2020, 1, 1),
+        )])
+    admin_client.cookies.delete(app_module.READ_YOUR_WRITES_COOKIE)
+    assert _total(admin_client) == total + 1
+
+
+def test_replica_atrasada_volta_para_o_primario(admin_client, replica):
+    cadastrar(admin_client)
+    # Réplica vazia: atraso infinito
+    admin_client.cookies.delete(app_module.READ_YOUR_WRITES_COOKIE)
+    with app_module.engine.connect() as conn:
+        total_primario = conn.execute(select(app_module.func.count()).select_from(app_module.Ligacao.__table__)).scalar()
+    assert _total(admin_client) == total_primario
+    assert 'ligacoes_db_read_routing_total{destino="primario",motivo="replica_atrasada"}' in app_module.METRICS.render()
+
+
+def test_leitura_apos_gravacao_usa_o_primario(admin_client, replica, monkeypatch):
+    monkeypatch.setattr(app_module, "READ_MAX_LAG_SECONDS", 10 ** 9)
+    _replicar(replica)
+    total_replica = _total(admin_client)
+
+    r = cadastrar(admin_client, observacao="ryw")
+    assert app_module.READ_YOUR_WRITES_COOKIE in r.cookies
+    # Com o cookie: lê do primário e já enxerga a própria gravação
+    assert _total(admin_client) == total_replica + 1
+    # Sem o cookie: réplica (ainda sem a gravação)
+    admin_client.cookies.delete(app_module.READ_YOUR_WRITES_COOKIE)
+    assert _total(admin_client) == total_replica
@@ -0,0 +1,48 @@
+"""
+Testes de /healthz e /readyz (aquecimento na subida)
+"""
+import app as app_module
+
+
+def _hits_cache():
+    linha = 'ligacoes_stats_cache_total{resultado="hit"}'
+    for l in app_module.METRICS.render().splitlines():
+        if l.startswith(linha):
+            return float(l.split()[-1])
+    return 0.0
+
+
+def test_healthz_responde_sem_login(anon_client):
+    r = anon_client.get("/healthz")
+    assert r.status_code == 200
+    assert r.json() == {"status": "ok"}
+
+
+def test_readyz_so_passa_depois_do_aquecimento(anon_client, monkeypatch):
+    monkeypatch.setitem(app_module._aquecimento, "pronto", False)
+    r = anon_client.get("/readyz")
+    assert r.status_code == 503
+    assert r.json()["status"] == "aquecendo"
+
+    sessoes = dict(app_module.active_sessions)
+    etapas = app_module.aquecer()
+    assert set(etapas) >= {"pool", "templates", "consulta", "caches"}
+    # O aquecimento não cria sessões
+    assert app_module.active_sessions == sessoes
+
+    r = anon_client.get("/readyz")
+    assert r.status_code == 200
+    corpo = r.json()
+    assert corpo["status"] == "pronto"
+    assert corpo["etapas"] == etapas
+    assert corpo["duracao_s"] >= 0
+
+
+def test_aquecimento_preenche_o_cache_dos_relatorios(admin_client):
+    app_module.aquecer()
+    hits = _hits_cache()
+    admin_client.get("/api/stats/por_duvida")
+    admin_client.get("/api/stats/produtividade?pausa=30")
+    admin_client.get("/api/stats/serie?periodo=dia&janela=7&max_points=300")
+    admin_client.get("/api/stats/comparativo_periodo?max_points=150&periodo=dia")
+    assert _hits_cache() == hits + 4
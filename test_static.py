@@ -0,0 +1,111 @@
+"""
+Testes do pipeline de arquivos estáticos (build_static.py + /static)
+"""
+import gzip
+import hashlib
+import json
+import os
+
+import pytest
+
+import app as app_module
+import build_static
+
+
+@pytest.fixture
+def static_tmp(tmp_path, monkeypatch):
+    """Pasta static/ isolada com um CSS que referencia uma fonte"""
+    (tmp_path / "css").mkdir()
+    (tmp_path / "fonts").mkdir()
+    (tmp_path / "fonts" / "icone.woff2").write_bytes(b"fonte-binaria")
+    (tmp_path / "css" / "site.css").write_text(
+        "@font-face{src:url(../fonts/icone.woff2?v=1) format('woff2')}\n" + "body{color:#333}\n" * 200)
+    (tmp_path / "vendor.json").write_text("{}")
+    monkeypatch.setattr(build_static, "STATIC_DIR", str(tmp_path))
+    monkeypatch.setattr(build_static, "DIST_DIR", str(tmp_path / "dist"))
+    monkeypatch.setattr(build_static, "VENDOR_FILE", str(tmp_path / "vendor.json"))
+    return tmp_path
+
+
+def test_build_gera_hash_reescreve_urls_e_comprime(static_tmp):
+    build_static.build()
+    dist = static_tmp / "dist"
+    manifest = json.loads((dist / "manifest.json").read_text())
+
+    assert set(manifest) == {"css/site.css", "fonts/icone.woff2"}
+    css = dist / manifest["css/site.css"]
+    fonte = manifest["fonts/icone.woff2"]
+    assert f"url(../{fonte}?v=1)" in css.read_text()
+    assert gzip.decompress((dist / (manifest["css/site.css"] + ".gz")).read_bytes()) == css.read_bytes()
+    # woff2 já é comprimido: não gera variante
+    assert not os.path.exists(dist / (fonte + ".gz"))
+
+
+def test_vendor_conferido_pelo_sha256(static_tmp):
+    biblioteca = static_tmp / "vendor" / "lib.js"
+    biblioteca.parent.mkdir()
+    biblioteca.write_bytes(b"console.log('lib');")
+    vendor = {"vendor/lib.js": {"url": "https://cdn.exemplo/lib.js", "sha256": None}}
+    (static_tmp / "vendor.json").write_text(json.dumps(vendor))
+
+    # Sem sha256 fixado: só avisa (o build segue), a menos que seja exigido
+    build_static.baixar()
+    with pytest.raises(build_static.VendorInvalido, match="sem sha256"):
+        build_static.baixar(exigir_sha256=True)
+    build_static.baixar(fixar=True)
+    fixado = json.loads((static_tmp / "vendor.json").read_text())["vendor/lib.js"]["sha256"]
+    assert fixado == hashlib.sha256(b"console.log('lib');").hexdigest()
+    build_static.baixar(exigir_sha256=True)
+
+    biblioteca.write_bytes(b"console.log('alterada');")
+    with pytest.raises(build_static.VendorInvalido, match="difere do fixado"):
+        build_static.baixar()
+
+
+def test_asset_usa_manifest_e_cai_na_cdn(monkeypatch):
+    monkeypatch.setattr(app_module, "_static_manifest", {"css/base.css": "css/base.abc123.css"})
+    monkeypatch.setattr(app_module, "_static_vendor", {"vendor/lib.js": {"url": "https://cdn.exemplo/lib.js", "sha256": "0" * 64}})
+    app_module.asset_url.cache_clear()
+    try:
+        assert app_module.asset_url("css/base.css") == "/static/dist/css/base.abc123.css"
+        assert app_module.asset_url("vendor/lib.js") == "https://cdn.exemplo/lib.js"
+        assert app_module.asset_url("logo-crors.png") == "/static/logo-crors.png"
+    finally:
+        app_module.asset_url.cache_clear()
+
+
+def test_dist_servido_pre_comprimido_e_imutavel(anon_client):
+    pasta = os.path.join(app_module.STATIC_DIR, "dist", "teste")
+    os.makedirs(pasta, exist_ok=True)
+    caminho = os.path.join(pasta, "app.0123456789.js")
+    conteudo = b"console.log('ok');\n" * 100
+    try:
+        with open(caminho, "wb") as f:
+            f.write(conteudo)
+        with open(caminho + ".gz", "wb") as f:
+            f.write(gzip.compress(conteudo, mtime=0))
+
+        r = anon_client.get("/static/dist/teste/app.0123456789.js", headers={"Accept-Encoding": "gzip"})
+        assert r.status_code == 200
+        assert r.headers["content-encoding"] == "gzip"
+        assert "immutable" in r.headers["cache-control"]
+        assert r.headers["content-type"].startswith("text/javascript")
+        assert r.content == conteudo
+
+        for recusa in ("gzip;q=0", "br, gzip; q=0", "*;q=0"):
+            r = anon_client.get("/static/dist/teste/app.0123456789.js", headers={"Accept-Encoding": recusa})
+            assert "content-encoding" not in r.headers
+            assert r.content == conteudo
+
+        r = anon_client.get("/static/logo-crors.png")
+        assert r.headers["cache-control"] == "no-cache"
+    finally:
+        for arquivo in (caminho, caminho + ".gz"):
+            os.remove(arquivo)
+        os.rmdir(pasta)
+
+
+def test_html_comprimido_com_gzip(anon_client):
+    r = anon_client.get("/login", headers={"Accept-Encoding": "gzip"})
+    assert r.status_code == 200
+    assert r.headers.get("content-encoding") == "gzip"
@@ -0,0 +1,86 @@
+"""
+Testes do índice de termos das observações (ligacoes_termos) e de /api/termos/*
+"""
+from sqlalchemy import select
+
+import app as app_module
+from conftest import cadastrar
+
+
+def _ultimo_id():
+    with app_module.engine.connect() as conn:
+        return conn.execute(select(app_module.Ligacao.id).order_by(app_module.Ligacao.id.desc()).limit(1)).scalar()
+
+
+def _indice():
+    t = app_module.LigacaoTermo.__table__
+    with app_module.engine.connect() as conn:
+        return sorted(conn.execute(select(t.c.dia, t.c.duvida, t.c.termo, t.c.contagem)).all())
+
+
+def _top(client, **params):
+    r = client.get("/api/termos/top", params={"limit": 200, **params})
+    assert r.status_code == 200
+    return dict(zip(r.json()["labels"], r.json()["counts"]))
+
+
+def test_normalizacao_dos_termos():
+    assert app_module._termos("Não recebeu o BOLETO; boleto da anuidade às 10h (CRO 12345)") == {
+        "recebeu", "boleto", "anuidade", "10h", "cro"}
+    assert app_module._termos("Votação") == {"votacao"}
+    assert app_module._termos("") == set() and app_module._termos(None) == set()
+
+
+def test_indice_acompanha_inclusao_edicao_e_exclusao(admin_client):
+    d0, d1 = app_module.DUVIDA_OPCOES[0], app_module.DUVIDA_OPCOES[1]
+    cadastrar(admin_client, duvida=d0, observacao="Xilogravura e xilofone")
+    cadastrar(admin_client, duvida=d0, observacao="xilogravura de novo, XILOGRAVURA")
+    id_ = _ultimo_id()
+    top = _top(admin_client)
+    assert top["xilogravura"] == 2  # uma vez por ligação
+    assert top["xilofone"] == 1
+
+    r = admin_client.post(f"/editar/{id_}", data={"cro": "CRO/RS 1", "nome_inscrito": "Inscrito de Teste",
+                                                  "duvida": d1, "observacao": "xilofone apenas"},
+                          follow_redirects=False)
+    assert r.status_code == 303
+    assert _top(admin_client)["xilogravura"] == 1
+    top_d1 = _top(admin_client, tipos=d1)
+    assert top_d1["xilofone"] == 1 and top_d1["apenas"] == 1
+
+    admin_client.post(f"/excluir/{id_}", follow_redirects=False)
+    admin_client.post(f"/excluir/{id_}", follow_redirects=False)  # excluir de novo não desconta outra vez
+    top = _top(admin_client)
+    assert top["xilofone"] == 1 and "apenas" not in top
+
+
+def test_lote_e_reindexacao_chegam_ao_mesmo_indice(admin_client):
+    d0, d2 = app_module.DUVIDA_OPCOES[0], app_module.DUVIDA_OPCOES[2]
+    for _ in range(3):
+        cadastrar(admin_client, duvida=d0, observacao="Quiromancia")
+    ids = list(range(_ultimo_id() - 2, _ultimo_id() + 1))
+
+    admin_client.post("/api/ligacoes/lote/reclassificar", data={"ids": ids[:2], "duvida": d2})
+    assert _top(admin_client, tipos=d2)["quiromancia"] == 2
+    admin_client.post("/api/ligacoes/lote/excluir", data={"ids": ids[1:]})
+    assert _top(admin_client)["quiromancia"] == 1
+
+    incremental = _indice()
+    app_module.reindexar_termos()
+    assert _indice() == incremental
+
+
+def test_tendencia_por_periodo(admin_client, atendente_client):
+    cadastrar(admin_client, observacao="Zootecnia")
+    hoje = app_module.datetime.now(app_module.TZ).date().isoformat()
+    r = admin_client.get("/api/termos/tendencia?termos=ZOOTÉCNIA,inexistentezz&periodo=dia")
+    assert r.status_code == 200
+    corpo = r.json()
+    assert corpo["labels"][-1] == hoje
+    assert corpo["series"]["zootecnia"][-1] >= 1
+    assert corpo["series"]["inexistentezz"] == [0] * len(corpo["labels"])
+
+    assert admin_client.get("/api/termos/tendencia").status_code == 400
+    assert admin_client.get("/api/termos/tendencia?termos=zootecnia&periodo=hora").status_code == 400
+    assert admin_client.get("/api/termos/top?limit=1000").status_code == 400
+    assert atendente_client.get("/api/termos/top").status_code == 403